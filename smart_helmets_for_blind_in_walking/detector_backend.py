@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+检测后端：同一个接口 predict_boxes(images, classes, imgsz, conf) → 每张图的 (boxes (K, 4) xyxy, conf (K,))
+  - UltralyticsBackend: 原来的 YOLO("yolov8n.pt")，要导入 torch + ultralytics，启动慢
+  - OnnxBackend: 导出成 ONNX 用 ONNX Runtime 跑 CPU 推理，只依赖 onnxruntime + numpy + cv2；
+    可选 INT8 量化模型；优化后的图缓存到磁盘，第二次启动不用重新优化；加载后先空跑一次预热
+导出（在开发机上做一次，生成的 .onnx 拷到头盔上）:
+    python detector_backend.py export --weights yolov8n.pt [--int8] [--calib data]
+对比两个后端（加载耗时、每帧延迟、检测结果一致性）:
+    python detector_backend.py compare --images data
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+TRAFFIC_LIGHT = 9  # COCO 类别编号
+
+
+class UltralyticsBackend(object):
+    """PyTorch 路径：包一层 ultralytics.YOLO，接口和 OnnxBackend 相同"""
+    def __init__(self, weights="yolov8n.pt", model=None):
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(weights)
+        self.model = model
+        self.names = getattr(model, "names", {})
+
+    def predict_boxes(self, images, classes=(TRAFFIC_LIGHT,), imgsz=640, conf=0.25):
+        results = self.model(list(images), classes=list(classes) if classes else None, imgsz=imgsz, conf=conf,
+                             verbose=False)
+        return [(r.boxes.xyxy.cpu().numpy().reshape(-1, 4), r.boxes.conf.cpu().numpy().reshape(-1))
+                for r in results]
+
+    def warmup(self, imgsz=640):
+        self.predict_boxes([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], imgsz=imgsz)
+
+
+def letterbox(image, size):
+    """等比缩放到 size × size，四周用 114 灰色补齐（同 ultralytics），返回 (图, 缩放比例, (左, 上) 补边)"""
+    h, w = image.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else image
+    left, top = (size - nw) // 2, (size - nh) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[top:top + nh, left:left + nw] = resized
+    return out, r, (left, top)
+
+
+class OnnxBackend(object):
+    """
+    YOLOv8 ONNX（ultralytics 导出，输出 (B, 4 + 类别数, 锚点数)）在 ONNX Runtime 上推理，后处理（筛类别、NMS）用 numpy + cv2。
+    导出时用 dynamic=True 才能 batch 推理和换输入尺寸；静态尺寸的模型会按导出尺寸推理。
+    """
+    def __init__(self, path, threads=None, iou=0.45, optimized_cache=True, warmup_sizes=(640, 160)):
+        import onnxruntime as ort
+        t0 = time.perf_counter()
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        cached = os.path.splitext(path)[0] + ".opt.onnx"
+        if optimized_cache and os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+            # 上次已经优化好的图，直接加载，跳过图优化
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            self.session = ort.InferenceSession(cached, opts, providers=["CPUExecutionProvider"])
+        else:
+            if optimized_cache:
+                opts.optimized_model_filepath = cached
+            self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        shape = inp.shape
+        self.fixed_size = shape[2] if isinstance(shape[2], int) else None
+        self.fixed_batch = shape[0] if isinstance(shape[0], int) else None
+        self.iou = iou
+        self.names = self._names()
+        self.load_seconds = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for size in (warmup_sizes if not self.fixed_size else (self.fixed_size,)):
+            self.warmup(size)
+        self.warmup_seconds = time.perf_counter() - t0
+
+    def _names(self):
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if "names" in meta:
+            import ast
+            return ast.literal_eval(meta["names"])
+        return {}
+
+    def warmup(self, imgsz=640):
+        self.predict_boxes([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], imgsz=imgsz)
+
+    def predict_boxes(self, images, classes=(TRAFFIC_LIGHT,), imgsz=640, conf=0.25):
+        size = self.fixed_size or int(np.ceil(imgsz / 32) * 32)
+        prepped = [letterbox(im, size) for im in images]
+        blob = np.stack([p[0] for p in prepped])[..., ::-1].transpose(0, 3, 1, 2)  # BGR→RGB, NHWC→NCHW
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        if self.fixed_batch:
+            outs = [self.session.run(None, {self.input_name: blob[i:i + 1]})[0] for i in range(len(blob))]
+            pred = np.concatenate(outs)
+        else:
+            pred = self.session.run(None, {self.input_name: blob})[0]
+        return [self._postprocess(p, r, pad, im.shape, classes, conf)
+                for p, (_, r, pad), im in zip(pred, prepped, images)]
+
+    def _postprocess(self, pred, r, pad, shape, classes, conf):
+        """pred: (4 + 类别数, 锚点数)，前 4 行为 cx, cy, w, h（letterbox 坐标）"""
+        scores = pred[4:]
+        if classes:
+            cls_scores = scores[list(classes)]
+            best = cls_scores.argmax(axis=0)
+            score = cls_scores[best, np.arange(scores.shape[1])]
+        else:
+            best = scores.argmax(axis=0)
+            score = scores[best, np.arange(scores.shape[1])]
+        keep = score >= conf
+        if not keep.any():
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        cx, cy, w, h = pred[:4, keep]
+        score = score[keep]
+        xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        xyxy -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+        xyxy /= r
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+        idx = cv2.dnn.NMSBoxes(np.c_[xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]].tolist(), score.tolist(), conf, self.iou)
+        idx = np.asarray(idx, dtype=np.intp).reshape(-1)
+        return xyxy[idx].astype(np.float32), score[idx].astype(np.float32)
+
+
+def load_backend(kind="pt", weights="yolov8n.pt", onnx_path=None, threads=None):
+    """kind: 'pt'（ultralytics）/ 'onnx' / 'onnx-int8'；ONNX 文件默认和 weights 同名"""
+    if kind == "pt":
+        return UltralyticsBackend(weights)
+    base = onnx_path or os.path.splitext(weights)[0] + ".onnx"
+    if kind == "onnx-int8" and not onnx_path:
+        base = os.path.splitext(base)[0] + ".int8.onnx"
+    return OnnxBackend(base, threads=threads)
+
+
+# ---------- 导出 / 量化 ----------
+
+def export_onnx(weights="yolov8n.pt", imgsz=640, dynamic=True):
+    """用 ultralytics 导出 ONNX（只在开发机上需要 torch），返回 .onnx 路径"""
+    from ultralytics import YOLO
+    return YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=dynamic, simplify=True)
+
+
+class _CalibReader(object):
+    """静态量化的校准数据：calib_dir 里的图片按推理时的预处理喂进去"""
+    def __init__(self, input_name, calib_dir, imgsz, limit=32):
+        self.input_name = input_name
+        paths = sorted(p for p in glob.glob(os.path.join(calib_dir, "*"))
+                       if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))[:limit]
+        self._iter = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for p in self._iter:
+            im = cv2.imread(p)
+            if im is None:
+                continue
+            x = letterbox(im, self.imgsz)[0][..., ::-1].transpose(2, 0, 1)[None]
+            return {self.input_name: np.ascontiguousarray(x, dtype=np.float32) / 255.0}
+        return None
+
+
+def quantize_int8(onnx_path, out_path=None, calib_dir=None, imgsz=640):
+    """
+    INT8 量化：给了 calib_dir 时做静态量化（卷积权重和激活都量化，CPU 上最快，需要几十张有代表性的图片），
+    否则做动态量化（只量化权重，不需要校准数据）。返回输出路径。
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+    out_path = out_path or os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    if calib_dir:
+        import onnxruntime as ort
+        name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        quantize_static(onnx_path, out_path, _CalibReader(name, calib_dir, imgsz),
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    return out_path
+
+
+# ---------- 对比 ----------
+
+def _match(a, b, thr=0.5):
+    """a、b 两组框按 IoU 贪心匹配，返回 (匹配数, 匹配上的平均 IoU)"""
+    from detector_scheduler import iou
+    if not len(a) or not len(b):
+        return 0, None
+    m = iou(a, b)
+    used, ious = set(), []
+    for i in np.argsort(-m.max(axis=1)):
+        j = int(np.argmax(m[i]))
+        if m[i, j] >= thr and j not in used:
+            used.add(j)
+            ious.append(float(m[i, j]))
+    return len(ious), (float(np.mean(ious)) if ious else None)
+
+
+def compare(backends, image_paths, imgsz=640, conf=0.25, repeat=3):
+    """
+    backends: {名字: 加载函数}；第一个为参考（一般是 pt）。
+    打印每个后端的加载耗时、每帧延迟（取 repeat 次里最快的中位数），以及和参考后端的检测一致性（召回 / 精确率 / 平均 IoU）。
+    """
+    images = [im for im in (cv2.imread(p) for p in image_paths) if im is not None]
+    report, ref = {}, None
+    for name, load in backends.items():
+        t0 = time.perf_counter()
+        backend = load()
+        load_s = time.perf_counter() - t0
+        preds, lat = None, []
+        for _ in range(repeat):
+            run = []
+            for im in images:
+                t = time.perf_counter()
+                run.append(backend.predict_boxes([im], imgsz=imgsz, conf=conf)[0])
+                lat.append(time.perf_counter() - t)
+            preds = run
+        row = {"load_s": load_s, "latency_ms": float(np.median(lat)) * 1e3}
+        if ref is None:
+            ref = preds
+        else:
+            n_ref = sum(len(b) for b, _ in ref)
+            n_new = sum(len(b) for b, _ in preds)
+            matched, ious = 0, []
+            for (rb, _), (pb, _) in zip(ref, preds):
+                k, mean_iou = _match(rb, pb)
+                matched += k
+                if mean_iou is not None:
+                    ious.append(mean_iou)
+            row.update({"recall": matched / n_ref if n_ref else None,
+                        "precision": matched / n_new if n_new else None,
+                        "mean_iou": float(np.mean(ious)) if ious else None})
+        report[name] = row
+        print(name, {k: (round(v, 4) if isinstance(v, float) else v) for k, v in row.items()})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检测后端：导出 ONNX / INT8 量化 / 对比")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("export")
+    p.add_argument("--weights", default="yolov8n.pt")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--int8", action="store_true", help="导出后再生成 INT8 量化模型")
+    p.add_argument("--calib", default=None, help="静态量化用的校准图片目录，不给时做动态量化")
+    p = sub.add_parser("compare")
+    p.add_argument("--weights", default="yolov8n.pt")
+    p.add_argument("--images", default="data")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        path = export_onnx(args.weights, args.imgsz)
+        print("ONNX:", path)
+        if args.int8:
+            print("INT8:", quantize_int8(path, calib_dir=args.calib, imgsz=args.imgsz))
+    else:
+        paths = sorted(glob.glob(os.path.join(args.images, "*")))
+        onnx = os.path.splitext(args.weights)[0] + ".onnx"
+        int8 = os.path.splitext(onnx)[0] + ".int8.onnx"
+        backends = {"pt": lambda: UltralyticsBackend(args.weights)}
+        if os.path.exists(onnx):
+            backends["onnx"] = lambda: OnnxBackend(onnx, threads=args.threads)
+        if os.path.exists(int8):
+            backends["onnx-int8"] = lambda: OnnxBackend(int8, threads=args.threads)
+        compare(backends, paths, imgsz=args.imgsz)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+检测调度：少跑整帧检测，多做小图复查。
+  - 只检测 COCO 第 9 类（traffic light），不再对 80 个类别做 NMS 之后在 Python 里过滤
+  - 每 full_every 帧做一次整帧检测；中间的帧只把已知灯框向外扩一圈裁出来，按 roi_imgsz 的小尺寸复查
+    （一个 160×160 的 ROI 比 640×640 的整帧少算十几倍）
+  - 复查连续 max_missed 次没找到的灯就丢掉；一个灯都没有时每帧都做整帧检测
+  - 多帧一起时（视频文件 / 图片目录，追求吞吐）整帧检测和 ROI 复查都合成一个 batch 一次前向
+"""
+
+import numpy as np
+
+from detector_backend import TRAFFIC_LIGHT, UltralyticsBackend
+
+
+def iou(a, b):
+    """a: (N, 4)，b: (M, 4) 的 xyxy 框 → (N, M) 的 IoU"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Track(object):
+    """一个已知的灯：框、置信度、连续没复查到的次数"""
+    _next_id = 0
+
+    def __init__(self, box, conf):
+        self.id = Track._next_id
+        Track._next_id += 1
+        self.box = box
+        self.conf = conf
+        self.missed = 0
+
+
+class DetectionScheduler(object):
+    """
+    model: detector_backend 里的后端（UltralyticsBackend / OnnxBackend），直接传 ultralytics.YOLO 时自动包一层。
+    detect(images) 输入一帧或多帧（BGR ndarray 列表），返回每帧的 [(x1, y1, x2, y2, conf, track_id)]。
+    stats 记录整帧检测帧数、ROI 复查帧数、前向次数。
+    """
+    def __init__(self, model, full_every=5, imgsz=640, roi_imgsz=160, conf=0.25, roi_pad=1.0,
+                 max_missed=2, match_iou=0.3):
+        self.backend = model if hasattr(model, "predict_boxes") else UltralyticsBackend(model=model)
+        self.full_every = full_every
+        self.imgsz = imgsz
+        self.roi_imgsz = roi_imgsz
+        self.conf = conf
+        self.roi_pad = roi_pad
+        self.max_missed = max_missed
+        self.match_iou = match_iou
+        self.tracks = []
+        self._since_full = None
+        self.stats = {"full": 0, "roi": 0, "forward": 0}
+
+    def _predict(self, images, imgsz):
+        """一次前向（多张图合成一个 batch），返回每张图的 (boxes (K, 4), conf (K,))"""
+        self.stats["forward"] += 1
+        return self.backend.predict_boxes(images, classes=(TRAFFIC_LIGHT,), imgsz=imgsz, conf=self.conf)
+
+    def _roi(self, box, shape):
+        """灯框向四周各扩 roi_pad 倍宽高，裁到图像范围内"""
+        h, w = shape[:2]
+        x1, y1, x2, y2 = box
+        pw, ph = (x2 - x1) * self.roi_pad, (y2 - y1) * self.roi_pad
+        return (int(max(0, x1 - pw)), int(max(0, y1 - ph)), int(min(w, x2 + pw)), int(min(h, y2 + ph)))
+
+    def _need_full(self):
+        return not self.tracks or self._since_full is None or self._since_full >= self.full_every - 1
+
+    def detect(self, images):
+        """按顺序处理一组连续的帧，整帧检测的帧合成一个 batch，其余帧的 ROI 合成一个 batch"""
+        if not isinstance(images, (list, tuple)):
+            return self.detect([images])[0]
+        out = []
+        i = 0
+        while i < len(images):
+            if self._need_full():
+                # 先只检测一帧：找到灯的话后面的帧走 ROI；这一组里已经确认没有灯了，剩下的帧合成一个 batch 整帧检测
+                n = 1 if self.tracks or i == 0 else len(images) - i
+                for boxes, conf in self._predict(list(images[i:i + n]), self.imgsz):
+                    self.stats["full"] += 1
+                    self._update_full(boxes, conf)
+                    out.append(self._current())
+            else:
+                n = min(len(images) - i, self.full_every - 1 - self._since_full)
+                out.extend(self._detect_rois(images[i:i + n]))
+            i += n
+        return out
+
+    def _detect_rois(self, batch):
+        """每帧把所有已知灯的 ROI 裁出来，整组一次前向；各帧用同样的 ROI（灯在几帧内移动很小）"""
+        rois = [self._roi(t.box, batch[0].shape) for t in self.tracks]
+        crops, owners = [], []
+        for fi, image in enumerate(batch):
+            for ti, (x1, y1, x2, y2) in enumerate(rois):
+                if x2 > x1 and y2 > y1:
+                    crops.append(image[y1:y2, x1:x2])
+                    owners.append((fi, ti))
+        preds = self._predict(crops, self.roi_imgsz) if crops else []
+        found = {}
+        for (fi, ti), (boxes, conf) in zip(owners, preds):
+            if len(conf):
+                k = int(np.argmax(conf))
+                x1, y1 = rois[ti][:2]
+                found[(fi, ti)] = (boxes[k] + np.array([x1, y1, x1, y1], dtype=np.float32), float(conf[k]))
+        out = []
+        for fi in range(len(batch)):
+            self.stats["roi"] += 1
+            self._since_full += 1
+            for ti, t in enumerate(self.tracks):
+                hit = found.get((fi, ti))
+                if hit is None:
+                    t.missed += 1
+                else:
+                    t.box, t.conf, t.missed = tuple(hit[0].tolist()), hit[1], 0
+            out.append(self._current())
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return out
+
+    def _update_full(self, boxes, conf):
+        """整帧检测结果和已知的灯按 IoU 关联：关联上的沿用编号，新的灯新建，没出现的灯丢掉"""
+        self._since_full = 0
+        new_tracks = []
+        m = iou(boxes, [t.box for t in self.tracks]) if self.tracks and len(boxes) else None
+        for i, (box, c) in enumerate(zip(boxes, conf)):
+            t = None
+            if m is not None:
+                j = int(np.argmax(m[i]))
+                if m[i, j] >= self.match_iou:
+                    t = self.tracks[j]
+                    t.box, t.conf, t.missed = tuple(box.tolist()), float(c), 0
+            new_tracks.append(t or Track(tuple(box.tolist()), float(c)))
+        self.tracks = new_tracks
+
+    def _current(self):
+        return [tuple(int(v) for v in t.box) + (t.conf, t.id) for t in self.tracks if t.missed == 0]
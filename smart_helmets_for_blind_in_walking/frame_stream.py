@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+视频流处理：采集 → 推理 → 后处理 三个阶段各跑在自己的线程里，中间用只保留最新帧的有界队列连接。
+  - 采集源：摄像头（编号，如 0）、视频文件、图片目录、单张图片
+  - 实时源（摄像头，或按原帧率放的视频）：队列满了丢最老的帧，取帧时超过 max_age 秒的旧帧也直接丢掉，
+    推理慢的时候处理的永远是最新画面，端到端延迟有上界，不会越积越多
+  - 非实时源（视频文件尽快读、图片目录）：队列满了采集线程等着，一帧都不丢，按推理速度往前走
+  - 不依赖显示器，headless 时只打印 / 播报结果
+OpenCV 的读帧、解码和 YOLO 推理都会释放 GIL，所以线程之间是真正并行的。
+"""
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class Frame(object):
+    """一帧：序号、采集时刻（time.monotonic）、图像，推理和后处理的结果也挂在上面"""
+    def __init__(self, index, image, captured=None):
+        self.index = index
+        self.image = image
+        self.captured = captured if captured is not None else time.monotonic()
+        self.detections = None
+        self.result = None
+
+
+def iter_source(source, realtime=False):
+    """
+    按顺序产出 Frame。source 为整数（或纯数字字符串）时打开摄像头，
+    为目录时按文件名顺序读其中的图片，否则当作视频文件 / 单张图片。
+    realtime=True 时视频文件按原帧率放（模拟摄像头），否则尽快读。
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        cap = cv2.VideoCapture(int(source))
+        # 摄像头驱动自己的缓冲区也只留 1 帧，否则读到的是几帧之前的画面
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        yield from _iter_capture(cap, None)
+    elif os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTS))
+        for i, name in enumerate(names):
+            image = cv2.imread(os.path.join(source, name))
+            if image is not None:
+                yield Frame(i, image)
+    elif str(source).lower().endswith(IMAGE_EXTS):
+        image = cv2.imread(source)
+        if image is None:
+            raise FileNotFoundError(source)
+        yield Frame(0, image)
+    else:
+        cap = cv2.VideoCapture(source)
+        fps = cap.get(cv2.CAP_PROP_FPS) if realtime else 0
+        yield from _iter_capture(cap, 1.0 / fps if fps and fps > 0 else None)
+
+
+def is_live(source, realtime=False):
+    """摄像头，或 realtime=True 按原帧率放的视频文件，算实时源（来不及处理的帧应该丢掉）"""
+    if isinstance(source, int) or str(source).isdigit():
+        return True
+    return bool(realtime) and not os.path.isdir(source) and not str(source).lower().endswith(IMAGE_EXTS)
+
+
+def _iter_capture(cap, interval):
+    if not cap.isOpened():
+        raise IOError("无法打开视频源")
+    try:
+        i = 0
+        next_t = time.monotonic()
+        while True:
+            ok, image = cap.read()
+            if not ok:
+                break
+            yield Frame(i, image)
+            i += 1
+            if interval:
+                next_t += interval
+                time.sleep(max(0.0, next_t - time.monotonic()))
+    finally:
+        cap.release()
+
+
+class LatestQueue(object):
+    """
+    有界队列：put 时满了就丢掉最老的一帧，get 时跳过已经超过 max_age 秒的帧。
+    dropped 记录被丢掉的帧数（满了丢的 + 过期丢的）。
+    drop=False 时是普通的阻塞队列：满了 put 等着（反压），不丢帧也不看 max_age；
+    abort() 让卡在 put / get 里的线程放弃返回（另一端已经退出时用）。
+    """
+    def __init__(self, maxsize=1, max_age=None, drop=True):
+        self.maxsize = maxsize
+        self.max_age = max_age if drop else None
+        self.drop = drop
+        self.dropped = 0
+        self._q = queue.Queue() if drop else queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._aborted = threading.Event()
+
+    def abort(self):
+        self._aborted.set()
+
+    def put(self, item):
+        if not self.drop:
+            while not self._aborted.is_set():
+                try:
+                    self._q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            return
+        with self._lock:
+            while self._q.qsize() >= self.maxsize:
+                try:
+                    self._q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    break
+            self._q.put(item)
+
+    def close(self):
+        """放一个结束标记，消费方 get 到 None 就退出（结束标记不会被丢掉）"""
+        if self.drop:
+            self._q.put(None)
+        else:
+            self.put(None)
+
+    def get(self, block=True, timeout=None):
+        """取一帧；block=False 且队列空时抛 queue.Empty；abort() 之后阻塞的 get 返回结束标记 None"""
+        while True:
+            if not self.drop and block and timeout is None:
+                item = self._get_until_abort()
+            else:
+                item = self._q.get(block=block, timeout=timeout)
+            if item is None or self.max_age is None or time.monotonic() - item.captured <= self.max_age:
+                return item
+            with self._lock:
+                self.dropped += 1
+
+    def _get_until_abort(self):
+        while not self._aborted.is_set():
+            try:
+                return self._q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def get_batch(self, n):
+        """
+        取最多 n 帧；取到结束标记时它在最后。
+        丢帧模式下等到第一帧后不再等待，把已经在队列里的帧一起取走（不为凑 batch 增加延迟）；
+        阻塞模式（非实时源）下一直等到凑满 n 帧或源结束，每个 batch 都是满的。
+        """
+        batch = [self.get()]
+        while len(batch) < n and batch[-1] is not None:
+            try:
+                batch.append(self.get(block=not self.drop))
+            except queue.Empty:
+                break
+        return batch
+
+
+class StreamPipeline(object):
+    """
+    infer(frame) 在推理线程里跑，返回值存到 frame.detections；
+    post(frame) 在调用 run() 的线程里跑（cv2.imshow 必须在主线程），返回值存到 frame.result。
+    batch_size > 1 时（追求吞吐，例如离线跑视频文件）推理阶段一次取走队列里现有的最多 batch_size 帧，
+    infer 收到帧列表、返回同样长度的结果列表；队列长度随之放大到 batch_size。
+    live: None 时按 is_live(source, realtime) 判断；实时源丢旧帧保延迟，非实时源用阻塞队列逐帧处理。
+    stats(): 处理帧数、丢帧数、处理帧数占采集帧数的比例、FPS、端到端延迟（采集到后处理完成）的 p50 / p95 / 最大值。
+    """
+    def __init__(self, source, infer, post, queue_size=1, max_age=0.5, realtime=False, max_frames=None,
+                 batch_size=1, live=None):
+        self.source = source
+        self.live = is_live(source, realtime) if live is None else live
+        self.batch_size = batch_size
+        self.infer = infer
+        self.post = post
+        self.realtime = realtime
+        self.max_frames = max_frames
+        self.capture_q = LatestQueue(max(queue_size, batch_size), max_age, drop=self.live)
+        self.result_q = LatestQueue(max(queue_size, batch_size), max_age, drop=self.live)
+        self.latencies = []
+        self.captured = 0
+        self.processed = 0
+        self.errors = []
+        self._stop = threading.Event()
+        self._started = None
+        self._elapsed = None
+
+    def stop(self):
+        self._stop.set()
+
+    def _capture(self):
+        try:
+            for frame in iter_source(self.source, self.realtime):
+                if self._stop.is_set():
+                    break
+                self.capture_q.put(frame)
+                self.captured += 1
+                if self.max_frames and self.captured >= self.max_frames:
+                    break
+        except Exception as e:
+            self.errors.append(("capture", repr(e)))
+        finally:
+            self.capture_q.close()
+
+    def _inference(self):
+        try:
+            while not self._stop.is_set():
+                if self.batch_size > 1:
+                    frames = self.capture_q.get_batch(self.batch_size)
+                    done = frames[-1] is None
+                    frames = [f for f in frames if f is not None]
+                    for frame, det in zip(frames, self.infer(frames) if frames else []):
+                        frame.detections = det
+                        self.result_q.put(frame)
+                    if done:
+                        break
+                    continue
+                frame = self.capture_q.get()
+                if frame is None:
+                    break
+                frame.detections = self.infer(frame)
+                self.result_q.put(frame)
+        except Exception as e:
+            self.errors.append(("inference", repr(e)))
+            self._stop.set()
+        finally:
+            self.result_q.close()
+
+    def run(self):
+        """阻塞直到视频源读完、stop() 被调用或按 Ctrl+C，返回 stats()"""
+        self._started = time.monotonic()
+        workers = [threading.Thread(target=self._capture, name="capture", daemon=True),
+                   threading.Thread(target=self._inference, name="inference", daemon=True)]
+        for t in workers:
+            t.start()
+        try:
+            while True:
+                frame = self.result_q.get()
+                if frame is None:
+                    break
+                frame.result = self.post(frame)
+                self.processed += 1
+                self.latencies.append(time.monotonic() - frame.captured)
+                if frame.result is False:
+                    # 后处理返回 False 表示要退出（例如窗口里按了 q）
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            self._elapsed = time.monotonic() - self._started
+            # 提前退出时别让采集 / 推理线程卡在阻塞队列的 put 里
+            self.capture_q.abort()
+            self.result_q.abort()
+        for t in workers:
+            t.join(timeout=2.0)
+        for stage, err in self.errors:
+            print(f"⚠️ {stage} 阶段出错: {err}")
+        return self.stats()
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        n = len(lat)
+        elapsed = self._elapsed if self._elapsed is not None else time.monotonic() - (self._started or 0)
+        return {
+            "captured": self.captured,
+            "processed": n,
+            "dropped": self.capture_q.dropped + self.result_q.dropped,
+            "processed_ratio": n / self.captured if self.captured else 0.0,
+            "fps": n / elapsed if elapsed > 0 else 0.0,
+            "latency_p50": lat[(n - 1) // 2] if n else None,
+            "latency_p95": lat[min(n - 1, int(0.95 * n))] if n else None,
+            "latency_max": lat[-1] if n else None,
+        }
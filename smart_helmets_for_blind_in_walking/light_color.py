@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+交通灯颜色判断：
+  - 大框按步长抽样到最多 max_side × max_side 个像素，小框原样用
+  - 所有框的像素拼成一列，每帧只调一次 cvtColor 转 HSV，再用一次 numpy 比较 + bincount
+    算出每个框红 / 黄 / 绿 / 亮像素的占比（不再每个框各转一次、各做三个 inRange）
+  - 亮的像素太少判为 'off'（灯灭或被遮挡），亮但颜色对不上、或者框是空的（整个在画面外）判为 None
+  - ColorSmoother 按跟踪编号对最近几帧投票，红绿判断不会因为一两帧的反光、闪烁来回跳
+"""
+
+from collections import Counter, deque
+
+import cv2
+import numpy as np
+
+# OpenCV 的 HSV：H 0-180，S / V 0-255；和原来 inRange 的阈值一致，另加黄色
+RED_H = ((0, 10), (170, 180))
+YELLOW_H = ((15, 35),)
+GREEN_H = ((40, 80),)
+MIN_S, MIN_V = 70, 50
+COLORS = ("red", "green", "yellow")  # 判断顺序：红灯优先（宁可多停一次），其次同原来的绿灯
+
+
+def _in_ranges(h, ranges):
+    mask = np.zeros(h.shape, dtype=bool)
+    for lo, hi in ranges:
+        mask |= (h >= lo) & (h <= hi)
+    return mask
+
+
+class LightColorClassifier(object):
+    """
+    classify(image, boxes) → 每个框一个结果：'red' / 'yellow' / 'green' / 'off' / None。
+    min_ratio: 某种颜色的像素占框内像素的比例超过它才算（同原来的 0.05）；
+    off_ratio: 亮且饱和的像素比例低于它时判为灯灭。
+    """
+    def __init__(self, max_side=32, min_ratio=0.05, off_ratio=0.02):
+        self.max_side = max_side
+        self.min_ratio = min_ratio
+        self.off_ratio = off_ratio
+
+    def ratios(self, image, boxes):
+        """每个框红 / 绿 / 黄 / 亮像素的占比，形状 (len(boxes), 4)；裁到画面内后为空的框整行为 NaN"""
+        h_img, w_img = image.shape[:2]
+        boxes = [(max(0, int(x1)), max(0, int(y1)), min(w_img, int(x2)), min(h_img, int(y2)))
+                 for x1, y1, x2, y2 in (b[:4] for b in boxes)]
+        out = np.full((len(boxes), 4), np.nan, dtype=np.float32)
+        valid = [i for i, (x1, y1, x2, y2) in enumerate(boxes) if x2 > x1 and y2 > y1]
+        if not valid:
+            return out
+        # 先按步长把各框的 BGR 像素取出来拼成一列，整帧只调一次 cvtColor，而且只转用得到的像素
+        pixels, labels = [], []
+        for i in valid:
+            x1, y1, x2, y2 = boxes[i]
+            sy = max(1, (y2 - y1) // self.max_side)
+            sx = max(1, (x2 - x1) // self.max_side)
+            roi = image[y1:y2:sy, x1:x2:sx].reshape(-1, 3)
+            pixels.append(roi)
+            labels.append(np.full(len(roi), i, dtype=np.intp))
+        px = cv2.cvtColor(np.concatenate(pixels)[:, None, :], cv2.COLOR_BGR2HSV)[:, 0, :]
+        lab = np.concatenate(labels)
+        h, s, v = px[:, 0], px[:, 1], px[:, 2]
+        lit = (s >= MIN_S) & (v >= MIN_V)
+        n = len(boxes)
+        total = np.bincount(lab, minlength=n).astype(np.float32)
+        total[total == 0] = 1
+        for k, ranges in enumerate((RED_H, GREEN_H, YELLOW_H)):
+            out[valid, k] = (np.bincount(lab, weights=lit & _in_ranges(h, ranges), minlength=n) / total)[valid]
+        out[valid, 3] = (np.bincount(lab, weights=lit, minlength=n) / total)[valid]
+        return out
+
+    def classify(self, image, boxes):
+        if not len(boxes):
+            return []
+        r = self.ratios(image, boxes)
+        out = []
+        for red, green, yellow, lit in r:
+            if np.isnan(lit):
+                # 框是空的，没有像素可看，不能说灯灭了
+                out.append(None)
+                continue
+            if lit < self.off_ratio:
+                out.append("off")
+                continue
+            best = None
+            for name, ratio in zip(COLORS, (red, green, yellow)):
+                if ratio > self.min_ratio:
+                    best = name
+                    break
+            out.append(best)
+        return out
+
+
+class ColorSmoother(object):
+    """
+    按 key（跟踪编号）保留最近 window 帧的判断，某个颜色至少 min_votes 票才换成它，否则保持上一次的稳定结果。
+    None（颜色不确定）不投票；idle_frames 帧没见到的 key 清掉。
+    """
+    def __init__(self, window=5, min_votes=3, idle_frames=30):
+        self.window = window
+        self.min_votes = min_votes
+        self.idle_frames = idle_frames
+        self._votes = {}
+        self._stable = {}
+        self._seen = {}
+        self._frame = 0
+
+    def update(self, keys, colors):
+        """一帧的 (keys, colors) → 平滑后的 colors"""
+        self._frame += 1
+        out = []
+        for key, color in zip(keys, colors):
+            self._seen[key] = self._frame
+            votes = self._votes.setdefault(key, deque(maxlen=self.window))
+            if color is not None:
+                votes.append(color)
+            if votes:
+                top, count = Counter(votes).most_common(1)[0]
+                if count >= self.min_votes or key not in self._stable:
+                    self._stable[key] = top
+            out.append(self._stable.get(key))
+        for key in [k for k, f in self._seen.items() if self._frame - f > self.idle_frames]:
+            self._votes.pop(key, None)
+            self._stable.pop(key, None)
+            del self._seen[key]
+        return out
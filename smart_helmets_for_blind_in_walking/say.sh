@@ -21,7 +21,13 @@ fi
 
 #     # --output-file | ffplay -autoexit -hide_banner -loglevel error -f s16le -ar 22050 -ac 1 -
 
+# 先查短语缓存（tts_cache.py）：说过的话直接播 wav，不再跑一遍 Piper；
+# 缓存不可用（例如没装 python3）或 SAY_NO_CACHE=1 时退回直接合成播放
+DIR="$(cd "$(dirname "$0")" && pwd)"
+if [ -z "$SAY_NO_CACHE" ] && command -v python3 >/dev/null 2>&1; then
+  python3 "$DIR/tts_cache.py" say "$*" && exit 0
+fi
+
 echo "$*" | piper \
   --model ./zh_CN-huayan-medium.onnx \
-#   --output_file welcome.wav
-  --output-raw | ffplay -autoexit -hide_banner -loglevel error -f s16le -ar 22050 -ac 1 -
\ No newline at end of file
+  --output-raw | ffplay -autoexit -hide_banner -loglevel error -f s16le -ar 22050 -ac 1 -
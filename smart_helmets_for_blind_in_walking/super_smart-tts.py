@@ -27,19 +27,29 @@ from wsgiref.handlers import format_date_time
 from datetime import datetime
 from time import mktime
 import _thread as thread
-import os
+import sys
 
 import wave
 
+from tts_cache import CachedSpeaker, TtsCache, PROMPTS
+
 
 STATUS_FIRST_FRAME = 0  # 第一帧的标识
 STATUS_CONTINUE_FRAME = 1  # 中间帧标识
 STATUS_LAST_FRAME = 2  # 最后一帧的标识
 
+# ========== 配置 ==========
+APPID = 'a4cc4052'
+APISecret = 'YmJlY2RmNjQwNDNkZGY1NzNhZDVhZTkw'
+APIKey = '1213e4a91a830e86f2e3dbaecfc0ee93'
+VCN = "x4_yezi"      # 发音人
+SAMPLE_RATE = 16000  # 合成音频的采样率（auf）
+# =========================
+
 
 class Ws_Param(object):
     # 初始化
-    def __init__(self, APPID, APIKey, APISecret, Text):
+    def __init__(self, APPID, APIKey, APISecret, Text, vcn=VCN, sample_rate=SAMPLE_RATE):
         self.APPID = APPID
         self.APIKey = APIKey
         self.APISecret = APISecret
@@ -48,7 +58,7 @@ class Ws_Param(object):
         # 公共参数(common)
         self.CommonArgs = {"app_id": self.APPID}
         # 业务参数(business)，更多个性化参数可在官网查看
-        self.BusinessArgs = {"aue": "raw", "auf": "audio/L16;rate=16000", "vcn": "x4_yezi", "tte": "utf8"}
+        self.BusinessArgs = {"aue": "raw", "auf": "audio/L16;rate=%d" % sample_rate, "vcn": vcn, "tte": "utf8"}
         self.Data = {"status": 2, "text": str(base64.b64encode(self.Text.encode('utf-8')), "UTF8")}
         #使用小语种须使用以下方式，此处的unicode指的是 utf16小端的编码方式，即"UTF-16LE"”
         #self.Data = {"status": 2, "text": str(base64.b64encode(self.Text.encode('utf-16')), "UTF8")}
@@ -86,55 +96,64 @@ class Ws_Param(object):
         # print('websocket url :', url)
         return url
 
-def on_message(ws, message):
-    try:
-        message =json.loads(message)
-        code = message["code"]
-        sid = message["sid"]
-        audio = message["data"]["audio"]
-        audio = base64.b64decode(audio)
-        status = message["data"]["status"]
-        print(message)
-        if status == 2:
-            print("ws is closed")
-            ws.close()
-        if code != 0:
-            errMsg = message["message"]
-            print("sid:%s call error:%s code is:%s" % (sid, errMsg, code))
-        else:
-
-            with open('./demo.pcm', 'ab') as f:
-                f.write(audio)
-
-    except Exception as e:
-        print("receive msg,but parse exception:", e)
-
-
-
-# 收到websocket错误的处理
-def on_error(ws, error):
-    print("### error:", error)
-
-
-# 收到websocket关闭的处理
-def on_close(ws, close_status_code, close_msg):
-    print("### closed ###")
-
-
-# 收到websocket连接建立的处理
-def on_open(ws):
-    def run(*args):
+def synthesize(text, vcn=VCN, sample_rate=SAMPLE_RATE):
+    """
+    连一次 websocket 合成一段文本，返回 16bit 单声道 PCM。
+    服务端返回错误码、或者连接在最后一帧（status == 2）之前断开时抛 RuntimeError，残缺的音频不会被缓存。
+    """
+    wsParam = Ws_Param(APPID=APPID, APISecret=APISecret, APIKey=APIKey, Text=text, vcn=vcn, sample_rate=sample_rate)
+    chunks, errors = [], []
+    finished = []
+
+    def on_message(ws, message):
+        try:
+            message = json.loads(message)
+            code = message["code"]
+            sid = message["sid"]
+            if code != 0:
+                errors.append("sid:%s call error:%s code is:%s" % (sid, message["message"], code))
+                ws.close()
+                return
+            chunks.append(base64.b64decode(message["data"]["audio"]))
+            if message["data"]["status"] == 2:
+                finished.append(True)
+                ws.close()
+        except Exception as e:
+            errors.append("receive msg,but parse exception: %r" % e)
+
+    # 收到websocket错误的处理
+    def on_error(ws, error):
+        errors.append("### error: %r" % error)
+
+    # 收到websocket连接建立的处理
+    def on_open(ws):
         d = {"common": wsParam.CommonArgs,
              "business": wsParam.BusinessArgs,
              "data": wsParam.Data,
              }
-        d = json.dumps(d)
-        print("------>开始发送文本数据")
-        ws.send(d)
-        if os.path.exists('./demo.pcm'):
-            os.remove('./demo.pcm')
+        thread.start_new_thread(ws.send, (json.dumps(d),))
 
-    thread.start_new_thread(run, ())
+    websocket.enableTrace(False)
+    ws = websocket.WebSocketApp(wsParam.create_url(), on_message=on_message, on_error=on_error)
+    ws.on_open = on_open
+    ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+    if errors:
+        raise RuntimeError(errors[0])
+    if not finished:
+        raise RuntimeError("连接在最后一帧之前断开，音频不完整（收到 %d 段）" % len(chunks))
+    return b"".join(chunks)
+
+
+class XfyunEngine(object):
+    """讯飞在线合成，给 tts_cache.CachedSpeaker 用；缓存按 (文本, vcn, 采样率, "xfyun") 区分"""
+    name = "xfyun"
+
+    def __init__(self, vcn=VCN, sample_rate=SAMPLE_RATE):
+        self.voice = vcn
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text):
+        return synthesize(text, self.voice, self.sample_rate)
 
 
 def pcm2wav(pcm_file,wav_file,channels=1,bits=16,sample_rate=16000):
@@ -154,13 +173,21 @@ def pcm2wav(pcm_file,wav_file,channels=1,bits=16,sample_rate=16000):
 
 
 if __name__ == "__main__":
-    # 测试时候在此处正确填写相关信息即可运行
-    wsParam = Ws_Param(APPID='a4cc4052', APISecret='YmJlY2RmNjQwNDNkZGY1NzNhZDVhZTkw',
-                       APIKey='1213e4a91a830e86f2e3dbaecfc0ee93',
-                       Text="2025年10月16日，智元机器人发布的工业级交互式具身作业机器人精灵G2，凭借英伟达Thor芯片加持的算力优势、遥操作驱动的数据体系及多场景适配能力，成为具身智能商业化落地的标杆产品。本文从性能参数（包括价格）、技术架构、数据机制与市场潜力四维度解析其要点。")
-    websocket.enableTrace(False)
-    wsUrl = wsParam.create_url()
-    ws = websocket.WebSocketApp(wsUrl, on_message=on_message, on_error=on_error, on_close=on_close)
-    ws.on_open = on_open
-    ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
-    pcm2wav('./demo.pcm','./demo.wav')
\ No newline at end of file
+    # 用法：
+    #   python super_smart-tts.py "要播放的文字"   命中缓存直接播，没命中时连讯飞合成、存进缓存再播
+    #   python super_smart-tts.py --warm          安装时预合成 tts_cache.PROMPTS，之后这些提示音不需要网络
+    #   python super_smart-tts.py                 原来的演示：合成一段长文本，写 demo.pcm / demo.wav
+    if sys.argv[1:] == ["--warm"]:
+        with TtsCache() as cache:
+            for text, result in CachedSpeaker(XfyunEngine(), cache).warm(PROMPTS):
+                print(f"{text}: {'失败 ' + result if isinstance(result, str) else f'{result * 1e3:.0f}ms'}")
+            print(cache.stats())
+    elif len(sys.argv) > 1:
+        with TtsCache() as cache:
+            ok = CachedSpeaker(XfyunEngine(), cache).say(" ".join(sys.argv[1:]))
+        sys.exit(0 if ok else 1)
+    else:
+        pcm = synthesize("2025年10月16日，智元机器人发布的工业级交互式具身作业机器人精灵G2，凭借英伟达Thor芯片加持的算力优势、遥操作驱动的数据体系及多场景适配能力，成为具身智能商业化落地的标杆产品。本文从性能参数（包括价格）、技术架构、数据机制与市场潜力四维度解析其要点。")
+        with open('./demo.pcm', 'wb') as f:
+            f.write(pcm)
+        pcm2wav('./demo.pcm', './demo.wav')
@@ -1,55 +1,143 @@
-from ultralytics import YOLO
+import argparse
+import time
+
 import cv2
 
-# 1. 加载预训练模型（YOLOv8n，支持交通灯识别）
-model = YOLO("yolov8n.pt")
-
-# 2. 加载图片
-image_path = "data/9.jpg"  # 你的图片路径
-image = cv2.imread(image_path)
-
-# 3. 推理检测
-results = model(image)
-
-# 4. 分析结果
-detected_lights = []
-for result in results:
-    for box in result.boxes:
-        cls_id = int(box.cls[0])
-        cls_name = model.names[cls_id]
-
-        if "traffic" in cls_name.lower() or "light" in cls_name.lower():
-            detected_lights.append(cls_name)
-
-# 5. 提示逻辑
-if len(detected_lights) == 0:
-    print("未检测到红绿灯")
-else:
-    print("前方有交通信号灯")
-    # 进一步判断灯的颜色（基于ROI颜色分析）
-    for result in results:
-        for box in result.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cls_name = model.names[int(box.cls[0])]
-            if "traffic" in cls_name.lower() or "light" in cls_name.lower():
-                roi = image[y1:y2, x1:x2]
-                hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-
-                # 红色范围
-                red_mask = cv2.inRange(hsv, (0, 70, 50), (10, 255, 255)) | cv2.inRange(hsv, (170, 70, 50), (180, 255, 255))
-                # 绿色范围
-                green_mask = cv2.inRange(hsv, (40, 70, 50), (80, 255, 255))
-
-                red_ratio = cv2.countNonZero(red_mask) / (roi.size / 3)
-                green_ratio = cv2.countNonZero(green_mask) / (roi.size / 3)
-
-                if red_ratio > 0.05:
-                    print("检测到红灯 🚦")
-                elif green_ratio > 0.05:
-                    print("检测到绿灯 🟢")
-                else:
-                    print("检测到交通灯，但无法确定颜色")
-
-cv2.imshow("result", results[0].plot())
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+# ========== 配置 ==========
+MODEL_PATH = "yolov8n.pt"
+BACKEND = "pt"             # 检测后端：pt（ultralytics + torch）/ onnx / onnx-int8（ONNX Runtime，启动快，见 detector_backend）
+IMAGE_PATH = "data/9.jpg"  # 你的图片路径（单张图片模式）
+QUEUE_SIZE = 1             # 流模式下每个阶段之间最多积压几帧（摄像头满了丢最老的，视频文件 / 图片目录满了等推理）
+MAX_AGE = 0.5              # 超过这么多秒还没推理的帧直接丢掉，保证端到端延迟有上界
+FULL_EVERY = 5             # 流模式下每 N 帧做一次整帧检测，其余帧只复查已知灯框附近的 ROI（见 detector_scheduler）
+# =========================
+
+
+def detect_lights(backend, image):
+    """推理检测（只检测交通灯这一类），返回交通灯框 [(x1, y1, x2, y2)]"""
+    boxes, _ = backend.predict_boxes([image])[0]
+    return [tuple(map(int, b)) for b in boxes]
+
+
+def draw_boxes(image, boxes, colors):
+    out = image.copy()
+    for (x1, y1, x2, y2), color in zip(boxes, colors):
+        bgr = {"red": (0, 0, 255), "green": (0, 255, 0), "yellow": (0, 255, 255)}.get(color, (128, 128, 128))
+        cv2.rectangle(out, (x1, y1), (x2, y2), bgr, 2)
+    return out
+
+
+MESSAGES = {"red": "检测到红灯 🚦", "green": "检测到绿灯 🟢", "yellow": "检测到黄灯 🟡", "off": "交通灯未亮",
+            None: "检测到交通灯，但无法确定颜色"}
+
+
+def run_image(model, image_path, show=True):
+    """单张图片：检测一次并打印提示（原来的用法）；颜色判断和流模式一样用 LightColorClassifier"""
+    from light_color import LightColorClassifier
+
+    image = cv2.imread(image_path)
+    boxes = detect_lights(model, image)
+    colors = LightColorClassifier().classify(image, boxes)
+    # 提示逻辑
+    if len(boxes) == 0:
+        print("未检测到红绿灯")
+    else:
+        print("前方有交通信号灯")
+        for color in colors:
+            print(MESSAGES[color])
+    if show:
+        cv2.imshow("result", draw_boxes(image, boxes, colors))
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
+
+
+def run_stream(model, source, headless=True, realtime=False, max_frames=None, full_every=FULL_EVERY, batch=1):
+    """
+    视频流：采集、推理、后处理分别在不同线程，只处理最新的帧。
+    检测由 DetectionScheduler 调度：只检测交通灯类别，每 full_every 帧一次整帧检测，中间帧只复查 ROI；
+    batch > 1 时多帧合成一个 batch 前向（吞吐优先，适合离线跑视频 / 图片目录：这类源不丢帧，每个 batch 都凑满）。
+    颜色由 LightColorClassifier 一次判断一帧里的全部灯框，再由 ColorSmoother 按跟踪编号对最近几帧投票。
+    提示只在结果变化时打印（同一个灯连续几十帧都是红灯时不会刷屏）。
+    """
+    from frame_stream import StreamPipeline
+    from detector_scheduler import DetectionScheduler
+    from light_color import ColorSmoother, LightColorClassifier
+
+    last = {"verdict": None}
+    scheduler = DetectionScheduler(model, full_every=full_every)
+    classifier = LightColorClassifier()
+    smoother = ColorSmoother()
+
+    def infer_one(frame, dets):
+        boxes = [d[:4] for d in dets]
+        colors = smoother.update([d[5] for d in dets], classifier.classify(frame.image, boxes))
+        return boxes, colors, (None if headless else draw_boxes(frame.image, boxes, colors))
+
+    def infer(frames):
+        if isinstance(frames, list):
+            return [infer_one(f, d) for f, d in zip(frames, scheduler.detect([f.image for f in frames]))]
+        return infer_one(frames, scheduler.detect(frames.image))
+
+    def post(frame):
+        boxes, colors, annotated = frame.detections
+        if not boxes:
+            verdict = "未检测到红绿灯"
+        elif "red" in colors:
+            verdict = MESSAGES["red"]
+        elif "yellow" in colors:
+            verdict = MESSAGES["yellow"]
+        elif "green" in colors:
+            verdict = MESSAGES["green"]
+        elif colors and all(c == "off" for c in colors):
+            verdict = MESSAGES["off"]
+        else:
+            verdict = "前方有交通信号灯"
+        if verdict != last["verdict"]:
+            print(f"[帧 {frame.index}] {verdict}")
+            last["verdict"] = verdict
+        if not headless:
+            cv2.imshow("result", annotated)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                return False
+        return verdict
+
+    pipeline = StreamPipeline(source, infer, post, queue_size=QUEUE_SIZE, max_age=MAX_AGE,
+                              realtime=realtime, max_frames=max_frames, batch_size=batch)
+    stats = pipeline.run()
+    if not headless:
+        cv2.destroyAllWindows()
+    print(f"处理 {stats['processed']}/{stats['captured']} 帧（{stats['processed_ratio']:.0%}），丢帧 {stats['dropped']}，"
+          f"{stats['fps']:.1f} FPS，"
+          f"延迟 p50 {_ms(stats['latency_p50'])} / p95 {_ms(stats['latency_p95'])} / max {_ms(stats['latency_max'])}")
+    s = scheduler.stats
+    print(f"整帧检测 {s['full']} 帧，ROI 复查 {s['roi']} 帧，前向 {s['forward']} 次")
+    return stats
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1e3:.0f}ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="红绿灯检测")
+    parser.add_argument("--source", default=None,
+                        help="摄像头编号（如 0）、视频文件或图片目录；不给时检测单张图片 IMAGE_PATH")
+    parser.add_argument("--headless", action="store_true", help="不弹窗口，只打印结果（没有显示器时用）")
+    parser.add_argument("--realtime", action="store_true", help="视频文件按原帧率播放（模拟摄像头）")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--full-every", type=int, default=FULL_EVERY, help="每 N 帧做一次整帧检测，1 表示每帧都做")
+    parser.add_argument("--batch", type=int, default=1, help="多帧合成一个 batch 推理（吞吐优先）")
+    parser.add_argument("--backend", choices=["pt", "onnx", "onnx-int8"], default=BACKEND)
+    parser.add_argument("--onnx", default=None, help="ONNX 模型路径，默认和 MODEL_PATH 同名的 .onnx / .int8.onnx")
+    args = parser.parse_args()
+
+    # 1. 加载预训练模型（YOLOv8n，支持交通灯识别）；ONNX 后端不导入 torch，加载后已预热
+    from detector_backend import load_backend
+    t0 = time.perf_counter()
+    model = load_backend(args.backend, MODEL_PATH, args.onnx)
+    print(f"模型已加载（{args.backend}），{time.perf_counter() - t0:.2f}s")
+    if args.source is None:
+        run_image(model, IMAGE_PATH, show=not args.headless)
+    else:
+        run_stream(model, args.source, headless=args.headless, realtime=args.realtime, max_frames=args.max_frames,
+                   full_every=args.full_every, batch=args.batch)
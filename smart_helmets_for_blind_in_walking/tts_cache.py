@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+短语级语音缓存：头盔说的话就那么几句（"检测到红灯"、"前方有交通信号灯"、障碍物提醒……），
+合成一次存成 wav，之后直接播放，不用每次都连讯飞的 websocket 或跑一遍 Piper。
+  - 按 (文本, 发音人 vcn / 模型, 采样率, 引擎) 的 sha256 作文件名，参数变了自然是另一份音频
+  - index.json 记录每条的大小和最近使用时间，总大小超过 max_bytes 时淘汰最久没用的（LRU）；
+    命中只改内存里的顺序，index.json 在写入 / 淘汰时、距上次落盘超过 save_interval 秒时和 flush() 时才写
+  - 几个进程（say.sh、super_smart-tts.py）共用一个目录：写 index.json 时加文件锁，先和磁盘上的版本合并再写，
+    谁也不会冲掉别人刚加的条目；index 里没有的 wav（别的进程写完文件还没来得及记）启动时收进来，照样参与淘汰
+  - warm 子命令在安装时把 PROMPTS 全部合成一遍，之后这些提示音没有网络也能播
+用法：
+  python tts_cache.py warm              # 预合成 PROMPTS（Piper）
+  python tts_cache.py say "检测到红灯"   # 命中缓存直接播，没命中先合成再播（say.sh 调的就是它）
+  python tts_cache.py stats
+讯飞引擎的缓存见 super_smart-tts.py（同一个 TtsCache，engine="xfyun"）。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+import wave
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows 上没有 fcntl，只能不加锁（头盔跑在 Linux 上）
+    fcntl = None
+
+# ========== 配置 ==========
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+MAX_BYTES = 50 * 1024 * 1024                 # 缓存总大小上限，超过按 LRU 淘汰
+PIPER_MODEL = "./zh_CN-huayan-medium.onnx"   # 同 say.sh
+PIPER_SAMPLE_RATE = 22050                    # 模型的 .onnx.json 里读不到时用它
+# 头盔固定会说的话，warm 时全部预合成（和 traffic_light_detecter.MESSAGES 对应，去掉 emoji）
+PROMPTS = [
+    "检测到红灯",
+    "检测到绿灯",
+    "检测到黄灯",
+    "交通灯未亮",
+    "前方有交通信号灯",
+    "检测到交通灯，但无法确定颜色",
+    "未检测到红绿灯",
+    "前方有障碍物，请停下",
+    "前方一米左右有障碍物，请注意避让",
+    "障碍物已消失，可以继续前进",
+    "环境昏暗，已打开头盔灯",
+]
+# =========================
+
+
+def cache_key(text, voice, sample_rate, engine):
+    """(文本, 发音人, 采样率, 引擎) → 内容地址（sha256 十六进制）"""
+    raw = json.dumps([text, voice, int(sample_rate), engine], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def write_wav(path, pcm, sample_rate, channels=1, bits=16):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(bits // 8)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+
+
+@contextmanager
+def _file_lock(path):
+    """跨进程互斥（flock），只用来保护 index.json 的 读-合并-写"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TtsCache(object):
+    """
+    get(text, voice, sample_rate, engine) → 命中时返回 wav 路径（同时刷新最近使用时间），否则 None；
+    put(...) 把 16bit 单声道 PCM 存成 wav 并返回路径。写文件先写临时文件再改名，进程中途被杀也不会留下半个 wav。
+    线程安全；hits / misses / evicted 记录命中情况。用完调 flush()（或用 with）把最近使用时间落盘。
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, save_interval=60.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock_path = self._index_path + ".lock"
+        self._dirty = False
+        self._index = self._load_index()
+        self._saved_at = time.monotonic()
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self):
+        """
+        按最近使用时间从旧到新排好；index 里有但文件已经没了的条目丢掉，
+        目录里有但 index 里没有的 wav 按文件大小和修改时间收进来（下次落盘时写进 index.json，超限时照常淘汰）
+        """
+        entries = {k: v for k, v in self._read_index().items() if os.path.exists(self._path(k))}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext != ".wav" or key in entries:
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries[key] = {"text": None, "voice": None, "sample_rate": None, "engine": None,
+                            "bytes": st.st_size, "last_used": st.st_mtime}
+            self._dirty = True
+        return OrderedDict(sorted(entries.items(), key=lambda kv: kv[1]["last_used"]))
+
+    def _save_index(self, keep=None):
+        """
+        加文件锁，把磁盘上别的进程加的条目和更新的最近使用时间并进来，在合并后的全集上按 LRU 淘汰，再原子写回。
+        自己淘汰掉的条目 wav 已经删了，合并时按文件是否还在判断，不会被重新加回来。
+        """
+        with _file_lock(self._lock_path):
+            for key, entry in self._read_index().items():
+                mine = self._index.get(key)
+                if mine is None:
+                    if os.path.exists(self._path(key)):
+                        self._index[key] = entry
+                elif entry["last_used"] > mine["last_used"]:
+                    mine["last_used"] = entry["last_used"]
+            self._index = OrderedDict(sorted(self._index.items(), key=lambda kv: kv[1]["last_used"]))
+            self._evict(keep)
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self._index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """命中后还没落盘的最近使用时间写进 index.json"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    @property
+    def total_bytes(self):
+        return sum(e["bytes"] for e in self._index.values())
+
+    def get(self, text, voice, sample_rate, engine):
+        key = cache_key(text, voice, sample_rate, engine)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or not os.path.exists(self._path(key)):
+                self._index.pop(key, None)
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            self._index.move_to_end(key)
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save_index()
+            self.hits += 1
+            return self._path(key)
+
+    def put(self, text, voice, sample_rate, engine, pcm):
+        key = cache_key(text, voice, sample_rate, engine)
+        path = self._path(key)
+        tmp = path + ".tmp"
+        write_wav(tmp, pcm, sample_rate)
+        os.replace(tmp, path)
+        with self._lock:
+            self._index[key] = {"text": text, "voice": voice, "sample_rate": int(sample_rate), "engine": engine,
+                                "bytes": os.path.getsize(path), "last_used": time.time()}
+            self._index.move_to_end(key)
+            self._save_index(keep=key)
+        return path
+
+    def _evict(self, keep=None):
+        """从最久没用的开始删，直到总大小不超过 max_bytes（刚写入的那条不删）"""
+        total = self.total_bytes
+        for key in list(self._index):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._index.pop(key)["bytes"]
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.evicted += 1
+
+    def stats(self):
+        return {"entries": len(self._index), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+
+def play_wav(path):
+    """ffplay 播放（同 piper_demo.py），阻塞到播完"""
+    subprocess.run(["ffplay", "-nodisp", "-autoexit", "-hide_banner", "-loglevel", "error", path], check=False)
+
+
+class PiperEngine(object):
+    """调用 piper 命令行合成，返回 16bit 单声道 PCM（同 say.sh 的 --output-raw）"""
+    name = "piper"
+
+    def __init__(self, model=PIPER_MODEL):
+        self.model = model
+        self.voice = os.path.basename(model)
+        self.sample_rate = _piper_sample_rate(model)
+
+    def synthesize(self, text):
+        p = subprocess.run(["piper", "--model", self.model, "--output-raw"], input=text.encode("utf-8"),
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        return p.stdout
+
+
+def _piper_sample_rate(model):
+    try:
+        with open(model + ".json", encoding="utf-8") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except (OSError, ValueError, KeyError):
+        return PIPER_SAMPLE_RATE
+
+
+class CachedSpeaker(object):
+    """
+    engine 需要有 name / voice / sample_rate 属性和 synthesize(text) → PCM 方法。
+    say(text)：命中缓存直接播；没命中时合成、存进缓存再播。合成失败（例如没网）返回 False，不抛异常。
+    """
+    def __init__(self, engine, cache=None, player=play_wav):
+        self.engine = engine
+        self.cache = cache or TtsCache()
+        self.player = player
+
+    def audio_path(self, text):
+        e = self.engine
+        path = self.cache.get(text, e.voice, e.sample_rate, e.name)
+        if path is None:
+            path = self.cache.put(text, e.voice, e.sample_rate, e.name, e.synthesize(text))
+        return path
+
+    def say(self, text):
+        try:
+            path = self.audio_path(text)
+        except Exception as ex:
+            print(f"⚠️ 语音合成失败（{self.engine.name}）: {ex!r}")
+            return False
+        self.player(path)
+        return True
+
+    def warm(self, texts=PROMPTS):
+        """把 texts 全部合成进缓存（已经有的跳过），返回 [(文本, 耗时秒 / 错误)]"""
+        out = []
+        for text in texts:
+            t0 = time.perf_counter()
+            try:
+                self.audio_path(text)
+                out.append((text, time.perf_counter() - t0))
+            except Exception as ex:
+                out.append((text, repr(ex)))
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="短语级语音缓存（Piper）")
+    parser.add_argument("--model", default=PIPER_MODEL)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=MAX_BYTES / 1024 / 1024)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_say = sub.add_parser("say", help="播放一句话，命中缓存时不用合成")
+    p_say.add_argument("text", nargs="+")
+    sub.add_parser("warm", help="预合成 PROMPTS")
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    with TtsCache(args.cache_dir, int(args.max_mb * 1024 * 1024)) as cache:
+        if args.cmd == "stats":
+            print(json.dumps(cache.stats(), ensure_ascii=False))
+            raise SystemExit(0)
+        speaker = CachedSpeaker(PiperEngine(args.model), cache)
+        if args.cmd == "say":
+            ok = speaker.say(" ".join(args.text))
+        else:
+            ok = None
+            for text, result in speaker.warm():
+                print(f"{text}: {'失败 ' + result if isinstance(result, str) else f'{result * 1e3:.0f}ms'}")
+            print(json.dumps(cache.stats(), ensure_ascii=False))
+    if ok is False:
+        raise SystemExit(1)
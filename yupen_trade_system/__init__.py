@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+鱼盆模型 / 指数偏离报表工具包。
+命令行入口见 cli.py：python -m yupen_trade_system {report,plot,backtest,sweep} ...
+导入包本身不加载 akshare / matplotlib 等重依赖，各子命令用到时才导入。
+"""
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+包的唯一入口：在仓库根目录运行 python -m yupen_trade_system <子命令>（见 cli.py）。
+包内模块都用相对导入，不能当脚本直接运行。
+"""
+from .cli import main
+
+# spawn 方式启动的子进程（sweep / 画图进程池）会以 __mp_main__ 重新导入本模块，不能再跑一遍命令
+if __name__ == "__main__":
+    main()
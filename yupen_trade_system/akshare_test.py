@@ -24,8 +24,22 @@ def demo4():
         else:
             print(f"{code} 没有找到")
 
+def demo5():
+    # 盘中用实时快照增量更新 MA20 状态（每次只需一次 spot 请求）
+    # 用到了包里的模块，要在仓库根目录用 python -m yupen_trade_system.akshare_test 运行
+    from yupen_trade_system.streaming_ma import StreamingMA, update_from_spot
+    indicators = {}
+    for code in ["000300", "000905"]:
+        hist = ak.stock_zh_index_daily(symbol="sh" + code)
+        indicators[code] = StreamingMA.from_history(hist["date"], hist["close"], window=20)
+    spot = ak.stock_zh_index_spot_em()
+    for code, (price, ma, above, cross_date) in update_from_spot(indicators, spot).items():
+        print(code, price, round(ma, 2), "Yes" if above else "No", cross_date,
+              "临界点位:", round(indicators[code].critical_price(), 2))
+
 if __name__ == '__main__':
     # demo1()
     # demo2()
     # demo3()
+    # demo5()
     demo4()
\ No newline at end of file
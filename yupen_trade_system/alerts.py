@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+状态翻转提醒：指数的 Yes/No 状态和上次确认的状态（FlipDetector.save 的文件，第一次运行时取 history.csv）
+不同时，推送到一个或多个出口
+（stdout、追加写 JSONL 文件、本地 HTTP webhook）。
+
+  - FlipDetector: 和上次状态比较，带回滞（偏离率要越过 ±hysteresis 个百分点才算翻转，
+    MA20 附近来回穿越不算）和去抖（连续 debounce 次观察都确认翻转才提醒，盘中服务里有用）
+  - AlertDispatcher: 后台线程异步发送，攒批（batch_size 条或 flush_interval 秒），
+    每一批并发发给所有出口；记录每条提醒从产生到送达的延迟
+  - MockWebhookServer: 本地 HTTP 服务，收下所有 POST 的批次，测试 / 演示用
+
+    with AlertDispatcher([StdoutAlertSink(), WebhookAlertSink(url)]) as dispatcher:
+        dispatcher.submit(detector.observe(out_df))
+    print(dispatcher.latency_summary())
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from .instrument import _quantiles
+
+
+def load_history_states(path):
+    """history.csv → {指数代码: 'Yes' / 'No'}；文件不存在时为空"""
+    if not path or not os.path.exists(path):
+        return {}
+    df = pd.read_csv(path, dtype={"指数代码": str}, encoding="utf-8-sig")
+    df = df[df["上次状态"].isin(["Yes", "No"])]
+    return dict(zip(df["指数代码"].str.zfill(6), df["上次状态"]))
+
+
+class FlipDetector(object):
+    """
+    baseline: {指数代码: 上次确认（已提醒）的状态}。
+    hysteresis: 新状态为 Yes 时偏离率需 >= +hysteresis，为 No 时需 <= -hysteresis（单位：百分点）。
+    debounce: 连续几次 observe 都确认翻转才提醒；提醒过后 baseline 换成新状态，不会重复提醒。
+    baseline 和去抖计数要跨运行保留（save / load），不能用 history.csv 代替：history.csv 每次都被原始状态覆盖，
+    被回滞 / 去抖压住的翻转会被当成基准，等真正确认时就不提醒了。
+    """
+    def __init__(self, baseline=None, hysteresis=0.0, debounce=1):
+        self.baseline = dict(baseline or {})
+        self.hysteresis = hysteresis
+        self.debounce = max(1, int(debounce))
+        self._pending = {}
+
+    @classmethod
+    def load(cls, path, fallback=None, **kw):
+        """从 save 写的 JSON 恢复；文件不存在时用 fallback 作 baseline（例如第一次运行时的 history.csv）"""
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            det = cls(data.get("baseline"), **kw)
+            det._pending = {k: int(v) for k, v in data.get("pending", {}).items()}
+            return det
+        return cls(fallback, **kw)
+
+    def save(self, path):
+        """baseline 和去抖计数原子写入 JSON"""
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"baseline": self.baseline, "pending": self._pending}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def observe(self, out_df, when=None):
+        """传入复盘表（rank_report 的结果），返回需要提醒的 alert 列表"""
+        when = pd.Timestamp(when) if when is not None else pd.Timestamp.now()
+        alerts = []
+        for row in out_df.to_dict("records"):
+            alert = self._check(row, when)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    def _check(self, row, when):
+        code, state, dev = str(row["指数代码"]).zfill(6), row["当前状态"], row["偏离率(%)"]
+        if state not in ("Yes", "No") or dev is None or pd.isna(dev):
+            return None
+        prev = self.baseline.get(code)
+        if prev is None:
+            # 第一次见到的指数只记下状态，不提醒
+            self.baseline[code] = state
+            return None
+        confirmed = state != prev and (dev >= self.hysteresis if state == "Yes" else dev <= -self.hysteresis)
+        if not confirmed:
+            self._pending.pop(code, None)
+            return None
+        self._pending[code] = self._pending.get(code, 0) + 1
+        if self._pending[code] < self.debounce:
+            return None
+        del self._pending[code]
+        self.baseline[code] = state
+        cross = row["状态穿越日"]
+        return {
+            "code": code,
+            "name": row["指数名称"],
+            "prev_state": prev,
+            "state": state,
+            "close": _num(row["当前点位"]),
+            "ma": _num(row["临界点位"]),
+            "deviation": _num(dev),
+            "cross_date": None if cross is None or pd.isna(cross) else pd.Timestamp(cross).strftime("%Y-%m-%d"),
+            "time": when.strftime("%Y-%m-%d %H:%M:%S"),
+            "created": time.time(),
+        }
+
+
+def _num(v):
+    return None if v is None or pd.isna(v) else round(float(v), 4)
+
+
+def format_alert(a):
+    return (f"🔔 {a['name']}({a['code']}) {a['prev_state']}→{a['state']}  点位 {a['close']}  临界 {a['ma']}  "
+            f"偏离 {a['deviation']:+.2f}%  穿越日 {a['cross_date']}")
+
+
+# ---------- 出口 ----------
+
+class StdoutAlertSink(object):
+    name = "stdout"
+
+    def send(self, batch):
+        for a in batch:
+            print(format_alert(a), flush=True)
+
+
+class FileAlertSink(object):
+    """每条提醒一行 JSON，追加写入"""
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, batch):
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for a in batch:
+                f.write(json.dumps(_public(a), ensure_ascii=False) + "\n")
+
+
+class WebhookAlertSink(object):
+    """一批提醒一次 POST：{"alerts": [...]}，失败按 backoff 重试 retries 次"""
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0, retries=2, backoff=0.5):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def send(self, batch):
+        body = json.dumps({"alerts": [_public(a) for a in batch]}, ensure_ascii=False).encode("utf-8")
+        for attempt in range(self.retries + 1):
+            try:
+                req = urllib.request.Request(self.url, data=body, method="POST",
+                                             headers={"Content-Type": "application/json; charset=utf-8"})
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    resp.read()
+                return
+            except OSError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+
+def _public(a):
+    return {k: v for k, v in a.items() if k != "created"}
+
+
+def make_alert_sinks(kinds, file_path=None, webhook_url=None):
+    """按名字建出口：'stdout' / 'file'（需要 file_path）/ 'webhook'（需要 webhook_url），缺参数时报错而不是悄悄不发"""
+    sinks = []
+    for kind in kinds:
+        if kind == "stdout":
+            sinks.append(StdoutAlertSink())
+        elif kind == "file":
+            if not file_path:
+                raise ValueError("提醒出口 file 需要 file_path（alert_file / --alert-file）")
+            sinks.append(FileAlertSink(file_path))
+        elif kind == "webhook":
+            if not webhook_url:
+                raise ValueError("提醒出口 webhook 需要 webhook_url（alert_webhook / --alert-webhook）")
+            sinks.append(WebhookAlertSink(webhook_url))
+        else:
+            raise ValueError(f"未知提醒出口: {kind}")
+    return sinks
+
+
+# ---------- 异步分发 ----------
+
+def _timed_send(sink, batch):
+    """在出口自己的线程里记送达时刻，不把等前面慢出口的时间算进来"""
+    sink.send(batch)
+    return time.time()
+
+
+class AlertDispatcher(object):
+    """
+    submit() 只是入队，不阻塞计算；后台线程攒够 batch_size 条或等满 flush_interval 秒后发一批，
+    一批并发发给所有出口，一个出口失败不影响其他出口。
+    latencies: {出口名: [从 alert 产生到该出口送达的秒数]}；metrics（RunMetrics）不为空时同时记进去。
+    """
+    def __init__(self, sinks, batch_size=50, flush_interval=0.2, metrics=None):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.latencies = {s.name: [] for s in self.sinks}
+        self.errors = {s.name: 0 for s in self.sinks}
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.sinks)))
+        self._thread = threading.Thread(target=self._loop, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, alerts):
+        for a in alerts:
+            a.setdefault("created", time.time())
+            self._queue.put(a)
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=left)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._send(batch)
+
+    def _send(self, batch):
+        self.batches += 1
+        futures = [(s, self._pool.submit(_timed_send, s, batch)) for s in self.sinks]
+        for sink, fut in futures:
+            try:
+                done = fut.result()
+            except Exception as e:
+                self.errors[sink.name] += 1
+                print(f"⚠️ 提醒发送失败 ({sink.name}): {e}")
+                continue
+            for a in batch:
+                self._observe(sink.name, done - a["created"])
+
+    def _observe(self, sink_name, seconds):
+        self.latencies[sink_name].append(seconds)
+        if self.metrics is not None:
+            self.metrics.observe(f"alert_latency.{sink_name}", seconds)
+
+    def close(self):
+        """发完队列里剩下的提醒再返回"""
+        self._queue.put(None)
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def latency_summary(self):
+        """{出口名: {count, p50, p95, max}}（秒）"""
+        return {name: _quantiles(sorted(v)) if v else {"count": 0} for name, v in self.latencies.items()}
+
+
+# ---------- 测试用 webhook ----------
+
+class MockWebhookServer(object):
+    """
+    本地 HTTP 服务，收下所有 POST 的 JSON 批次（received 列表，每项为 (收到时间, body)）。
+    port=0 时自动选端口；delay 秒模拟慢的接收方。
+        with MockWebhookServer() as server:
+            sink = WebhookAlertSink(server.url)
+    """
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, verbose=False):
+        self.received = []
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if delay:
+                    time.sleep(delay)
+                payload = json.loads(body.decode("utf-8"))
+                owner.received.append((time.time(), payload))
+                if verbose:
+                    for a in payload.get("alerts", []):
+                        print("📨", format_alert(a), flush=True)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/alerts"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def alerts(self):
+        return [a for _, payload in self.received for a in payload.get("alerts", [])]
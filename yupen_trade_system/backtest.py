@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+鱼盆模型回测：在本地缓存的多年日线上回放 Yes/No（收盘价是否在 MA 之上）状态，
+全部用 日期 × 指数 矩阵向量化计算，输出净值曲线、换手、回撤和每个指数的统计。
+
+规则：
+  - 第 t 天收盘后根据状态决定持仓，吃第 t+1 天的涨跌（没有未来函数）
+  - rotation="all"：所有 Yes 的指数等权；rotation="top_k"：只持有偏离率（趋势强度）最高的 k 个 Yes 指数
+  - threshold（%）：偏离率 > threshold 才转 Yes，< -threshold 才转 No，中间保持原状态（防止在均线附近来回穿越）
+  - confirm_days：状态需连续保持 N 天才生效
+  - cost_bps：按单边换手收取的成本（基点）
+一次回测只有几次矩阵运算，参数扫描时同一个窗口的 MA 会复用（见 run_grid）。
+"""
+
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from .compact_store import open_store
+from .ohlcv_cache import OhlcvCache
+from .yupen_engine import build_price_matrix, moving_average
+
+TRADING_DAYS = 252
+
+
+def load_close_matrix(cache_dir="cache", keys=None, suffix=None):
+    """
+    从 OhlcvCache 目录读出 日期 × symbol 收盘价矩阵。
+    keys 为缓存 key 列表；不给时读目录下全部文件（可用 suffix 过滤，例如 '_ak_index'）。
+    """
+    cache = OhlcvCache(cache_dir)
+    if keys is None:
+        ext = ".parquet" if cache.use_parquet else ".pkl"
+        keys = sorted(f[:-len(ext)] for f in os.listdir(cache_dir) if f.endswith(ext))
+        if suffix:
+            keys = [k for k in keys if k.endswith(suffix)]
+    return build_price_matrix({k: cache.load(k) for k in keys})
+
+
+def _run_length_confirm(state, confirm_days):
+    """状态连续保持 confirm_days 天才生效，否则沿用上一个生效状态（逐列向量化）"""
+    if confirm_days <= 1:
+        return state
+    n = state.shape[0]
+    rows = np.arange(n)[:, None]
+    changed = np.ones_like(state, dtype=bool)
+    changed[1:] = state[1:] != state[:-1]
+    last_change = np.maximum.accumulate(np.where(changed, rows, 0), axis=0)
+    run_len = rows - last_change + 1
+    confirmed = pd.DataFrame(np.where(run_len >= confirm_days, state, np.nan))
+    return confirmed.ffill().fillna(0.0).to_numpy()
+
+
+def signal_matrix(close, window=20, min_periods=1, threshold=0.0, confirm_days=1, ma=None):
+    """
+    返回 (signal, deviation)：signal 为 0/1 矩阵（1 = Yes），deviation 为偏离率（%）矩阵。
+    停牌日的收盘价和 MA 前向填充；ma 可以传入预先算好的 MA 矩阵以便参数扫描时复用。
+    """
+    if ma is None:
+        ma = moving_average(close, window, min_periods)
+    c = close.ffill().to_numpy(dtype=float)
+    m = ma.ffill().to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dev = (c - m) / m * 100
+    if threshold > 0:
+        raw = np.where(dev > threshold, 1.0, np.where(dev < -threshold, 0.0, np.nan))
+        raw = pd.DataFrame(raw).ffill().fillna(0.0).to_numpy()
+    else:
+        raw = np.where(np.isnan(dev), 0.0, (dev > 0).astype(float))
+    return _run_length_confirm(raw, confirm_days), dev
+
+
+def target_weights(signal, deviation, rotation="all", top_k=3):
+    """由 0/1 信号矩阵得到目标权重：Yes 的指数等权，top_k 模式只取偏离率最高的 k 个"""
+    held = signal > 0
+    if rotation == "top_k":
+        score = np.where(held & ~np.isnan(deviation), deviation, -np.inf)
+        # 每行按得分从高到低的名次（0 起）
+        order = np.argsort(-score, axis=1, kind="stable")
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(score.shape[1])[None, :].repeat(score.shape[0], 0), axis=1)
+        held = held & (ranks < top_k) & np.isfinite(score)
+    elif rotation != "all":
+        raise ValueError(f"未知的轮动规则: {rotation}")
+    n_held = held.sum(axis=1, keepdims=True)
+    return np.where(n_held > 0, held / np.maximum(n_held, 1), 0.0)
+
+
+class BacktestResult(object):
+    """回测结果：净值、日收益、权重、换手、回撤，以及汇总和分指数统计"""
+    def __init__(self, params, equity, returns, weights, turnover, drawdown, stats, per_index):
+        self.params = params
+        self.equity = equity
+        self.returns = returns
+        self.weights = weights
+        self.turnover = turnover
+        self.drawdown = drawdown
+        self.stats = stats
+        self.per_index = per_index
+
+    def __repr__(self):
+        return f"BacktestResult({self.params}, {self.stats})"
+
+
+def _summary(daily_ret, equity, drawdown, turnover, held):
+    n = len(daily_ret)
+    years = n / TRADING_DAYS if n else np.nan
+    total = equity[-1] - 1 if n else np.nan
+    vol = daily_ret.std() * np.sqrt(TRADING_DAYS) if n > 1 else np.nan
+    return {
+        "total_return": total,
+        "cagr": (equity[-1] ** (1 / years) - 1) if n and equity[-1] > 0 else np.nan,
+        "volatility": vol,
+        "sharpe": daily_ret.mean() * TRADING_DAYS / vol if vol else np.nan,
+        "max_drawdown": drawdown.min() if n else np.nan,
+        "avg_turnover": turnover.mean() if n else np.nan,
+        "time_in_market": float((held.sum(axis=1) > 0).mean()) if n else np.nan,
+    }
+
+
+def run_backtest(close, window=20, min_periods=1, threshold=0.0, confirm_days=1,
+                 rotation="all", top_k=3, cost_bps=5.0, ma=None, detail=True):
+    """
+    对 日期 × symbol 收盘价矩阵做一次回测。detail=False 时只算汇总指标（参数扫描用，更快）。
+    """
+    params = dict(window=window, min_periods=min_periods, threshold=threshold, confirm_days=confirm_days,
+                  rotation=rotation, top_k=top_k, cost_bps=cost_bps)
+    signal, dev = signal_matrix(close, window, min_periods, threshold, confirm_days, ma=ma)
+    w = target_weights(signal, dev, rotation, top_k)
+
+    c = close.ffill().to_numpy(dtype=float)
+    asset_ret = np.zeros_like(c)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        asset_ret[1:] = c[1:] / c[:-1] - 1
+    asset_ret = np.nan_to_num(asset_ret, nan=0.0, posinf=0.0, neginf=0.0)
+
+    # 第 t 天的持仓来自第 t-1 天收盘后的信号
+    held = np.zeros_like(w)
+    held[1:] = w[:-1]
+    turnover = np.abs(np.diff(held, axis=0, prepend=0.0)).sum(axis=1)
+    daily = (held * asset_ret).sum(axis=1) - turnover * cost_bps / 10000.0
+    equity = np.cumprod(1 + daily)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+
+    stats = _summary(daily, equity, drawdown, turnover, held)
+    if not detail:
+        return BacktestResult(params, None, None, None, None, None, stats, None)
+
+    idx, cols = close.index, close.columns
+    pos = (held > 0)
+    entries = pos[1:] & ~pos[:-1]
+    timing = np.where(signal[:-1] > 0, asset_ret[1:], 0.0)
+    first = np.argmax(~np.isnan(c), axis=0)
+    last_px = c[-1]
+    first_px = c[first, np.arange(c.shape[1])]
+    per_index = pd.DataFrame({
+        "time_in_market": pos.mean(axis=0),
+        "entries": entries.sum(axis=0),
+        "contribution": (held * asset_ret).sum(axis=0),
+        "timing_return": np.prod(1 + timing, axis=0) - 1,
+        "buy_hold_return": last_px / first_px - 1,
+    }, index=cols)
+    return BacktestResult(
+        params,
+        pd.Series(equity, index=idx, name="equity"),
+        pd.Series(daily, index=idx, name="return"),
+        pd.DataFrame(held, index=idx, columns=cols),
+        pd.Series(turnover, index=idx, name="turnover"),
+        pd.Series(drawdown, index=idx, name="drawdown"),
+        stats,
+        per_index,
+    )
+
+
+def run_grid(close, grid, **fixed):
+    """
+    参数扫描：grid 为 {参数名: 取值列表}，返回每组参数一行的汇总表。
+    同一个 (window, min_periods) 的 MA 只算一次。
+    """
+    names = list(grid)
+    ma_cache = {}
+    rows = []
+    for combo in itertools.product(*(grid[n] for n in names)):
+        params = dict(fixed, **dict(zip(names, combo)))
+        key = (params.get("window", 20), params.get("min_periods", 1))
+        if key not in ma_cache:
+            ma_cache[key] = moving_average(close, *key)
+        res = run_backtest(close, ma=ma_cache[key], detail=False, **params)
+        rows.append(dict(res.params, **res.stats))
+    return pd.DataFrame(rows)
+
+
+def main(cache_dir="cache", suffix="_ak_index", store=None):
+    """
+    默认参数网格回测 yupen_strategy2 缓存的指数日线（suffix 只选该数据源的缓存）；
+    store 为 compact_store 目录时直接读内存映射的收盘价矩阵。
+    """
+    # ========== 配置区 ==========
+    grid = {
+        "window": [10, 20, 30, 60],
+        "threshold": [0.0, 0.5, 1.0],
+        "confirm_days": [1, 2, 3],
+        "rotation": ["all", "top_k"],
+    }
+    # ============================
+    close = open_store(store).matrix("close") if store else load_close_matrix(cache_dir, suffix=suffix)
+    if close.empty:
+        print(f"⚠️ {cache_dir} 中没有缓存数据，请先运行 python -m yupen_trade_system report")
+        return None
+    base = run_backtest(close)
+    print("MA20 全部 Yes 等权：", base.stats)
+    print(base.per_index)
+    table = run_grid(close, grid)
+    print(table.sort_values("sharpe", ascending=False).head(20))
+    return table
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+热点路径基准测试，数据全部来自 fixtures（离线合成），不访问网络。
+覆盖：normalize_df、逐个指数的 find_last_cross_date、向量化 compute_states、多指标流水线、趋势强度排名、
+报表导出（csv / jsonl / parquet / xlsx）、画图，规模默认 10 / 1000 / 10000 个指数。
+
+每次运行追加一条记录到 bench_results.jsonl，并和上一次同参数（天数、重复次数）的记录比较，
+变慢超过 tolerance 的项标为回归。
+运行: python -m yupen_trade_system bench [--sizes 10,1000,10000] [--days 500] [--fail-on-regression]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import pandas as pd
+
+from .fixtures import load_seeds, make_universe
+from .indicators import IndicatorPipeline
+from .normalize import normalize_df
+from .report_sinks import make_sink, render_excel
+from .yupen_engine import build_price_matrix, compute_states, trend_rank
+
+# ========== 配置区 ==========
+SIZES = [10, 1000, 10000]
+N_DAYS = 500              # 每个指数的日线长度
+REPEAT = 3                # 每项重复次数，取最快一次
+PLOT_LIMIT = 20           # 画图只画前 N 个指数（画一万张图没有意义），耗时按张数报告
+LOOP_LIMIT = 1000         # 逐个指数调用 find_last_cross_date 的最大规模，超过则按比例外推
+RESULTS_FILE = "bench_results.jsonl"
+TOLERANCE = 0.2           # 比上次慢 20% 以上算回归
+NOISE_FLOOR = 0.005       # 5ms 以下的差异不算
+INDICATORS = ["ma20", "ma60", "ema20", "vwma20", "atr_dev20", "W:ma20", "M:ma10"]
+# ============================
+
+
+def _timeit(fn, repeat):
+    """运行 repeat 次，返回最快一次的秒数"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def _report_frame(states, names):
+    """和 yupen_strategy2.main 相同的报表列，用于排名和导出"""
+    dev = states["deviation"].astype("float64")
+    df = pd.DataFrame({
+        "指数代码": states.index,
+        "指数名称": [names[c] for c in states.index],
+        "当前状态": ["Yes" if a else "No" for a in states["above"]],
+        "当前点位": states["close"].to_numpy(),
+        "临界点位": states["ma"].to_numpy(),
+        "偏离率(%)": dev.to_numpy(),
+        "状态穿越日": states["cross_date"].to_numpy(),
+    })
+    return df
+
+
+def _git_rev():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_size(n, n_days=N_DAYS, repeat=REPEAT, plot=True, plot_workers=1, seeds=None):
+    """跑一个规模的全部项目，返回 {项目名: 秒}"""
+    from .yupen_strategy2 import find_last_cross_date
+
+    res = {}
+    raw, names = make_universe(n, n_days, seeds=seeds, raw=True)
+
+    res["normalize"] = _timeit(lambda: [normalize_df(df, schema="bench") for df in raw.values()], repeat)
+    frames = {code: normalize_df(df, schema="bench") for code, df in raw.items()}
+
+    # 逐个指数算穿越日（旧路径），规模大时只跑前 LOOP_LIMIT 个再按比例外推
+    loop_codes = list(frames)[:LOOP_LIMIT]
+    t = _timeit(lambda: [find_last_cross_date(frames[c]) for c in loop_codes], 1)
+    res["cross_date_loop"] = t * n / len(loop_codes)
+
+    def vectorized():
+        return compute_states(build_price_matrix(frames), window=20, min_periods=1)
+    res["states_vectorized"] = _timeit(vectorized, repeat)
+    # 同一条流水线上 MA20 状态 + 多个指标，和只算 MA20 状态比较可以看出中间结果是否共享
+    res["pipeline_ma20"] = _timeit(lambda: IndicatorPipeline(frames).states("ma20"), repeat)
+    res["pipeline_indicators"] = _timeit(lambda: IndicatorPipeline(frames).latest(INDICATORS), repeat)
+
+    report = _report_frame(vectorized(), names)
+    res["rank"] = _timeit(lambda: report.assign(趋势强度=trend_rank(report["偏离率(%)"]).to_numpy())
+                          .sort_values(by="趋势强度"), repeat)
+
+    tmp = tempfile.mkdtemp(prefix="yupen_bench_")
+    try:
+        formats = ["csv", "jsonl"]
+        try:
+            import pyarrow  # noqa: F401
+            formats.append("parquet")
+        except ImportError:
+            pass
+        for fmt in formats:
+            def export(fmt=fmt):
+                with make_sink([fmt], os.path.join(tmp, "report")) as sink:
+                    sink.write_frame(report)
+            res[f"export_{fmt}"] = _timeit(export, repeat)
+        try:
+            import openpyxl  # noqa: F401
+            res["export_xlsx"] = _timeit(lambda: render_excel(report, os.path.join(tmp, "report.xlsx")), repeat)
+        except ImportError:
+            pass
+
+        if plot:
+            res.update(_bench_plot(frames, names, min(n, PLOT_LIMIT), tmp, plot_workers))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return res
+
+
+def _bench_plot(frames, names, n_plots, tmp, workers):
+    """画 n_plots 张 K 线图：第一次全部渲染，第二次数据未变全部跳过；返回每张图的耗时"""
+    try:
+        from .chart_pipeline import render_charts
+        from .index_report import plot_job
+    except ImportError:
+        return {}
+    plot_dir = os.path.join(tmp, "plots")
+    os.makedirs(plot_dir, exist_ok=True)
+    jobs = [plot_job("candle", df, names[c], c, "bench", plot_dir)
+            for c, df in list(_ohlcv(frames).items())[:n_plots]]
+    t0 = time.perf_counter()
+    stats = render_charts(jobs, plot_dir, workers=workers)
+    t1 = time.perf_counter()
+    render_charts(jobs, plot_dir, workers=workers)
+    t2 = time.perf_counter()
+    if stats["failed"]:
+        print("  ⚠️ 画图失败:", stats["failed"][0])
+    return {"plot_per_chart": (t1 - t0) / max(1, len(jobs)), "plot_skip_unchanged": t2 - t1}
+
+
+def _ohlcv(frames):
+    """normalize 后只剩 date/close，画 K 线图时补出 OHLCV 列"""
+    out = {}
+    for code, df in frames.items():
+        out[code] = df.assign(open=df["close"], high=df["close"], low=df["close"], volume=1.0)
+    return out
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(current, previous, tolerance=TOLERANCE, noise_floor=NOISE_FLOOR):
+    """返回 [(项目, 本次秒, 上次秒, 比值, 是否回归)]"""
+    rows = []
+    for key, now in current.items():
+        prev = previous.get(key) if previous else None
+        ratio = now / prev if prev else None
+        regressed = bool(ratio is not None and ratio > 1 + tolerance and now - prev > noise_floor)
+        rows.append((key, now, prev, ratio, regressed))
+    return rows
+
+
+def run(sizes=None, n_days=N_DAYS, repeat=REPEAT, plot=True, plot_workers=1,
+        results_file=RESULTS_FILE, seed_dir="."):
+    """跑全部规模，写入结果文件，打印和上次的对比；返回 (本次记录, 回归项列表)"""
+    sizes = sizes or SIZES
+    seeds = load_seeds(seed_dir)
+    results = {}
+    for n in sizes:
+        print(f"基准测试: {n} 个指数 × {n_days} 天 ...")
+        for key, sec in bench_size(n, n_days, repeat, plot, plot_workers, seeds).items():
+            results[f"{key}@{n}"] = sec
+
+    params = {"days": n_days, "repeat": repeat}
+    history = load_history(results_file)
+    previous = next((r for r in reversed(history) if r.get("params") == params), None)
+    record = {"ts": time.strftime("%Y-%m-%d %H:%M:%S"), "rev": _git_rev(), "params": params, "results": results}
+
+    rows = compare(results, previous["results"] if previous else None)
+    print(f"{'项目':<28}{'本次(ms)':>12}{'上次(ms)':>12}{'比值':>8}")
+    for key, now, prev, ratio, regressed in rows:
+        prev_s = f"{prev * 1e3:12.2f}" if prev else f"{'-':>12}"
+        ratio_s = f"{ratio:8.2f}" if ratio else f"{'-':>8}"
+        print(f"{key:<30}{now * 1e3:12.2f}{prev_s}{ratio_s}{'  ⚠️ 回归' if regressed else ''}")
+    if previous:
+        print(f"对比基准: {previous['ts']} ({previous.get('rev')})")
+
+    with open(results_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record, [r[0] for r in rows if r[4]]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+独立的画图阶段：主流程只收集画图任务，数值报表写完后再统一渲染。
+  - 进程池并发，worker 使用无界面的 Agg 后端
+  - 字体 rcParams 和 mplfinance 的样式在每个 worker 里只建一次
+  - 对要画的数据算内容哈希，记在 PLOT_DIR/.plot_hashes.json，数据没变且图片还在就跳过
+任务是普通 dict：
+  {"kind": "candle" | "line", "df": DataFrame, "title": str, "path": 输出文件, "dpi": 150, "ma_window": 20}
+candle 任务的 df 为 DatetimeIndex + Open/High/Low/Close/Volume；line 任务的 df 为 date/close 两列。
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+MANIFEST_NAME = ".plot_hashes.json"
+
+# worker 进程内只初始化一次
+_plt = None
+_candle_style = None
+
+
+def _init_worker():
+    global _plt
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
+    _plt = plt
+
+
+def _get_candle_style():
+    """红涨绿跌的 mplfinance 样式，每个进程只建一次"""
+    global _candle_style
+    if _candle_style is None:
+        import mplfinance as mpf
+        mc = mpf.make_marketcolors(
+            up='red',       # 上涨为红色
+            down='green',   # 下跌为绿色
+            edge='inherit',
+            wick={'up': 'red', 'down': 'green'},
+            volume='in'
+        )
+        _candle_style = mpf.make_mpf_style(marketcolors=mc, gridstyle='-', y_on_right=True,
+                                           rc={'font.family': 'SimHei'})
+    return _candle_style
+
+
+def _render_candle(job):
+    import mplfinance as mpf
+    df = job["df"]
+    ma = df['Close'].rolling(window=job.get("ma_window", 20)).mean()
+    ap = mpf.make_addplot(ma, color='orange', width=1.5)
+    mpf.plot(
+        df,
+        type='candle',
+        style=_get_candle_style(),
+        title=job["title"],
+        ylabel='Price (CNY)',
+        volume=True,
+        ylabel_lower='Volume',
+        figsize=(12, 8),
+        addplot=ap,
+        savefig=dict(fname=job["path"], dpi=job.get("dpi", 150)),
+    )
+
+
+def _render_line(job):
+    plt = _plt
+    df = job["df"]
+    window = job.get("ma_window", 20)
+    fig = plt.figure(figsize=(8, 4))
+    try:
+        plt.plot(df["date"], df["close"], label="收盘价")
+        plt.plot(df["date"], df["close"].rolling(window=window).mean(), label=f"{window}日均线", linestyle="--")
+        plt.title(job["title"])
+        plt.xlabel("日期")
+        plt.ylabel("价格 / 指数")
+        plt.legend()
+        plt.grid(True, linestyle="--", alpha=0.5)
+        plt.tight_layout()
+        plt.savefig(job["path"], dpi=job.get("dpi", 150))
+    finally:
+        plt.close(fig)
+
+
+def _render(job):
+    """在 worker 中渲染一个任务，返回 (path, 错误信息或 None)"""
+    try:
+        if job["kind"] == "candle":
+            _render_candle(job)
+        else:
+            _render_line(job)
+        return job["path"], None
+    except Exception as e:
+        return job["path"], str(e)
+
+
+def job_hash(job):
+    """画图内容哈希：数据 + 标题 + 图类型 + 参数"""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(job["df"], index=True).to_numpy().tobytes())
+    h.update(json.dumps([job["kind"], job["title"], job.get("dpi", 150), job.get("ma_window", 20)],
+                        ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load_manifest(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def render_charts(jobs, plot_dir, workers=None):
+    """
+    渲染全部任务，数据没变的跳过。返回 {"rendered": n, "skipped": n, "failed": [(path, err), ...]}。
+    workers=1 或只有一张要画时也放进单进程的进程池里画：Agg 后端和字体设置只改 worker，
+    不动调用方进程的 matplotlib 后端（切后端会关掉调用方已经打开的图）。
+    """
+    manifest_path = os.path.join(plot_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    todo, hashes = [], {}
+    skipped = 0
+    for job in jobs:
+        digest = job_hash(job)
+        key = os.path.basename(job["path"])
+        if manifest.get(key) == digest and os.path.exists(job["path"]):
+            skipped += 1
+            continue
+        hashes[key] = digest
+        todo.append(job)
+
+    results = []
+    if todo:
+        n = 1 if workers == 1 or len(todo) == 1 else workers
+        with ProcessPoolExecutor(max_workers=n, initializer=_init_worker) as pool:
+            results = list(pool.map(_render, todo))
+
+    failed = [(p, err) for p, err in results if err is not None]
+    for p, err in results:
+        if err is None:
+            manifest[os.path.basename(p)] = hashes[os.path.basename(p)]
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return {"rendered": len(todo) - len(failed), "skipped": skipped, "failed": failed}
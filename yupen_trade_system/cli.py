@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+命令行入口：
+  python -m yupen_trade_system report [--offline] [--workers N] [--formats csv,parquet] [--no-excel] [--spot]
+  python -m yupen_trade_system serve [--intraday 30] [--close-time 15:05] [--deviation-step 0.5] [--charts]
+  python -m yupen_trade_system mock-webhook [--port 8765]
+  python -m yupen_trade_system plot [--style candle|line] [--no-plot] [--offline]
+  python -m yupen_trade_system backtest [--cache-dir cache]
+  python -m yupen_trade_system sweep [--workers N] [--checkpoint sweep_results.csv]
+  python -m yupen_trade_system store [--cache-dir cache] [--out ohlcv_store]
+  python -m yupen_trade_system bench [--sizes 10,1000,10000] [--days 500] [--fail-on-regression]
+每个子命令只导入自己用到的模块，所以 `--help` 和 backtest 不会加载 akshare / matplotlib。
+"""
+
+import argparse
+import time
+
+
+def _configure_report(ys, args):
+    """report / serve 共用的 yupen_strategy2 配置项"""
+    if args.offline:
+        ys.offline = True
+    if args.workers is not None:
+        ys.max_workers = args.workers
+    if args.formats:
+        ys.report_formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    if args.no_excel:
+        ys.excel_output = False
+    if args.output_dir:
+        ys.output_dir = args.output_dir
+    if args.indicators:
+        ys.extra_indicators = [x.strip() for x in args.indicators.split(",") if x.strip()]
+    if args.state_line:
+        ys.state_line = args.state_line
+    if args.metrics:
+        ys.metrics_file = args.metrics
+    if args.prometheus:
+        ys.prometheus_file = args.prometheus
+    if args.alert is not None:
+        ys.alert_sinks = [x.strip() for x in args.alert.split(",") if x.strip()]
+    if args.alert_file:
+        ys.alert_file = args.alert_file
+    if args.alert_webhook:
+        ys.alert_webhook = args.alert_webhook
+    if args.hysteresis is not None:
+        ys.alert_hysteresis = args.hysteresis
+    if args.debounce is not None:
+        ys.alert_debounce = args.debounce
+    if args.cache_dir:
+        ys.cache_dir = args.cache_dir
+        ys.init_sources()
+
+
+def cmd_report(args):
+    from . import yupen_strategy2 as ys
+    _configure_report(ys, args)
+    if args.spot:
+        ys.spot_main()
+    else:
+        ys.main()
+
+
+def cmd_serve(args):
+    from . import yupen_strategy2 as ys
+    from . import service
+    _configure_report(ys, args)
+    if args.intraday is not None:
+        service.intraday_minutes = args.intraday
+    if args.close_time:
+        service.close_time = args.close_time
+    if args.deviation_step is not None:
+        service.deviation_step = args.deviation_step
+    if args.charts:
+        service.charts = True
+    service.main(once=args.once)
+
+
+def cmd_mock_webhook(args):
+    from .alerts import MockWebhookServer
+    server = MockWebhookServer(port=args.port, verbose=True).start()
+    print(f"📮 mock webhook: {server.url}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"共收到 {len(server.received)} 批、{len(server.alerts)} 条提醒")
+
+
+def cmd_plot(args):
+    if args.style == "candle":
+        from . import yupen_strategy as mod
+    else:
+        from . import index_deviation_report as mod
+    if args.offline:
+        mod.OFFLINE = True
+    if args.cache_dir:
+        mod.CACHE_DIR = args.cache_dir
+    if args.workers is not None:
+        mod.PLOT_WORKERS = args.workers
+    if args.metrics:
+        mod.METRICS_FILE = args.metrics
+    if args.prometheus:
+        mod.PROMETHEUS_FILE = args.prometheus
+    mod.main(plot=not args.no_plot)
+
+
+def cmd_backtest(args):
+    from .backtest import main
+    main(cache_dir=args.cache_dir or "cache", suffix=args.suffix, store=args.store)
+
+
+def cmd_sweep(args):
+    from .sweep import main
+    main(cache_dir=args.cache_dir or "cache", suffix=args.suffix, checkpoint=args.checkpoint,
+         workers=args.workers, store=args.store)
+
+
+def cmd_store(args):
+    from .compact_store import OhlcvStore
+    store = OhlcvStore.from_cache(args.cache_dir or "cache", suffix=args.suffix or None)
+    store.save(args.out)
+    print(f"✅ {len(store.symbols)} 个 symbol × {len(store.days)} 天，{store.nbytes / 2 ** 20:.1f} MB → {args.out}")
+
+
+def cmd_bench(args):
+    from . import bench
+    sizes = [int(x) for x in args.sizes.split(",")] if args.sizes else None
+    _, regressions = bench.run(sizes=sizes, n_days=args.days, repeat=args.repeat, plot=not args.no_plot,
+                               plot_workers=args.plot_workers, results_file=args.results, seed_dir=args.seed_dir)
+    if regressions and args.fail_on_regression:
+        raise SystemExit(f"性能回归: {', '.join(regressions)}")
+
+
+def _report_options(p):
+    p.add_argument("--offline", action="store_true", help="只读本地缓存，不访问网络")
+    p.add_argument("--workers", type=int, default=None, help="并发拉取线程数")
+    p.add_argument("--formats", default=None, help="核心结果格式，逗号分隔：csv,jsonl,parquet,xlsx")
+    p.add_argument("--no-excel", action="store_true", help="不额外生成 Excel 复盘表")
+    p.add_argument("--output-dir", default=None)
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--metrics", default=None, help="运行指标 JSON 路径")
+    p.add_argument("--prometheus", default=None, help="Prometheus 文本格式输出路径")
+    p.add_argument("--indicators", default=None, help="额外指标列，逗号分隔，如 ma60,ema20,atr_dev20,W:ma20")
+    p.add_argument("--state-line", default=None, help="状态参考线，默认 ma20")
+    p.add_argument("--alert", default=None, help="状态翻转提醒出口，逗号分隔：stdout,file,webhook；空字符串表示不提醒")
+    p.add_argument("--alert-file", default=None, help="file 出口的 JSONL 路径")
+    p.add_argument("--alert-webhook", default=None, help="webhook 出口的 URL")
+    p.add_argument("--hysteresis", type=float, default=None, help="偏离率越过 ±N 个百分点才算翻转")
+    p.add_argument("--debounce", type=int, default=None, help="连续 N 次确认才提醒")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m yupen_trade_system", description="鱼盆模型 / 指数偏离报表")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("report", help="鱼盆模型复盘（yupen_strategy2）")
+    _report_options(p)
+    p.add_argument("--spot", action="store_true", help="盘中快速刷新：一次实时快照 + 本地缓存的历史日线")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("serve", help="常驻服务：按交易日历定时刷新，只在状态翻转 / 偏离率变化时输出")
+    _report_options(p)
+    p.add_argument("--intraday", type=int, default=None, help="盘中快照刷新间隔（分钟），0 表示只跑收盘")
+    p.add_argument("--close-time", default=None, help="收盘后运行时刻，默认 15:05")
+    p.add_argument("--deviation-step", type=float, default=None, help="偏离率变化超过多少个百分点才输出")
+    p.add_argument("--charts", action="store_true", help="有变化的指数重画 K 线图")
+    p.add_argument("--once", choices=["close", "intraday"], default=None, help="立即跑一轮就退出")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("mock-webhook", help="本地 mock webhook，打印收到的状态翻转提醒")
+    p.add_argument("--port", type=int, default=8765)
+    p.set_defaults(func=cmd_mock_webhook)
+
+    p = sub.add_parser("plot", help="指数偏离报表 + 每个指数一张图")
+    p.add_argument("--style", choices=["candle", "line"], default="candle",
+                   help="candle: A 股指数 K 线图（yupen_strategy）；line: 折线图（index_deviation_report）")
+    p.add_argument("--no-plot", action="store_true", help="只写报表，不画图")
+    p.add_argument("--offline", action="store_true")
+    p.add_argument("--workers", type=int, default=None, help="画图进程数")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--metrics", default=None, help="运行指标 JSON 路径")
+    p.add_argument("--prometheus", default=None, help="Prometheus 文本格式输出路径")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("backtest", help="MA 穿越策略回测（读 report 的日线缓存）")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--suffix", default="_ak_index", help="只用该数据源的缓存文件")
+    p.add_argument("--store", default=None, help="用 store 子命令生成的紧凑存储目录代替缓存")
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser("store", help="把日线缓存转成紧凑的 float32 列式存储（可内存映射）")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--suffix", default=None, help="只转换该数据源的缓存文件，如 _ak_index")
+    p.add_argument("--out", default="ohlcv_store")
+    p.set_defaults(func=cmd_store)
+
+    p = sub.add_parser("sweep", help="大网格参数扫描（多进程，可断点续跑）")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--store", default=None, help="用 store 子命令生成的紧凑存储目录代替缓存")
+    p.add_argument("--suffix", default="_ak_index")
+    p.add_argument("--checkpoint", default="sweep_results.csv")
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=cmd_sweep)
+
+    p = sub.add_parser("bench", help="离线基准测试（合成行情，不访问网络）")
+    p.add_argument("--sizes", default=None, help="指数个数，逗号分隔，默认 10,1000,10000")
+    p.add_argument("--days", type=int, default=500)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-plot", action="store_true")
+    p.add_argument("--plot-workers", type=int, default=1)
+    p.add_argument("--results", default="bench_results.jsonl", help="结果追加到该文件，并与上次比较")
+    p.add_argument("--seed-dir", default=".", help="从这里的已有报表读取合成行情的起点")
+    p.add_argument("--fail-on-regression", action="store_true", help="有回归时以非 0 退出")
+    p.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
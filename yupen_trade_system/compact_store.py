@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的列式 OHLCV 存储，给几千个指数 / 个股、十几年日线这种规模用：
+  - 所有 symbol 共用一条日期轴，日期存成 int32 的天序号（1970-01-01 起的天数）
+  - 每个字段一个 日期 × symbol 的 float32 矩阵（没有数据的位置为 NaN），不再是每个 symbol 一个 DataFrame + DatetimeIndex
+  - save() 写成 .npy 文件，open_store(mmap=True) 用内存映射打开，按需从磁盘读页，多个进程可以共享同一份页缓存
+
+5000 个 symbol × 15 年（约 3700 个交易日）× 5 个字段约 370MB，float64 的 DataFrame 版本要多一倍以上，还不算索引和对象开销。
+float32 有 7 位有效数字，指数点位的误差在 0.001 量级，对 MA / 偏离率没有影响；计算时再转成 float64。
+
+读取都是视图，不复制：field() / column() 直接返回 numpy 视图，matrix() 把视图包成 DataFrame。
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ohlcv_cache import OhlcvCache
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def to_ordinals(dates):
+    """日期 → int32 天序号"""
+    d = pd.DatetimeIndex(pd.to_datetime(dates)).to_numpy().astype("datetime64[D]")
+    return (d - _EPOCH).astype(np.int32)
+
+
+def from_ordinals(ordinals):
+    return pd.DatetimeIndex((np.asarray(ordinals, dtype=np.int64) + _EPOCH.astype(np.int64)).astype("datetime64[D]")
+                            .astype("datetime64[ns]"))
+
+
+class OhlcvStore(object):
+    """
+    days: int32 天序号（升序、唯一），长度 T；symbols: 长度 N 的列表；
+    data: {字段: (T, N) float32 数组}，可以是普通数组，也可以是 np.memmap。
+    """
+    def __init__(self, days, symbols, data):
+        self.days = days
+        self.symbols = list(symbols)
+        self.data = data
+        self._col = {s: i for i, s in enumerate(self.symbols)}
+
+    # ---- 构建 ----
+
+    @classmethod
+    def from_frames(cls, frames, fields=FIELDS, date_col="date"):
+        """
+        由 {symbol: DataFrame} 构建。每个 DataFrame 读完就只保留 float32 数组，
+        峰值内存约为结果的两倍，不会同时持有全部 DataFrame 的 float64 副本（frames 可以是惰性的生成器）。
+        """
+        parts = []
+        for sym, df in (frames.items() if hasattr(frames, "items") else frames):
+            if df is None or df.empty:
+                continue
+            days = to_ordinals(df[date_col])
+            keep = ~pd.Index(days).duplicated(keep="last")
+            cols = {}
+            for f in fields:
+                if f in df.columns:
+                    v = df[f]
+                    if v.dtype.kind not in "fiu":
+                        v = pd.to_numeric(v, errors="coerce")
+                    cols[f] = v.to_numpy(dtype=np.float32)[keep]
+            parts.append((sym, days[keep], cols))
+        if not parts:
+            return cls(np.empty(0, np.int32), [], {f: np.empty((0, 0), np.float32) for f in fields})
+        axis = np.unique(np.concatenate([d for _, d, _ in parts]))
+        data = {f: np.full((len(axis), len(parts)), np.nan, dtype=np.float32) for f in fields}
+        for j, (_, d, cols) in enumerate(parts):
+            pos = np.searchsorted(axis, d)
+            for f, v in cols.items():
+                data[f][pos, j] = v
+        return cls(axis.astype(np.int32), [s for s, _, _ in parts], data)
+
+    @classmethod
+    def from_cache(cls, cache_dir="cache", keys=None, suffix=None, fields=FIELDS):
+        """从 OhlcvCache 目录逐个文件读入（一次只在内存里放一个 DataFrame）"""
+        cache = OhlcvCache(cache_dir)
+        if keys is None:
+            ext = ".parquet" if cache.use_parquet else ".pkl"
+            keys = sorted(f[:-len(ext)] for f in os.listdir(cache_dir) if f.endswith(ext))
+            if suffix:
+                keys = [k for k in keys if k.endswith(suffix)]
+        return cls.from_frames(((k, cache.load(k)) for k in keys), fields)
+
+    # ---- 持久化 ----
+
+    def save(self, path):
+        """写成目录：days.npy、{字段}.npy、meta.json（.npy 可以直接内存映射）"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "days.npy"), np.ascontiguousarray(self.days, dtype=np.int32))
+        for f, arr in self.data.items():
+            np.save(os.path.join(path, f"{f}.npy"), np.ascontiguousarray(arr, dtype=np.float32))
+        meta = {"symbols": self.symbols, "fields": list(self.data), "version": 1}
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        return path
+
+    # ---- 读取（视图） ----
+
+    @property
+    def dates(self):
+        return from_ordinals(self.days)
+
+    @property
+    def nbytes(self):
+        return int(self.days.nbytes + sum(a.nbytes for a in self.data.values()))
+
+    def _rows(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.days, to_ordinals([start])[0], side="left"))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, to_ordinals([end])[0], side="right"))
+        return slice(lo, hi)
+
+    def field(self, name, start=None, end=None):
+        """(T, N) float32 视图，按日期切片也不复制"""
+        return self.data[name][self._rows(start, end)]
+
+    def column(self, symbol, name="close", start=None, end=None):
+        """单个 symbol 的一列（跨步视图，不复制）"""
+        return self.data[name][self._rows(start, end), self._col[symbol]]
+
+    def matrix(self, name="close", symbols=None, start=None, end=None):
+        """
+        日期 × symbol 的 DataFrame，float32 视图直接包进 DataFrame（不复制），
+        可以直接给 yupen_engine.compute_states 和 backtest / sweep（--store）用。
+        symbols 为连续的一段时仍是视图，任意子集需要按列取会复制。
+        """
+        rows = self._rows(start, end)
+        arr = self.data[name][rows]
+        cols = self.symbols
+        if symbols is not None:
+            idx = [self._col[s] for s in symbols]
+            arr = arr[:, idx]
+            cols = list(symbols)
+        return pd.DataFrame(arr, index=from_ordinals(self.days[rows]), columns=cols, copy=False)
+
+    def frame(self, symbol, start=None, end=None):
+        """单个 symbol 的 date/OHLCV DataFrame（画图用），只保留有收盘价的行"""
+        rows = self._rows(start, end)
+        j = self._col[symbol]
+        close = self.data["close"][rows, j]
+        ok = ~np.isnan(close)
+        out = {"date": from_ordinals(self.days[rows][ok])}
+        for f, arr in self.data.items():
+            out[f] = arr[rows, j][ok]
+        return pd.DataFrame(out)
+
+
+def open_store(path, mmap=True):
+    """打开 save() 写出的目录；mmap=True 时字段矩阵为只读内存映射，不把整个文件读进内存"""
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as fh:
+        meta = json.load(fh)
+    mode = "r" if mmap else None
+    days = np.load(os.path.join(path, "days.npy"))
+    data = {f: np.load(os.path.join(path, f"{f}.npy"), mmap_mode=mode) for f in meta["fields"]}
+    return OhlcvStore(days, meta["symbols"], data)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+并发拉取工具：有界线程池 + 按主机限流。
+指数数量多时（100+），串行拉取是最慢的一步；这里用线程池并发，
+同时保证对同一个上游主机的请求间隔不低于设定值，避免被限流。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HostRateLimiter(object):
+    """
+    按主机限流（线程安全）：同一主机两次请求之间至少间隔 1/rate 秒。
+    rate_per_host 为默认每秒请求数，host_rates 可以对个别主机单独设置；rate 为 0/None 表示不限流。
+    """
+    def __init__(self, rate_per_host=2.0, host_rates=None):
+        self.default_interval = 1.0 / rate_per_host if rate_per_host else 0.0
+        self.host_intervals = {}
+        for host, rate in (host_rates or {}).items():
+            self.host_intervals[host] = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host="default"):
+        """阻塞直到轮到本次请求（先到先得地预约时间槽，锁内不 sleep）"""
+        interval = self.host_intervals.get(host, self.default_interval)
+        if interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+def fetch_all(items, fetch_fn, max_workers=4):
+    """
+    用有界线程池并发执行 fetch_fn(item)，返回结果列表，顺序与 items 保持一致。
+    max_workers <= 1 时退化为串行（便于调试）。fetch_fn 内部应自行处理异常。
+    """
+    items = list(items)
+    if not max_workers or max_workers <= 1 or len(items) <= 1:
+        return [fetch_fn(it) for it in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        # pool.map 按提交顺序返回结果
+        return list(pool.map(fetch_fn, items))
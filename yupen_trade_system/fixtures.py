@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+离线数据：不访问 akshare 也能跑报表、做基准测试。
+  - load_seeds: 从已有的 index_report_full.csv / 鱼盆模型复盘_*.csv|xlsx 里读出 (代码, 名称, 最新点位)，作为合成行情的起点
+  - synthetic_ohlcv: 用固定随机种子生成一段 OHLCV 日线（几何布朗运动），可选输出成 akshare 原始格式（中文列名 + 字符串日期）
+  - make_universe: 生成 N 个指数的日线，代码为 6 位数字
+  - write_fixture_dir: 落成 {代码}.parquet/csv，可直接给 providers.LocalFileProvider 读
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+# 没有任何报表可读时的默认起点
+DEFAULT_SEEDS = [
+    ("000016", "上证50", 2967.775),
+    ("000300", "沪深300", 4514.235),
+    ("000905", "中证500", 7016.066),
+    ("000852", "中证1000", 7185.478),
+    ("000688", "科创50", 1363.168),
+    ("399006", "创业板指", 2935.370),
+]
+
+AK_COLUMNS = {"date": "日期", "open": "开盘", "high": "最高", "low": "最低", "close": "收盘", "volume": "成交量"}
+
+
+def _seeds_from_frame(df, code_col, name_col, price_col):
+    out = []
+    for _, row in df.iterrows():
+        price = pd.to_numeric(row.get(price_col), errors="coerce")
+        if pd.isna(price) or price <= 0:
+            continue
+        code = row.get(code_col) if code_col else None
+        out.append((str(code) if code is not None and pd.notna(code) else "", str(row[name_col]), float(price)))
+    return out
+
+
+def load_seeds(search_dir="."):
+    """读 search_dir 里已有的报表，返回 [(代码, 名称, 最新点位)]；一条都读不到时返回 DEFAULT_SEEDS"""
+    seeds = []
+    p = os.path.join(search_dir, "index_report_full.csv")
+    if os.path.exists(p):
+        df = pd.read_csv(p, dtype={"used_symbol": str}, encoding="utf-8-sig")
+        seeds += _seeds_from_frame(df, "used_symbol", "指数", "close")
+    for p in sorted(glob.glob(os.path.join(search_dir, "鱼盆模型复盘_*.*"))):
+        try:
+            if p.endswith(".csv"):
+                df = pd.read_csv(p, dtype={"指数代码": str}, encoding="utf-8-sig")
+            elif p.endswith(".xlsx"):
+                df = pd.read_excel(p, dtype={"指数代码": str})
+            else:
+                continue
+        except Exception:
+            continue
+        seeds += _seeds_from_frame(df, "指数代码", "指数名称", "当前点位")
+    # 同一个指数只保留最后读到的一条
+    uniq = {}
+    for code, name, price in seeds:
+        uniq[code or name] = (code, name, price)
+    return list(uniq.values()) or list(DEFAULT_SEEDS)
+
+
+def synthetic_ohlcv(n_days=500, last_close=3000.0, seed=0, end=None, vol=0.015, raw=False):
+    """
+    生成 n_days 个交易日的日线，最后一天收盘价约为 last_close。
+    raw=True 时列名和日期格式模仿 akshare 原始返回（中文列名，日期为 'YYYY-MM-DD' 字符串）。
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end if end is not None else pd.Timestamp.today().normalize())
+    dates = pd.bdate_range(end=end, periods=n_days)
+    rets = rng.normal(0.0002, vol, n_days)
+    close = np.exp(np.cumsum(rets))
+    close = close / close[-1] * last_close
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, vol / 4, n_days))
+    spread = np.abs(rng.normal(0, vol / 2, n_days)) * close
+    df = pd.DataFrame({
+        "date": dates,
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.integers(10 ** 6, 10 ** 8, n_days).astype("float64"),
+    })
+    if raw:
+        df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+        df = df.rename(columns=AK_COLUMNS)
+    return df
+
+
+def make_universe(n_symbols, n_days=500, seeds=None, seed=0, raw=False, end=None):
+    """
+    生成 n_symbols 个指数：起点轮流取自 seeds（默认 load_seeds()），代码为 '000000' 起的 6 位数字。
+    返回 (frames {代码: DataFrame}, names {代码: 名称})。
+    """
+    seeds = seeds or load_seeds()
+    frames, names = {}, {}
+    for i in range(n_symbols):
+        _, name, price = seeds[i % len(seeds)]
+        code = f"{i:06d}"
+        frames[code] = synthetic_ohlcv(n_days, price, seed=seed + i, raw=raw, end=end)
+        names[code] = name if i < len(seeds) else f"{name}_{i}"
+    return frames, names
+
+
+def write_fixture_dir(frames, root, fmt="parquet"):
+    """把 make_universe 的结果写成 LocalFileProvider 能读的目录"""
+    os.makedirs(root, exist_ok=True)
+    for code, df in frames.items():
+        p = os.path.join(root, f"{code}.{fmt}")
+        if fmt == "parquet":
+            df.to_parquet(p, index=False)
+        else:
+            df.to_csv(p, index=False)
+    return root
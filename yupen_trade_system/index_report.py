@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+指数偏离报表（index_report_full.csv + 每个指数一张图）的公共流程。
+index_deviation_report.py（折线图）和 yupen_strategy.py（K 线图）只保留各自的配置，调用 run_report。
+"""
+
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .instrument import RunMetrics
+from .normalize import normalize_df
+from .ohlcv_cache import OhlcvCache
+from .report_sinks import CsvSink
+from .symbol_resolver import SymbolResolver
+
+MA_WINDOW = 20
+
+
+def try_candidates(cands, name, providers, resolver, start, end, cache=None, offline=False, accepts=None):
+    """
+    按候选顺序通过数据源层拉取，返回 (df, which_method, used_symbol, note)。
+    先试上次成功的 (symbol, 方法)，失败则作废记录，再按其余候选探测（不再重试刚失败的 symbol）。
+    accepts(sym) 返回 False 的候选直接跳过（例如只处理 A 股指数）。
+    """
+    probes = 0
+    hit = resolver.get(name, cands)
+    ordered = resolver.order(name, cands)
+    if hit is not None:
+        sym, method = hit
+        probes += 1
+        df, method, note = providers.fetch(sym, start, end, only=[method], cache=cache, offline=offline)
+        if df is not None:
+            resolver.record_success(name, sym, method, list(cands), probes)
+            return df, method, sym, note
+        resolver.invalidate(name)
+        ordered = [c for c in ordered if c != sym]
+    notes = []
+    for sym in ordered:
+        if accepts is not None and not accepts(sym):
+            notes.append(f"{sym}: skipped")
+            continue
+        probes += 1
+        df, method, note = providers.fetch(sym, start, end, cache=cache, offline=offline)
+        if df is not None:
+            resolver.record_success(name, sym, method, list(cands), probes)
+            return df, method, sym, note
+        notes.append(f"{sym}: {note}")
+    # 全部尝试失败
+    resolver.record_failure(name, probes)
+    return None, None, None, "all candidates failed (" + " | ".join(notes) + ")"
+
+
+def summarize(df, name, used_sym, method, note):
+    """由规范化后的 date/close 日线算出报表一行：最新收盘、MA20、当日涨跌幅、偏离率"""
+    ma = df["close"].rolling(window=MA_WINDOW).mean()
+    last = df["close"].iloc[-1]
+    ma20 = ma.iloc[-1] if not np.isnan(ma.iloc[-1]) else np.nan
+    date = df["date"].iloc[-1]
+
+    # 当日涨跌幅
+    if len(df) >= 2:
+        prev = df["close"].iloc[-2]
+        if prev != 0:
+            chg_pct = 100 * (last - prev) / prev
+        else:
+            chg_pct = np.nan
+    else:
+        chg_pct = np.nan
+
+    dev_pct = 100 * (last - ma20) / ma20 if not np.isnan(ma20) else np.nan
+    return {
+        "指数": name,
+        "used_symbol": used_sym,
+        "method": method,
+        "date": date,
+        "close": round(last, 4),
+        "ma20": (round(ma20, 4) if not math.isnan(ma20) else np.nan),
+        "chg_pct": round(chg_pct, 4),
+        "dev_pct": round(dev_pct, 4),
+        "note": note
+    }
+
+
+def failed_row(name, note):
+    return {
+        "指数": name,
+        "used_symbol": None,
+        "method": None,
+        "date": None,
+        "close": np.nan,
+        "ma20": np.nan,
+        "chg_pct": np.nan,
+        "dev_pct": np.nan,
+        "note": note
+    }
+
+
+def plot_job(kind, ohlcv, name, used_sym, method, plot_dir):
+    """画图任务（见 chart_pipeline）：candle 为 mplfinance K 线图，line 为收盘价 + MA20 折线图"""
+    safe = "".join(ch if ch.isalnum() else "_" for ch in name)
+    if kind == "candle":
+        df = ohlcv.rename(columns={
+            'date': 'Date',
+            'open': 'Open',
+            'high': 'High',
+            'low': 'Low',
+            'close': 'Close',
+            'volume': 'Volume'
+        }).set_index('Date')[['Open', 'High', 'Low', 'Close', 'Volume']]
+        title = f"{name} ({used_sym})"
+        path = os.path.join(plot_dir, f"{safe}_{used_sym}_candle.png")
+    else:
+        df = ohlcv[["date", "close"]]
+        title = f"{name} ({used_sym}, via {method})"
+        path = os.path.join(plot_dir, f"{safe}_{used_sym}.png")
+    return {"kind": kind, "df": df, "title": title, "path": path, "dpi": 150, "ma_window": MA_WINDOW}
+
+
+def run_report(index_candidates, providers, out_csv="index_report_full.csv", plot_dir="plots",
+               plot_kind="line", plot=True, plot_workers=None, cache_dir="cache", offline=False,
+               days=180, accepts=None, metrics_file=None, prometheus_file=None):
+    """
+    拉取 index_candidates 中每个指数的近 days 天日线，逐行写出 out_csv，最后统一画图。
+    metrics_file / prometheus_file 不为空时写出分阶段耗时和拉取明细（见 instrument.RunMetrics）。
+    返回结果 DataFrame。
+    """
+    metrics = RunMetrics("index_report")
+    providers.metrics = metrics
+    today = datetime.now().date()
+    start_date = today - timedelta(days=days)
+    cache = OhlcvCache(cache_dir)
+    # 两个画图脚本共用 cache/symbol_map.json，按数据源链分开记，候选里没有的记忆不用
+    resolver = SymbolResolver(os.path.join(cache_dir, "symbol_map.json"), scope=providers.signature)
+
+    rows = []
+    plot_jobs = []
+    # 每个指数算完就写一行，不等全部结束
+    out_sink = CsvSink(out_csv)
+    for name, cands in index_candidates.items():
+        print(f"Processing {name} ...")
+        with metrics.stage("fetch"):
+            ohlcv, method, used_sym, note = try_candidates(cands, name, providers, resolver, start_date, today,
+                                                           cache=cache, offline=offline, accepts=accepts)
+        if ohlcv is None:
+            print(f"  ❌ {name} 获取失败，note = {note}")
+            rows.append(failed_row(name, note))
+            out_sink.write_row(rows[-1])
+            continue
+        with metrics.stage("normalize"):
+            df = normalize_df(ohlcv, schema=method)
+        with metrics.stage("summarize"):
+            rows.append(summarize(df, name, used_sym, method, note))
+        with metrics.stage("export"):
+            out_sink.write_row(rows[-1])
+        # 先收集画图任务，报表写完后统一渲染
+        if plot:
+            plot_jobs.append(plot_job(plot_kind, ohlcv, name, used_sym, method, plot_dir))
+    out_sink.close()
+    resolver.save()
+    print(resolver.summary())
+    df_out = pd.DataFrame(rows)
+
+    if plot_jobs:
+        # 画图阶段才导入 matplotlib / mplfinance
+        from .chart_pipeline import render_charts
+        os.makedirs(plot_dir, exist_ok=True)
+        with metrics.stage("plot"):
+            plot_stats = render_charts(plot_jobs, plot_dir, workers=plot_workers)
+        metrics.incr("plot.rendered", plot_stats["rendered"])
+        metrics.incr("plot.skipped", plot_stats["skipped"])
+        for path, err in plot_stats["failed"]:
+            print("  ⚠️ 绘图失败:", path, err)
+        print(f"绘图: 新生成 {plot_stats['rendered']} 张，未变化跳过 {plot_stats['skipped']} 张")
+    print(f"All done. 输出在 {out_csv}，图片保存在 {plot_dir}")
+    print(df_out)
+
+    metrics.merge_counters("cache", cache.stats)
+    metrics.merge_counters("symbol_memo", resolver.stats)
+    providers.metrics = None
+    print("⏱️ 各阶段耗时：", ", ".join(f"{k} {v:.2f}s" for k, v in metrics.stages.items()))
+    if metrics_file:
+        metrics.write_json(metrics_file)
+    if prometheus_file:
+        metrics.write_prometheus(prometheus_file)
+    return df_out
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+多周期、多指标流水线：在 yupen_engine 的 日期 × 指数 矩阵上一次算出 MA-N、EMA-N、VWMA-N、ATR-N、ATR 归一化偏离率，
+支持日线 (D) / 周线 (W) / 月线 (M)。
+
+每个指标声明自己依赖的中间结果（见 _NODES），流水线按 (周期, 节点, 窗口) 记忆化求值，同一次运行里每个节点只算一次：
+  - 各周期的 OHLCV 矩阵：日线由各指数的 DataFrame 一次拼出，周线 / 月线由日线重采样得到并缓存
+  - 收盘价的挤压（compact）和累计和只算一次，所有窗口的 MA 都只是一次相减
+  - VWMA 共用 close×volume 与 volume 的累计和，ATR 共用真实波幅的累计和
+所以多加几个指标只多几次 O(日期 × 指数) 的向量运算，不会成倍增加耗时。
+
+指标写法："ma20"、"ema12"、"vwma20"、"atr14"、"atr_dev20"（(收盘 - MA20) / ATR20），
+带周期前缀时如 "W:ma20"、"M:ma10"，不带前缀为日线。
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .yupen_engine import (_scatter_back, compact, compute_states, fill_matrix, frame_layout,
+                           rolling_mean_from_cumsum, states_from_line, valid_cumsum, window_sum)
+
+RESAMPLE_RULES = {"W": "W-FRI", "M": "ME"}
+_SPEC = re.compile(r"^(?:(?P<tf>[DWM]):)?(?P<name>[a-z_]+?)(?P<n>\d+)?$")
+
+# 节点名 → (依赖的节点, 是否带窗口参数, 计算函数)
+_NODES = {}
+
+
+def node(name, deps=(), windowed=False):
+    def deco(fn):
+        _NODES[name] = (tuple(deps), windowed, fn)
+        return fn
+    return deco
+
+
+def parse_spec(spec):
+    """'W:ma20' → ('W', 'ma', 20)；'close' → ('D', 'close', None)"""
+    m = _SPEC.match(str(spec).strip())
+    if m is None or m.group("name") not in _NODES:
+        raise ValueError(f"未知指标: {spec}")
+    n = int(m.group("n")) if m.group("n") else None
+    if _NODES[m.group("name")][1] and n is None:
+        raise ValueError(f"指标 {spec} 需要窗口长度，例如 {m.group('name')}20")
+    return m.group("tf") or "D", m.group("name"), n
+
+
+class IndicatorPipeline(object):
+    """
+    frames: {symbol: DataFrame(date, open, high, low, close, volume)}，缺的列按 NaN 处理（例如没有成交量时 VWMA 为 NaN）。
+    所有中间结果都在挤压后的坐标里（每列的有效收盘价挤到上面），最后再按需放回日期位置。
+    stats 记录实际计算 / 直接复用的节点次数。
+    """
+    def __init__(self, frames, date_col="date", min_periods=1):
+        self._frames = frames
+        self.date_col = date_col
+        self.min_periods = min_periods
+        self._memo = {}
+        self._layout = None
+        self.stats = {"computed": 0, "reused": 0}
+
+    def node(self, name, tf="D", n=None):
+        deps, windowed, fn = _NODES[name]
+        key = (tf, name, n if windowed else None)
+        if key in self._memo:
+            self.stats["reused"] += 1
+            return self._memo[key]
+        args = [self.node(d, tf, n) for d in deps]
+        value = fn(self, tf, n, *args) if windowed else fn(self, tf, *args)
+        self.stats["computed"] += 1
+        self._memo[key] = value
+        return value
+
+    def plan(self, specs):
+        """按求值顺序列出 specs 需要的全部节点（去重），用于确认中间结果是否共享"""
+        order, seen = [], set()
+
+        def visit(tf, name, n):
+            deps, windowed, _ = _NODES[name]
+            key = (tf, name, n if windowed else None)
+            if key in seen:
+                return
+            for d in deps:
+                visit(tf, d, n)
+            seen.add(key)
+            order.append(key)
+        for spec in specs:
+            visit(*parse_spec(spec))
+        return order
+
+    # ---- 对外接口 ----
+
+    def values(self, spec):
+        """挤压坐标下的指标数组"""
+        tf, name, n = parse_spec(spec)
+        return self.node(name, tf, n)
+
+    def matrix(self, spec):
+        """日期 × symbol 的指标矩阵（该周期的日期索引）"""
+        tf, name, n = parse_spec(spec)
+        panel = self.node("panel", tf)
+        _, order, _ = self.node("compact", tf)
+        return pd.DataFrame(_scatter_back(self.node(name, tf, n), order),
+                            index=panel["close"].index, columns=panel["close"].columns)
+
+    def latest(self, specs):
+        """每个 symbol 最后一根有效 K 线上的指标值，返回 symbol × spec 的 DataFrame"""
+        out = {}
+        for spec in specs:
+            tf, name, n = parse_spec(spec)
+            _, _, n_valid = self.node("compact", tf)
+            vals = self.node(name, tf, n)
+            rows = np.clip(n_valid - 1, 0, max(vals.shape[0] - 1, 0))
+            last = vals[rows, np.arange(vals.shape[1])] if vals.size else np.full(len(n_valid), np.nan)
+            out[spec] = np.where(n_valid > 0, last, np.nan)
+        return pd.DataFrame(out, index=pd.Index(self.symbols("D"), name="symbol"))
+
+    def states(self, line="ma20"):
+        """收盘价相对参考线（默认 MA20）的状态 / 偏离率 / 穿越日，格式同 yupen_engine.compute_states"""
+        tf, name, n = parse_spec(line)
+        if not self.symbols(tf):
+            return compute_states(pd.DataFrame())
+        c, order, n_valid = self.node("compact", tf)
+        _, valid = self.node("close_cumsum", tf)
+        close = self.node("panel", tf)["close"]
+        return states_from_line(c, order, n_valid, valid, self.node(name, tf, n), close.index, list(close.columns))
+
+    def symbols(self, tf="D"):
+        return list(self.node("panel", tf)["close"].columns)
+
+    # ---- 内部 ----
+
+    def _daily_field(self, field):
+        """某个字段的 日期 × symbol 日线矩阵；日期并集和各指数的行位置只算一次，所有字段共用"""
+        if self._layout is None:
+            self._layout = frame_layout(self._frames, self.date_col)
+        dates, layout = self._layout
+        if not layout:
+            return pd.DataFrame()
+        return fill_matrix(self._frames, dates, layout, field)
+
+
+class _LazyPanel(object):
+    """字段 → 矩阵，用到哪个字段才构建哪个（只算 MA 时不用拼 open/high/low/volume）"""
+    def __init__(self, build):
+        self._build = build
+        self._fields = {}
+
+    def __getitem__(self, field):
+        if field not in self._fields:
+            self._fields[field] = self._build(field)
+        return self._fields[field]
+
+
+RESAMPLE_HOW = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+
+
+def _resampled_panel(daily, tf):
+    """日线 OHLCV 重采样成周线 / 月线；每根 K 线用该周期内最后一个实际交易日作为日期"""
+    rule = RESAMPLE_RULES[tf]
+    close = daily["close"]
+    if close.empty:
+        return daily
+    last_day = pd.Series(close.index, index=close.index).resample(rule).last()
+    keep = last_day.notna().to_numpy()
+    index = pd.DatetimeIndex(last_day[keep].to_numpy())
+
+    def build(field):
+        r = daily[field].resample(rule)
+        m = r.sum(min_count=1) if field == "volume" else getattr(r, RESAMPLE_HOW[field])()
+        return pd.DataFrame(m.to_numpy()[keep], index=index, columns=close.columns)
+    return _LazyPanel(build)
+
+
+def _align(pipe, tf, field):
+    """把其他字段按收盘价的挤压顺序取出来，和收盘价逐行对齐"""
+    _, order, _ = pipe.node("compact", tf)
+    return np.take_along_axis(pipe.node("panel", tf)[field].to_numpy(dtype=float), order, axis=0)
+
+
+# ---- 中间结果 ----
+
+@node("panel")
+def _panel(pipe, tf):
+    if tf == "D":
+        return _LazyPanel(pipe._daily_field)
+    return _resampled_panel(pipe.node("panel", "D"), tf)
+
+
+@node("compact", deps=("panel",))
+def _compact(pipe, tf, panel):
+    return compact(panel["close"].to_numpy(dtype=float))
+
+
+@node("close_cumsum", deps=("compact",))
+def _close_cumsum(pipe, tf, compacted):
+    c, _, n_valid = compacted
+    return valid_cumsum(c, n_valid)
+
+
+@node("pv_cumsum", deps=("compact", "close_cumsum"))
+def _pv_cumsum(pipe, tf, compacted, close_cs):
+    c, _, _ = compacted
+    _, valid = close_cs
+    vol = np.nan_to_num(_align(pipe, tf, "volume"), nan=0.0)
+    vol = np.where(valid, vol, 0.0)
+    return np.cumsum(np.where(valid, c, 0.0) * vol, axis=0), np.cumsum(vol, axis=0)
+
+
+@node("tr_cumsum", deps=("compact", "close_cumsum"))
+def _tr_cumsum(pipe, tf, compacted, close_cs):
+    """真实波幅 max(high, 昨收) - min(low, 昨收)；缺 high/low 时用收盘价代替"""
+    c, _, _ = compacted
+    _, valid = close_cs
+    high = _align(pipe, tf, "high")
+    low = _align(pipe, tf, "low")
+    high = np.where(np.isnan(high), c, high)
+    low = np.where(np.isnan(low), c, low)
+    prev = np.vstack([c[:1], c[:-1]])
+    tr = np.maximum(high, prev) - np.minimum(low, prev)
+    return np.cumsum(np.where(valid, np.nan_to_num(tr), 0.0), axis=0)
+
+
+# ---- 指标 ----
+
+@node("close", deps=("compact", "close_cumsum"))
+def _close(pipe, tf, compacted, close_cs):
+    return np.where(close_cs[1], compacted[0], np.nan)
+
+
+@node("ma", deps=("close_cumsum",), windowed=True)
+def _ma(pipe, tf, n, close_cs):
+    cs, valid = close_cs
+    return rolling_mean_from_cumsum(cs, valid, n, pipe.min_periods)
+
+
+@node("ema", deps=("compact", "close_cumsum"), windowed=True)
+def _ema(pipe, tf, n, compacted, close_cs):
+    c, _, _ = compacted
+    _, valid = close_cs
+    ema = pd.DataFrame(np.where(valid, c, np.nan)).ewm(span=n, adjust=False).mean().to_numpy()
+    return np.where(valid, ema, np.nan)
+
+
+@node("vwma", deps=("pv_cumsum", "close_cumsum"), windowed=True)
+def _vwma(pipe, tf, n, pv_cs, close_cs):
+    pv, v = pv_cs
+    _, valid = close_cs
+    pv_sum, count = window_sum(pv, n)
+    v_sum, _ = window_sum(v, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = pv_sum / v_sum
+    out[~valid | (v_sum <= 0) | (count < pipe.min_periods)] = np.nan
+    return out
+
+
+@node("atr", deps=("tr_cumsum", "close_cumsum"), windowed=True)
+def _atr(pipe, tf, n, tr_cs, close_cs):
+    return rolling_mean_from_cumsum(tr_cs, close_cs[1], n, pipe.min_periods)
+
+
+@node("atr_dev", deps=("close", "ma", "atr"), windowed=True)
+def _atr_dev(pipe, tf, n, close, ma, atr):
+    """(收盘 - MA-N) / ATR-N：以波动幅度为单位的偏离，不同波动水平的指数之间可以直接比较"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(atr > 0, (close - ma) / atr, np.nan)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标：分阶段计时、每个 symbol 的拉取耗时 / 重试次数 / 数据量、缓存和 symbol 记忆命中率。
+一次运行结束后写成 JSON 摘要，需要时再写一份 Prometheus 文本格式（node_exporter textfile collector 可直接读）。
+
+    metrics = RunMetrics("yupen")
+    with metrics.stage("fetch"):
+        ...
+    chain = ProviderChain([...], metrics=metrics)   # 拉取明细由数据源层记录
+    metrics.write_json("run_metrics.json")
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunMetrics(object):
+    """线程安全的指标收集器，一次运行一个实例"""
+    def __init__(self, job="yupen"):
+        self.job = job
+        self.started = time.time()
+        self.stages = {}       # 阶段名 → 累计秒数（同名阶段多次进入会累加）
+        self.fetches = []      # 每次数据源调用一条记录
+        self.counters = {}     # 其他计数，如 cache.incremental、symbol_memo.hits
+        self.samples = {}      # 延迟等分布型数据，名字 → [秒]，摘要里给出分位数
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def merge_counters(self, prefix, stats):
+        """把已有的 stats dict（如 SymbolResolver.stats、OhlcvCache.stats）并入计数"""
+        for k, v in stats.items():
+            self.incr(f"{prefix}.{k}", v)
+
+    def record_fetch(self, symbol, provider, seconds, attempts=1, ok=True, rows=0, nbytes=0,
+                     wait_seconds=0.0, error=None):
+        """
+        记录一次数据源调用：seconds 为含重试和退避的总耗时，wait_seconds 为其中限流 + 退避等待的时间，
+        nbytes 为返回 DataFrame 的内存大小（akshare 不暴露原始响应大小）。
+        """
+        with self._lock:
+            self.fetches.append({
+                "symbol": symbol, "provider": provider, "seconds": round(seconds, 6),
+                "attempts": attempts, "retries": max(0, attempts - 1), "ok": ok,
+                "rows": rows, "bytes": nbytes, "wait_seconds": round(wait_seconds, 6), "error": error,
+            })
+
+    def summary(self):
+        with self._lock:
+            fetches = list(self.fetches)
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+        by_provider = {}
+        for f in fetches:
+            p = by_provider.setdefault(f["provider"], {"calls": 0, "errors": 0, "retries": 0, "seconds": 0.0,
+                                                       "wait_seconds": 0.0, "bytes": 0, "max_seconds": 0.0})
+            p["calls"] += 1
+            p["errors"] += 0 if f["ok"] else 1
+            p["retries"] += f["retries"]
+            p["seconds"] += f["seconds"]
+            p["wait_seconds"] += f["wait_seconds"]
+            p["bytes"] += f["bytes"]
+            p["max_seconds"] = max(p["max_seconds"], f["seconds"])
+        for p in by_provider.values():
+            p["mean_seconds"] = p["seconds"] / p["calls"]
+        return {
+            "job": self.job,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": time.time() - self.started,
+            "stages": stages,
+            "providers": by_provider,
+            "cache_hit_rate": _hit_rate(counters, "cache", hits=("unchanged", "incremental", "offline"),
+                                        misses=("full", "restated", "fallback")),
+            "symbol_memo_hit_rate": _hit_rate(counters, "symbol_memo", hits=("hits",), misses=("misses",)),
+            "counters": counters,
+            "latencies": {k: _quantiles(v) for k, v in samples.items()},
+            "fetches": fetches,
+        }
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=1, default=str))
+        return path
+
+    def write_prometheus(self, path):
+        """Prometheus 文本格式；原子写入，采集方不会读到半个文件"""
+        s = self.summary()
+        job = _label(self.job)
+        lines = []
+
+        def metric(name, help_text, kind, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lab = ",".join([f'job="{job}"'] + [f'{k}="{_label(v)}"' for k, v in labels.items()])
+                lines.append(f"{name}{{{lab}}} {float(value):.6g}")
+
+        metric("yupen_run_timestamp_seconds", "Run start time.", "gauge", [({}, self.started)])
+        metric("yupen_run_seconds", "Total run wall time.", "gauge", [({}, s["wall_seconds"])])
+        metric("yupen_stage_seconds", "Wall time per stage.", "gauge",
+               [({"stage": k}, v) for k, v in s["stages"].items()])
+        # 同一 symbol 同一数据源可能拉了不止一次（候选探测、盘中刷新），同一组标签只能有一个样本，先按标签汇总
+        per_symbol = {}
+        for f in s["fetches"]:
+            agg = per_symbol.setdefault((f["symbol"], f["provider"]),
+                                        {"calls": 0, "seconds": 0.0, "retries": 0, "bytes": 0})
+            agg["calls"] += 1
+            agg["seconds"] += f["seconds"]
+            agg["retries"] += f["retries"]
+            agg["bytes"] += f["bytes"]
+        for field, help_text in (("calls", "Provider calls per symbol."),
+                                 ("seconds", "Total fetch time per symbol including retries."),
+                                 ("retries", "Total retries per symbol."),
+                                 ("bytes", "Total in-memory size of data fetched per symbol.")):
+            metric(f"yupen_fetch_{field}", help_text, "gauge",
+                   [({"symbol": sym, "provider": prov}, agg[field]) for (sym, prov), agg in per_symbol.items()])
+        metric("yupen_provider_errors", "Failed provider calls.", "gauge",
+               [({"provider": k}, v["errors"]) for k, v in s["providers"].items()])
+        metric("yupen_provider_wait_seconds", "Time spent in rate limiting and backoff.", "gauge",
+               [({"provider": k}, v["wait_seconds"]) for k, v in s["providers"].items()])
+        metric("yupen_events", "Cache and symbol memo events.", "gauge",
+               [({"event": k}, v) for k, v in s["counters"].items()])
+        if s["latencies"]:
+            metric("yupen_latency_seconds", "Latency quantiles (e.g. alert delivery).", "gauge",
+                   [({"name": k, "quantile": q}, v[q]) for k, v in s["latencies"].items()
+                    for q in ("p50", "p95", "max")])
+        for key in ("cache_hit_rate", "symbol_memo_hit_rate"):
+            if s[key] is not None:
+                metric(f"yupen_{key}", key.replace("_", " ").capitalize() + ".", "gauge", [({}, s[key])])
+        _atomic_write(path, "\n".join(lines) + "\n")
+        return path
+
+
+def _quantiles(values):
+    """已排序的样本 → 个数、p50、p95、最大值"""
+    n = len(values)
+    return {"count": n, "p50": values[(n - 1) // 2], "p95": values[min(n - 1, int(0.95 * n))], "max": values[-1]}
+
+
+def _hit_rate(counters, prefix, hits, misses):
+    h = sum(counters.get(f"{prefix}.{k}", 0) for k in hits)
+    m = sum(counters.get(f"{prefix}.{k}", 0) for k in misses)
+    return h / (h + m) if h + m else None
+
+
+def _label(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _atomic_write(path, text):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
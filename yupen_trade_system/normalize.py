@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+行情 DataFrame 规范化（各报表脚本共用）
+
+同一个数据源每次返回的列名都一样，所以列名识别只在第一次见到某种表结构时做，
+识别结果按 schema（数据源名，未指定时用列名元组）记在 _SCHEMAS 里，之后直接取列。
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# schema → (是否需要先 reset_index, 日期列, 收盘列)
+_SCHEMAS = {}
+_SCHEMAS_LOCK = threading.Lock()
+
+
+def _find_cols(columns):
+    """按列名子串识别日期列和收盘列，识别不到的为 None"""
+    date_col = None
+    close_col = None
+    for c in columns:
+        s = str(c)
+        if "日期" in s or "date" in s.lower():
+            date_col = c
+        if "收盘" in s or "close" in s.lower():
+            close_col = c
+    return date_col, close_col
+
+
+def resolve_schema(df, schema=None):
+    """返回 (from_index, date_col, close_col)；schema 为 None 时以列名 + index 名作为键"""
+    key = schema if schema is not None else (tuple(df.columns), df.index.name)
+    hit = _SCHEMAS.get(key)
+    if hit is not None and _has(df, hit[1], hit[0]) and _has(df, hit[2], hit[0]):
+        return hit
+    date_col, close_col = _find_cols(df.columns)
+    from_index = False
+    if date_col is None or close_col is None:
+        # 还可以尝试 index 名字作为 date
+        names = list(df.index.names) + list(df.columns)
+        date_col, close_col = _find_cols(names)
+        if date_col is None or close_col is None:
+            raise ValueError(f"normalize_df 无法识别列: {df.columns}")
+        from_index = True
+    resolved = (from_index, date_col, close_col)
+    with _SCHEMAS_LOCK:
+        _SCHEMAS[key] = resolved
+    return resolved
+
+
+def _has(df, name, from_index):
+    return name in df.columns or (from_index and name in df.index.names)
+
+
+def _column(df, name, from_index):
+    if name in df.columns:
+        return df[name]
+    return df.index.get_level_values(name)
+
+
+def normalize_df(df, schema=None):
+    """
+    规范化 DataFrame，使得有 'date'（datetime64）和 'close'（float）两列（统一名字）。
+    schema 传数据源名时按数据源缓存列名识别结果；输入已按日期升序时不再排序。
+    """
+    from_index, date_col, close_col = resolve_schema(df, schema)
+    dates = _column(df, date_col, from_index)
+    if not (isinstance(dates.dtype, np.dtype) and dates.dtype.kind == "M"):
+        dates = pd.to_datetime(dates)
+        if getattr(dates.dtype, "tz", None) is not None:
+            dates = (dates.dt if isinstance(dates, pd.Series) else dates).tz_localize(None)
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    close = pd.to_numeric(np.asarray(_column(df, close_col, from_index)), errors="coerce")
+    close = np.asarray(close, dtype="float64")
+
+    valid = ~(np.isnat(dates) | np.isnan(close))
+    if not valid.all():
+        dates, close = dates[valid], close[valid]
+    if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+        order = np.argsort(dates, kind="stable")
+        dates, close = dates[order], close[order]
+    return pd.DataFrame({"date": dates, "close": close})
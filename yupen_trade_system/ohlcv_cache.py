@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+本地 OHLCV 缓存：每个 symbol 一个文件（优先 Parquet，没有 pyarrow/fastparquet 时退回 pickle），
+记录已存的最后日期，之后只向数据源请求增量部分。
+为了应对前复权等导致的历史价格改写，增量请求会往前多取 overlap_bars 根 K 线，
+和缓存做比对；重叠区间价格对不上时整段重新下载。
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def _parquet_available():
+    for mod in ("pyarrow", "fastparquet"):
+        try:
+            __import__(mod)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+class OhlcvCache(object):
+    """
+    按 symbol 缓存日线数据。缓存中的 DataFrame 必须有 'date' 列（统一存成 datetime64），其余列原样保存。
+    fetch_fn(since) 约定：since 为 None 时返回全量历史，否则返回 since（含）之后的数据。
+    """
+    def __init__(self, cache_dir="cache", overlap_bars=5, rtol=1e-6, price_col="close"):
+        self.cache_dir = cache_dir
+        self.overlap_bars = overlap_bars
+        self.rtol = rtol
+        self.price_col = price_col
+        self.use_parquet = _parquet_available()
+        # offline: 只读缓存；full: 全量下载；incremental: 增量追加；unchanged: 增量无新数据；
+        # restated: 重叠区间被修订、重新全量；fallback: 数据源出错退回缓存
+        self.stats = {"offline": 0, "full": 0, "incremental": 0, "unchanged": 0, "restated": 0, "fallback": 0}
+        self._stats_lock = threading.Lock()
+
+    def path(self, key):
+        safe = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in str(key))
+        ext = ".parquet" if self.use_parquet else ".pkl"
+        return os.path.join(self.cache_dir, safe + ext)
+
+    def load(self, key):
+        """读缓存，不存在返回 None"""
+        p = self.path(key)
+        if not os.path.exists(p):
+            return None
+        if self.use_parquet:
+            return pd.read_parquet(p)
+        return pd.read_pickle(p)
+
+    def save(self, key, df):
+        """原子写入（先写临时文件再替换），避免中途被打断留下半个文件"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        p = self.path(key)
+        tmp = p + ".tmp"
+        if self.use_parquet:
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, p)
+
+    def last_date(self, key):
+        df = self.load(key)
+        if df is None or df.empty:
+            return None
+        return df["date"].iloc[-1]
+
+    def _prepare(self, df):
+        """统一 date 列为 datetime64、按日期升序、去重"""
+        df = df.copy()
+        df["date"] = pd.to_datetime(df["date"])
+        df = df.sort_values("date").drop_duplicates(subset="date", keep="last")
+        return df.reset_index(drop=True)
+
+    def _restated(self, cached, new):
+        """
+        重叠区间内价格不一致（例如复权因子变化）则认为历史被改写；
+        成交量的量级对不上（例如缓存是换数据源之前存的，单位是股、新数据是手）也按改写处理，整段重下。
+        """
+        if self.price_col not in cached.columns or self.price_col not in new.columns:
+            return False
+        cols = ["date", self.price_col] + (["volume"] if "volume" in cached.columns and "volume" in new.columns else [])
+        merged = cached[cols].merge(new[cols], on="date", suffixes=("_old", "_new"))
+        if merged.empty:
+            # 增量数据和缓存没有交集，无法校验，保守起见视为改写
+            return True
+        old = pd.to_numeric(merged[self.price_col + "_old"], errors="coerce").to_numpy(dtype=float)
+        new_v = pd.to_numeric(merged[self.price_col + "_new"], errors="coerce").to_numpy(dtype=float)
+        if not np.allclose(old, new_v, rtol=self.rtol, equal_nan=True):
+            return True
+        if "volume" in cols:
+            vol_old = pd.to_numeric(merged["volume_old"], errors="coerce").to_numpy(dtype=float)
+            vol_new = pd.to_numeric(merged["volume_new"], errors="coerce").to_numpy(dtype=float)
+            ok = (vol_old > 0) & (vol_new > 0)
+            # 用中位数：最后一根可能是盘中存的、成交量不完整，不能因为它判成改写
+            if ok.any() and not 0.5 <= np.median(vol_new[ok] / vol_old[ok]) <= 2.0:
+                return True
+        return False
+
+    def _count(self, event):
+        with self._stats_lock:
+            self.stats[event] += 1
+
+    def update(self, key, fetch_fn, offline=False):
+        """
+        增量更新并返回完整数据：
+          - offline=True 时直接返回缓存（可能为 None）
+          - 没有缓存时全量下载
+          - 有缓存时只请求最后 overlap_bars 根之后的数据，校验重叠区间后追加
+        数据源报错或无数据时，如果有缓存就退回缓存，否则抛出/返回 None。
+        """
+        cached = self.load(key)
+        if offline:
+            self._count("offline")
+            return cached
+        if cached is None or cached.empty:
+            self._count("full")
+            new = fetch_fn(None)
+            if new is None or new.empty:
+                return None
+            merged = self._prepare(new)
+            self.save(key, merged)
+            return merged
+
+        overlap_start = cached["date"].iloc[max(0, len(cached) - self.overlap_bars)]
+        try:
+            new = fetch_fn(overlap_start)
+        except Exception:
+            self._count("fallback")
+            return cached
+        if new is None or new.empty:
+            self._count("unchanged")
+            return cached
+        new = self._prepare(new)
+
+        if self._restated(cached, new):
+            self._count("restated")
+            try:
+                full = fetch_fn(None)
+            except Exception:
+                return cached
+            if full is None or full.empty:
+                return cached
+            merged = self._prepare(full)
+        else:
+            head = cached[cached["date"] < new["date"].iloc[0]]
+            merged = pd.concat([head, new], ignore_index=True)
+            if merged.equals(cached):
+                self._count("unchanged")
+                return cached
+            self._count("incremental")
+        self.save(key, merged)
+        return merged
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+数据源层：把 AkShare 指数 / AkShare A 股历史 / 上海金 / yfinance / 本地文件 统一成
+fetch(symbol, start, end) 接口，返回列名统一的日线 DataFrame（date, open, high, low, close, volume，
+date 为 datetime64，按日期升序）。
+
+ProviderChain 负责多数据源切换：每个数据源带指数退避重试（tenacity）和熔断器，
+并按历史延迟（EWMA）排序，一个上游变慢或挂掉时不会拖住整份报告。
+只有网络层错误和 5xx / 429 才重试、计入熔断；symbol 写错、上游没有这只代码抛 SymbolNotFound，
+直接换下一个写法（探测 sh/sz 前缀时不会白等退避，也不会把整个数据源熔断掉）。
+各数据源的第三方库都在 fetch 里按需导入。
+"""
+
+import os
+import threading
+import time
+
+import pandas as pd
+from tenacity import Retrying, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+
+# 各数据源原始列名 → 统一列名
+COLUMN_MAP = {
+    "日期": "date", "date": "date", "Date": "date", "Datetime": "date",
+    "开盘": "open", "open": "open", "Open": "open",
+    "最高": "high", "high": "high", "High": "high",
+    "最低": "low", "low": "low", "Low": "low",
+    "收盘": "close", "close": "close", "Close": "close",
+    "成交量": "volume", "volume": "volume", "Volume": "volume",
+}
+OHLCV_COLS = ["date", "open", "high", "low", "close", "volume"]
+
+
+def standardize_ohlcv(df):
+    """按 COLUMN_MAP 重命名并只保留 OHLCV 列，date 转 datetime64，按日期升序"""
+    if df is None or df.empty:
+        return None
+    if "date" not in df.columns and "日期" not in df.columns:
+        df = df.reset_index()
+    df = df.rename(columns={c: COLUMN_MAP[c] for c in df.columns if c in COLUMN_MAP})
+    cols = [c for c in OHLCV_COLS if c in df.columns]
+    if "date" not in cols or "close" not in cols:
+        raise ValueError(f"无法识别列: {list(df.columns)}")
+    df = df[cols].copy()
+    df["date"] = pd.to_datetime(df["date"])
+    if getattr(df["date"].dt, "tz", None) is not None:
+        df["date"] = df["date"].dt.tz_localize(None)
+    for c in cols[1:]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df.dropna(subset=["date", "close"])
+    if not df["date"].is_monotonic_increasing:
+        df = df.sort_values("date", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def _clip(df, start=None, end=None):
+    if df is None:
+        return None
+    if start is not None:
+        df = df[df["date"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["date"] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def _yyyymmdd(d):
+    return pd.Timestamp(d).strftime("%Y%m%d")
+
+
+class SymbolNotFound(LookupError):
+    """上游正常应答，但没有这只代码（或返回的内容解析不出日线），不重试、不计入熔断"""
+
+
+def is_transport_error(e):
+    """网络层错误（连接、超时、读一半断开）和 5xx / 429 应答算上游故障，其余都算这只代码拉不到"""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(e, "code", None)    # urllib.error.HTTPError
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    if isinstance(e, ValueError):
+        # 应答不是预期的 JSON / 表格（requests 的 JSONDecodeError 同时也是 RequestException）
+        return False
+    if isinstance(e, (OSError, TimeoutError)):
+        return True
+    try:
+        import requests
+    except ImportError:
+        return False
+    return isinstance(e, requests.exceptions.RequestException)
+
+
+# ---------- 各数据源 ----------
+
+class DataProvider(object):
+    """数据源基类。子类实现 _fetch，返回原始 DataFrame；accepts 判断 symbol 写法是否适用"""
+    name = "base"
+    host = "default"
+
+    def accepts(self, symbol):
+        return True
+
+    def fetch(self, symbol, start=None, end=None):
+        """没有数据返回 None；上游故障原样抛出，其它异常（代码不存在、解析失败）转成 SymbolNotFound"""
+        try:
+            return _clip(standardize_ohlcv(self._fetch(symbol, start, end)), start, end)
+        except SymbolNotFound:
+            raise
+        except Exception as e:
+            if is_transport_error(e):
+                raise
+            raise SymbolNotFound(f"{self.name} {symbol}: {e!r}") from e
+
+    def _fetch(self, symbol, start, end):
+        raise NotImplementedError
+
+
+class AkIndexProvider(DataProvider):
+    """AkShare 指数日线（东方财富 stock_zh_index_daily_em），symbol 形如 'sh000300' / 'sz399006'。
+    全量和增量都走同一个接口（不带 start 时从 default_start 拉起）：新浪的 stock_zh_index_daily 成交量单位、
+    收盘价的舍入都和东方财富不同，混在一份缓存里会让成交量类指标错位、重叠校验误判为历史改写"""
+    name = "ak_index"
+    host = "push2his.eastmoney.com"
+
+    def __init__(self, default_start="19900101"):
+        self.default_start = default_start
+
+    def accepts(self, symbol):
+        s = str(symbol).lower()
+        return s[:2] in ("sh", "sz") and s[2:].isdigit()
+
+    def _fetch(self, symbol, start, end):
+        import akshare as ak
+        return ak.stock_zh_index_daily_em(symbol=symbol,
+                                          start_date=_yyyymmdd(start) if start is not None else self.default_start,
+                                          end_date=_yyyymmdd(end or pd.Timestamp.today()))
+
+
+class AkAShareHistProvider(DataProvider):
+    """AkShare A 股历史日线（stock_zh_a_hist），symbol 为 6 位数字，adjust 为 ''/'qfq'/'hfq'"""
+    host = "push2his.eastmoney.com"
+
+    def __init__(self, adjust="", default_start="19900101"):
+        self.adjust = adjust
+        self.default_start = default_start
+        self.name = "ak_a_hist" + (f"_{adjust}" if adjust else "")
+
+    def accepts(self, symbol):
+        return len(str(symbol)) == 6 and str(symbol).isdigit()
+
+    def _fetch(self, symbol, start, end):
+        import akshare as ak
+        return ak.stock_zh_a_hist(symbol=symbol, period="daily",
+                                  start_date=_yyyymmdd(start) if start is not None else self.default_start,
+                                  end_date=_yyyymmdd(end or pd.Timestamp.today()), adjust=self.adjust)
+
+
+class SgeSpotProvider(DataProvider):
+    """上海黄金交易所现货历史日线（spot_hist_sge），symbol 形如 'Au99.99'"""
+    name = "ak_gold_spot"
+    host = "www.sge.com.cn"
+
+    def accepts(self, symbol):
+        s = str(symbol)
+        return s[:2] in ("Au", "Ag", "iA", "mA", "PG", "Pt")
+
+    def _fetch(self, symbol, start, end):
+        import akshare as ak
+        return ak.spot_hist_sge(symbol=symbol)
+
+
+class YFinanceProvider(DataProvider):
+    """yfinance 日线，symbol 为 Yahoo 写法，例如 '^HSI'、'000300.SS'、'XAUUSD=X'"""
+    name = "yfinance"
+    host = "query1.finance.yahoo.com"
+
+    def accepts(self, symbol):
+        # 纯 6 位数字交给 AkShare，Yahoo 上需要带交易所后缀
+        return not str(symbol).isdigit()
+
+    def _fetch(self, symbol, start, end):
+        import yfinance as yf
+        end_ts = pd.Timestamp(end) if end is not None else pd.Timestamp.today()
+        hist = yf.Ticker(symbol).history(
+            start=pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None,
+            end=(end_ts + pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+            period=None if start is not None else "max",
+            interval="1d", auto_adjust=False)
+        if hist is None or hist.shape[0] == 0:
+            return None
+        return hist.reset_index()
+
+
+class LocalFileProvider(DataProvider):
+    """从本地目录读 {symbol}.csv / {symbol}.parquet，用于离线运行和测试"""
+    name = "local_file"
+    host = "local"
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, symbol):
+        for ext in (".parquet", ".csv"):
+            p = os.path.join(self.root, f"{symbol}{ext}")
+            if os.path.exists(p):
+                return p
+        return None
+
+    def accepts(self, symbol):
+        return self._path(symbol) is not None
+
+    def _fetch(self, symbol, start, end):
+        p = self._path(symbol)
+        if p is None:
+            return None
+        if p.endswith(".parquet"):
+            return pd.read_parquet(p)
+        return pd.read_csv(p)
+
+
+# ---------- 实时快照 ----------
+
+SPOT_HOST = "push2.eastmoney.com"
+
+
+def fetch_index_spot(groups=None, rate_limiter=None, retries=3, backoff=0.5, max_backoff=8.0):
+    """
+    一次请求拿到一组指数的实时行情（stock_zh_index_spot_em），返回 code / name / price 三列，code 为 6 位字符串。
+    groups 为该接口的 symbol 参数列表（如 ["沪深重要指数", "中证系列指数"]），None 时用接口默认的一组、只发一次请求。
+    同一代码出现多次时保留第一条。
+    """
+    import akshare as ak
+
+    def once(group):
+        if rate_limiter is not None:
+            rate_limiter.acquire(SPOT_HOST)
+        return ak.stock_zh_index_spot_em() if group is None else ak.stock_zh_index_spot_em(symbol=group)
+    retrying = Retrying(stop=stop_after_attempt(retries),
+                        wait=wait_exponential(multiplier=backoff, max=max_backoff), reraise=True)
+    parts = [df for df in (retrying(once, g) for g in (groups or [None])) if df is not None and not df.empty]
+    if not parts:
+        return pd.DataFrame(columns=["code", "name", "price"])
+    spot = pd.concat(parts, ignore_index=True)
+    out = pd.DataFrame({
+        "code": spot["代码"].astype(str).str.zfill(6),
+        "name": spot["名称"].astype(str),
+        "price": pd.to_numeric(spot["最新价"], errors="coerce"),
+    })
+    return out.drop_duplicates("code", keep="first").reset_index(drop=True)
+
+
+# ---------- 熔断 / 路由 ----------
+
+class CircuitBreaker(object):
+    """
+    连续失败 fail_threshold 次后熔断（open），reset_timeout 秒内直接跳过该数据源；
+    超时后放行一次试探（half-open），成功则恢复，失败则重新熔断。
+    """
+    def __init__(self, fail_threshold=3, reset_timeout=60.0):
+        self.fail_threshold = fail_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.fail_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """试探没有真正请求到上游（例如只读了缓存）时交还试探名额：回到 open，下次 allow 立刻再放行一次"""
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+
+
+class ProviderChain(object):
+    """
+    按顺序尝试多个数据源：跳过 symbol 写法不适用或已熔断的数据源，
+    其余按延迟 EWMA 从快到慢排序（没测过的视为 0，先试；相同延迟保持配置顺序）。
+    每个数据源调用带指数退避重试；只有上游故障计入熔断。返回空数据、SymbolNotFound 说明上游正常应答，
+    不重试，记为成功（半开状态下的试探也就此关闭熔断）；经缓存时上游出错、缓存退回旧数据也照样记失败。
+    """
+    def __init__(self, providers, retries=3, backoff=0.5, max_backoff=8.0,
+                 fail_threshold=3, reset_timeout=60.0, rate_limiter=None, ewma_alpha=0.3, metrics=None):
+        self.providers = list(providers)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+        self.ewma_alpha = ewma_alpha
+        self.metrics = metrics    # instrument.RunMetrics，记录每次调用的耗时、重试和数据量
+        self.breakers = {p.name: CircuitBreaker(fail_threshold, reset_timeout) for p in self.providers}
+        self.latency = {p.name: 0.0 for p in self.providers}
+        self._lock = threading.Lock()
+
+    @property
+    def signature(self):
+        """数据源链的标识（按配置顺序的数据源名），用来区分不同脚本的 symbol 记忆"""
+        return ",".join(p.name for p in self.providers)
+
+    def ordered(self, symbol, only=None):
+        cands = [p for p in self.providers
+                 if (only is None or p.name in only) and p.accepts(symbol)]
+        return sorted(cands, key=lambda p: self.latency[p.name])
+
+    def _call(self, provider, symbol, start, end):
+        attempts = [0]
+        busy = [0.0]    # 真正在请求上游的时间，其余为限流和退避等待
+
+        def once():
+            attempts[0] += 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(provider.host)
+            t = time.monotonic()
+            try:
+                return provider.fetch(symbol, start, end)
+            finally:
+                busy[0] += time.monotonic() - t
+        retrying = Retrying(stop=stop_after_attempt(self.retries),
+                            wait=wait_exponential(multiplier=self.backoff, max=self.max_backoff),
+                            retry=retry_if_not_exception_type(SymbolNotFound), reraise=True)
+        t0 = time.monotonic()
+        try:
+            df = retrying(once)
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.record_fetch(symbol, provider.name, time.monotonic() - t0, attempts[0], ok=False,
+                                          wait_seconds=time.monotonic() - t0 - busy[0], error=str(e))
+            raise
+        elapsed = time.monotonic() - t0
+        with self._lock:
+            old = self.latency[provider.name]
+            self.latency[provider.name] = elapsed if old == 0 else \
+                self.ewma_alpha * elapsed + (1 - self.ewma_alpha) * old
+        if self.metrics is not None:
+            rows = 0 if df is None else len(df)
+            nbytes = 0 if df is None else int(df.memory_usage(index=True, deep=False).sum())
+            self.metrics.record_fetch(symbol, provider.name, elapsed, attempts[0], ok=True, rows=rows,
+                                      nbytes=nbytes, wait_seconds=elapsed - busy[0])
+        return df
+
+    def fetch(self, symbol, start=None, end=None, only=None, cache=None, offline=False):
+        """
+        返回 (df, provider_name, note)。传入 OhlcvCache 时按 '{symbol}_{provider}' 增量缓存，
+        offline=True 时只读缓存。
+        """
+        notes = []
+        for p in self.ordered(symbol, only):
+            breaker = self.breakers[p.name]
+            if not offline and not breaker.allow():
+                notes.append(f"{p.name}: circuit open")
+                continue
+            outcome = []    # 每次真正请求上游的结果："ok"（上游应答了，包括没有这只代码）/ "fail"（上游故障）
+
+            def fetch_fn(since, p=p, breaker=breaker, outcome=outcome):
+                # 在这里记熔断：缓存拿到异常后会退回旧数据，外面看不到上游已经挂了
+                try:
+                    df = self._call(p, symbol, since if since is not None else start, end)
+                except SymbolNotFound:
+                    outcome.append("ok")
+                    raise
+                except Exception:
+                    outcome.append("fail")
+                    breaker.record_failure()
+                    raise
+                outcome.append("ok")
+                return df
+            note = f"{p.name}: no data"
+            try:
+                if cache is not None:
+                    df = _clip(cache.update(f"{symbol}_{p.name}", fetch_fn, offline=offline), start, end)
+                else:
+                    df = fetch_fn(start)
+            except SymbolNotFound as e:
+                df, note = None, f"{p.name}: not found ({e})"
+            except Exception as e:
+                df, note = None, f"{p.name} error: {e}"
+            if outcome and outcome[-1] == "ok":
+                breaker.record_success()
+            elif not outcome and not offline:
+                breaker.release()
+            if df is None or df.empty:
+                notes.append(note)
+                continue
+            return df, p.name, ""
+        return None, None, "; ".join(notes) or f"no provider accepts {symbol}"
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+可插拔的报表输出：CSV / JSON Lines / Parquet / 流式 xlsx。
+每个 sink 都支持逐行写入（write_row），算完一个指数就写一行，不用把结果全攒在内存里；
+也支持一次写整个 DataFrame（write_frame）。
+
+Excel（openpyxl）在行数多时是最慢的一步，所以核心结果先落 CSV/Parquet，
+Excel 用 render_excel 在之后单独生成。
+"""
+
+import csv
+import json
+import math
+import os
+
+import pandas as pd
+
+
+def _plain(v):
+    """转成 csv/json 能直接写的 Python 值（NaN → None，numpy 标量 → Python 标量，日期 → 字符串）"""
+    if v is None or v is pd.NaT:
+        return None
+    if hasattr(v, "item") and not isinstance(v, (str, bytes)):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if hasattr(v, "isoformat"):
+        return v.isoformat()[:10] if getattr(v, "hour", 0) == 0 and getattr(v, "minute", 0) == 0 else v.isoformat()
+    return v
+
+
+class ReportSink(object):
+    """输出基类：write_row(dict) 逐行写，write_frame(df) 写整表，close() 收尾"""
+    def __init__(self, path):
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+    def write_row(self, row):
+        raise NotImplementedError
+
+    def write_frame(self, df):
+        for row in df.to_dict(orient="records"):
+            self.write_row(row)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(ReportSink):
+    """逐行写 CSV（utf-8-sig，Excel 直接打开不乱码），表头取自第一行"""
+    def __init__(self, path, encoding="utf-8-sig"):
+        super().__init__(path)
+        self._f = open(path, "w", newline="", encoding=encoding)
+        self._writer = None
+
+    def write_row(self, row):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._f, fieldnames=list(row.keys()))
+            self._writer.writeheader()
+        values = {k: _plain(v) for k, v in row.items()}
+        self._writer.writerow({k: "" if v is None else v for k, v in values.items()})
+
+    def close(self):
+        self._f.close()
+
+
+class JsonLinesSink(ReportSink):
+    """每行一个 JSON 对象；每 flush_every 行刷一次盘（close 时刷完），其余交给文件缓冲"""
+    def __init__(self, path, flush_every=100):
+        super().__init__(path)
+        self.flush_every = flush_every
+        self._f = open(path, "w", encoding="utf-8")
+        self._pending = 0
+
+    def write_row(self, row):
+        self._f.write(json.dumps({k: _plain(v) for k, v in row.items()}, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._f.flush()
+            self._pending = 0
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetSink(ReportSink):
+    """攒够 batch_size 行写一个 row group 的 Parquet（需要 pyarrow）"""
+    def __init__(self, path, batch_size=1000):
+        super().__init__(path)
+        self.batch_size = batch_size
+        self._rows = []
+        self._writer = None
+
+    def write_row(self, row):
+        self._rows.append({k: _plain(v) for k, v in row.items()})
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._rows)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class XlsxStreamSink(ReportSink):
+    """openpyxl write-only 模式流式写 xlsx，内存占用和行数无关"""
+    def __init__(self, path, sheet_name="Sheet1"):
+        super().__init__(path)
+        from openpyxl import Workbook
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(sheet_name)
+        self._header = None
+
+    def write_row(self, row):
+        if self._header is None:
+            self._header = list(row.keys())
+            self._ws.append(self._header)
+        self._ws.append([_plain(row.get(k)) for k in self._header])
+
+    def close(self):
+        self._wb.save(self.path)
+
+
+class MultiSink(ReportSink):
+    """同时写多个 sink"""
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write_row(self, row):
+        for s in self.sinks:
+            s.write_row(row)
+
+    def close(self):
+        for s in self.sinks:
+            s.close()
+
+
+SINKS = {
+    "csv": (CsvSink, ".csv"),
+    "jsonl": (JsonLinesSink, ".jsonl"),
+    "parquet": (ParquetSink, ".parquet"),
+    "xlsx": (XlsxStreamSink, ".xlsx"),
+}
+
+
+def make_sink(formats, base_path):
+    """formats 如 ["csv", "parquet"]，base_path 不带扩展名；返回 MultiSink"""
+    sinks = []
+    for fmt in formats:
+        cls, ext = SINKS[fmt]
+        sinks.append(cls(base_path + ext))
+    return MultiSink(sinks)
+
+
+def _read_csv_keep_codes(path):
+    """读 CSV 时保留 '000300' 这类前导 0 的代码为字符串，其余能转数字的列转成数字"""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    for c in df.columns:
+        col = df[c]
+        if col.str.match(r"^0\d").any():
+            continue
+        num = pd.to_numeric(col.replace("", None), errors="coerce")
+        if num.notna().sum() == (col != "").sum():
+            df[c] = num
+    return df
+
+
+def render_excel(src, xlsx_path):
+    """把已落盘的结果（DataFrame 或 csv/parquet/jsonl 路径）用流式 writer 转成 xlsx"""
+    if isinstance(src, pd.DataFrame):
+        df = src
+    elif src.endswith(".parquet"):
+        df = pd.read_parquet(src)
+    elif src.endswith(".jsonl"):
+        df = pd.read_json(src, lines=True, dtype=False)
+    else:
+        df = _read_csv_keep_codes(src)
+    with XlsxStreamSink(xlsx_path) as sink:
+        sink.write_frame(df)
+    return xlsx_path
+
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+常驻服务模式：一个进程长期运行，akshare / pandas 只导入一次，日线、symbol 记忆、上次的状态都留在内存里，
+按交易日历定时醒来：
+  - 收盘后（close_time）拉一次日线增量，结果写复盘表、状态日志和 history.csv
+  - 交易时段内每 intraday_minutes 分钟用一次实时快照刷新（同 report --spot），0 表示不做盘中刷新
+只有输入变了的指数才重算（日线的最后日期 / 收盘价 / 快照价变了），
+只有出现状态翻转、或偏离率相对上次输出变化超过 deviation_step 个百分点时才写新的报表和图。
+运行: python -m yupen_trade_system serve [--intraday 30] [--close-time 15:05] [--deviation-step 0.5] [--charts]
+"""
+
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from . import yupen_strategy2 as ys
+from .fetch_pool import fetch_all
+from .indicators import IndicatorPipeline
+from .instrument import RunMetrics
+from .report_sinks import make_sink, render_excel
+from .yupen_engine import apply_snapshot_frames, compute_states
+
+# ========== 配置区 ==========
+close_time = "15:05"      # 收盘后跑日线的时刻
+intraday_minutes = 30     # 盘中快照刷新间隔（分钟），0 表示只在收盘后跑
+sessions = [("09:30", "11:30"), ("13:00", "15:00")]  # 交易时段（盘中刷新只在这些时段内）
+deviation_step = 0.5      # 偏离率相对上次输出变化超过多少个百分点才重新输出
+charts = False            # 有变化的指数是否重画 K 线图
+plot_dir = "plots"
+calendar_file = "trade_calendar.csv"  # 交易日历缓存（放在 cache_dir 下），拉不到时按周一到周五处理
+max_sleep = 60.0          # 单次 sleep 的上限（秒），系统休眠 / 改时钟后也能及时醒来
+service_metrics_file = "yupen_service_metrics.json"
+# ============================
+
+
+def _minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+class TradingCalendar(object):
+    """
+    交易日历：优先用 akshare 的 tool_trade_date_hist_sina（缓存到本地，每天最多刷新一次），
+    离线或拉取失败时按周一到周五处理（节假日会空跑一次，但不会漏跑）。
+    """
+    def __init__(self, path=None, offline=False):
+        self.path = path
+        self.offline = offline
+        self._days = None
+        self._loaded_on = None
+
+    def _load(self):
+        today = pd.Timestamp.today().normalize()
+        if self._loaded_on == today:
+            return self._days
+        days = None
+        if self.path and os.path.exists(self.path):
+            days = pd.DatetimeIndex(pd.read_csv(self.path)["trade_date"])
+            if days.max() < today and not self.offline:
+                days = None  # 日历已过期（新的一年），重新拉
+        if days is None and not self.offline:
+            try:
+                import akshare as ak
+                days = pd.DatetimeIndex(pd.to_datetime(ak.tool_trade_date_hist_sina()["trade_date"]))
+                if self.path:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    pd.DataFrame({"trade_date": days.strftime("%Y-%m-%d")}).to_csv(self.path, index=False)
+            except Exception as e:
+                print(f"⚠️ 交易日历获取失败，按工作日处理: {e}")
+        self._days = set(days) if days is not None else None
+        self._loaded_on = today
+        return self._days
+
+    def is_trading_day(self, day):
+        day = pd.Timestamp(day).normalize()
+        days = self._load()
+        if days is None or day > max(days):
+            return day.weekday() < 5
+        return day in days
+
+    def wakeups(self, day):
+        """某个交易日的全部唤醒时刻 [(时刻, 'intraday' | 'close')]，按时间排序"""
+        day = pd.Timestamp(day).normalize()
+        out = []
+        if intraday_minutes:
+            for start, end in sessions:
+                for m in range(_minutes(start), _minutes(end) + 1, intraday_minutes):
+                    out.append((day + pd.Timedelta(minutes=m), "intraday"))
+        out.append((day + pd.Timedelta(minutes=_minutes(close_time)), "close"))
+        return sorted(out)
+
+    def next_wake(self, now):
+        """now 之后的下一个唤醒时刻 (时刻, 类型)"""
+        now = pd.Timestamp(now)
+        day = now.normalize()
+        for _ in range(30):
+            if self.is_trading_day(day):
+                for t, kind in self.wakeups(day):
+                    if t > now:
+                        return t, kind
+            day += pd.Timedelta(days=1)
+        raise RuntimeError("30 天内没有交易日，请检查交易日历")
+
+
+def _fingerprint(df):
+    """日线输入是否变化：行数、最后日期、最后收盘价、收盘价之和（历史被改写时也能发现）"""
+    close = pd.to_numeric(df["close"], errors="coerce")
+    return len(df), pd.Timestamp(df["date"].iloc[-1]), float(close.iloc[-1]), float(close.sum())
+
+
+class YupenService(object):
+    """
+    常驻状态：frames（各指数日线）、fingerprints（上次计算时的输入指纹）、states（compute_states 格式的结果），
+    emitted（上次输出时每个指数的 (状态, 偏离率)），用来判断这一轮要不要写报表。
+    """
+    def __init__(self, calendar=None):
+        self.calendar = calendar or TradingCalendar(os.path.join(ys.cache_dir, calendar_file), offline=ys.offline)
+        self.frames = {}
+        self.fingerprints = {}
+        self.states = None
+        self.spot_prices = {}
+        self.spot_states = None
+        self.emitted = {}
+        self.detector = ys.make_flip_detector()  # 常驻，盘中多轮之间的去抖计数才有意义
+        self.closed_on = None
+        self.stats = {"ticks": 0, "recomputed": 0, "skipped": 0, "reports": 0}
+
+    # ---- 计算 ----
+
+    def _recompute(self, changed, base, frames_fn):
+        """只对 changed 里的指数重算状态，其余沿用 base；各指数的状态互相独立，子集单独算结果相同"""
+        self.stats["recomputed"] += len(changed)
+        self.stats["skipped"] += len(self.frames) - len(changed)
+        if not changed:
+            return base
+        sub = IndicatorPipeline(frames_fn(changed)).states(ys.state_line)
+        if base is None or base.empty:
+            return sub
+        return pd.concat([base.drop(index=[c for c in changed if c in base.index]), sub])
+
+    def refresh_close(self, metrics):
+        """收盘后：增量拉日线，输入变了的指数才重算"""
+        end_date = datetime.today().strftime("%Y%m%d")
+        with metrics.stage("fetch"):
+            fetched = fetch_all(ys.index_list, lambda item: ys.fetch_history(item, end_date),
+                                max_workers=ys.max_workers)
+        changed = []
+        for (code, name), (cands, df) in zip(ys.index_list, fetched):
+            if df is None or df.empty:
+                print(f"⚠️ 无法获取 {name}({code}) 的历史数据，尝试过: {cands}")
+                continue
+            fp = _fingerprint(df)
+            if self.fingerprints.get(code) != fp:
+                self.frames[code] = df
+                self.fingerprints[code] = fp
+                changed.append(code)
+        with metrics.stage("compute_states"):
+            self.states = self._recompute(changed, self.states, lambda codes: {c: self.frames[c] for c in codes})
+        # 收盘后的日线已包含当天，盘中快照的结果作废
+        self.spot_prices, self.spot_states = {}, None
+        ys.symbol_resolver.save()
+        return changed
+
+    def refresh_intraday(self, now, metrics):
+        """盘中：一次快照，价格变了的指数才重算；第一次运行时日线只读本地缓存（没有才补拉）"""
+        if not self.frames:
+            with metrics.stage("history"):
+                for code, name in ys.index_list:
+                    df = ys.load_cached_history(code)
+                    if df is None and not ys.offline:
+                        df = ys.try_fetch_index(ys.build_symbol_candidates(code), ys.start_date,
+                                                datetime.today().strftime("%Y%m%d"), code=code)
+                    if df is not None and not df.empty:
+                        self.frames[code] = df
+                        self.fingerprints[code] = _fingerprint(df)
+        with metrics.stage("spot"):
+            spot = ys.fetch_index_spot(ys.resolve_spot_groups(self.frames), rate_limiter=ys.rate_limiter)
+        prices = dict(zip(spot["code"], spot["price"]))
+        trade_date = ys.spot_trade_date(now)
+        snap = {c: prices.get(str(c)[-6:]) for c in self.frames}
+        snap = {c: p for c, p in snap.items() if p is not None and not pd.isna(p)}
+        changed = [c for c in self.frames if c in snap and self.spot_prices.get(c) != snap[c]]
+        if self.spot_states is None:
+            changed = list(self.frames)
+
+        def frames(codes):
+            return apply_snapshot_frames({c: self.frames[c] for c in codes}, snap, trade_date)
+        with metrics.stage("compute_states"):
+            self.spot_states = self._recompute(changed, self.spot_states, frames)
+        self.spot_prices.update(snap)
+        return changed, trade_date
+
+    # ---- 输出 ----
+
+    def events(self, out_df):
+        """和上次输出比较，返回 [(代码, 原因)]：状态翻转，或偏离率变化超过 deviation_step"""
+        out = []
+        for _, row in out_df.iterrows():
+            code, state, dev = row["指数代码"], row["当前状态"], row["偏离率(%)"]
+            if state is None or pd.isna(dev):
+                continue
+            prev = self.emitted.get(code)
+            if prev is None:
+                out.append((code, "new"))
+            elif prev[0] != state:
+                out.append((code, f"flip {prev[0]}→{state}"))
+            elif abs(dev - prev[1]) >= deviation_step:
+                out.append((code, f"deviation {prev[1]:+.2f}→{dev:+.2f}"))
+        return out
+
+    def _emit(self, out_df, base_path, events, metrics):
+        with metrics.stage("export"), make_sink(ys.report_formats, base_path) as sink:
+            sink.write_frame(out_df)
+        print(f"✅ 已保存：{', '.join(s.path for s in sink.sinks)}")
+        for code, why in events:
+            print(f"  🔔 {code}: {why}")
+        for _, row in out_df.iterrows():
+            if row["当前状态"] is not None and not pd.isna(row["偏离率(%)"]):
+                self.emitted[row["指数代码"]] = (row["当前状态"], float(row["偏离率(%)"]))
+        self.stats["reports"] += 1
+        if charts:
+            self._plot([code for code, _ in events], metrics)
+
+    def _plot(self, codes, metrics):
+        """只重画有变化的指数（chart_pipeline 还会按内容哈希跳过没变的图）"""
+        from .chart_pipeline import render_charts
+        from .index_report import plot_job
+        names = dict(ys.index_list)
+        jobs = [plot_job("candle", self.frames[c], names[c], c, "ak_index", plot_dir)
+                for c in codes if c in self.frames and {"open", "high", "low", "volume"} <= set(self.frames[c])]
+        if not jobs:
+            return
+        os.makedirs(plot_dir, exist_ok=True)
+        with metrics.stage("plot"):
+            stats = render_charts(jobs, plot_dir, workers=1)
+        for path, err in stats["failed"]:
+            print("  ⚠️ 绘图失败:", path, err)
+
+    def tick(self, kind, now=None):
+        """跑一轮（kind 为 'close' 或 'intraday'），返回本轮的事件列表"""
+        now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+        metrics = RunMetrics(f"yupen_service_{kind}")
+        ys.providers.metrics = metrics
+        self.stats["ticks"] += 1
+        try:
+            if kind == "close":
+                changed = self.refresh_close(metrics)
+                states, day = self.states, now.strftime("%Y-%m-%d")
+                base_path = os.path.join(ys.output_dir, f"鱼盆模型复盘_{day}")
+            else:
+                changed, trade_date = self.refresh_intraday(now, metrics)
+                states, day = self.spot_states, trade_date.strftime("%Y-%m-%d")
+                base_path = os.path.join(ys.output_dir, f"鱼盆模型盘中_{day}")
+            if states is None:
+                states = compute_states(pd.DataFrame())
+            with metrics.stage("rank"):
+                out_df = ys.rank_report([ys.report_row(code, name, states) for code, name in ys.index_list])
+            ys.send_alerts(out_df, self.detector, metrics)
+            events = self.events(out_df)
+            print(f"[{now.strftime('%Y-%m-%d %H:%M')} {kind}] 重算 {len(changed)}/{len(self.frames)} 个指数，"
+                  f"{len(events)} 个变化")
+            if events:
+                self._emit(out_df, base_path, events, metrics)
+            if kind == "close" and self.closed_on != day:
+                # 状态日志每个交易日都记一条（即使没有变化），history.csv 同步更新
+                ys.write_state_log(day, out_df, metrics)
+                if events and ys.excel_output and "xlsx" not in ys.report_formats:
+                    with metrics.stage("excel"):
+                        render_excel(out_df, base_path + ".xlsx")
+                self.closed_on = day
+        finally:
+            ys.providers.metrics = None
+        metrics.merge_counters("service", {"changed": len(changed), "events": len(events)})
+        if service_metrics_file:
+            metrics.write_json(service_metrics_file)
+        return events
+
+    def run(self, once=None):
+        """
+        按交易日历循环；once 为 'close' / 'intraday' 时立即跑一轮就退出。
+        启动时如果今天已过收盘时刻、还没有跑过收盘，先补跑一次。
+        """
+        if once:
+            return self.tick(once)
+        now = pd.Timestamp.now()
+        if self.calendar.is_trading_day(now) and now >= now.normalize() + pd.Timedelta(minutes=_minutes(close_time)):
+            self.tick("close", now)
+        print("🐟 鱼盆服务已启动，Ctrl+C 退出")
+        try:
+            while True:
+                when, kind = self.calendar.next_wake(pd.Timestamp.now())
+                print(f"⏳ 下次唤醒：{when.strftime('%Y-%m-%d %H:%M')} ({kind})")
+                while True:
+                    left = (when - pd.Timestamp.now()).total_seconds()
+                    if left <= 0:
+                        break
+                    time.sleep(min(left, max_sleep))
+                try:
+                    self.tick(kind, when)
+                except Exception as e:
+                    # 一轮失败（网络等）不退出服务，等下一个唤醒时刻
+                    print(f"⚠️ {kind} 运行失败: {e}")
+        except KeyboardInterrupt:
+            print("👋 服务已退出", self.stats)
+        return None
+
+
+def main(once=None):
+    return YupenService().run(once=once)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+鱼盆模型状态日志：每天每个指数一行，只追加不覆盖（同一天重跑会替换当天的记录），存 SQLite，
+主键 (date, code)，另建 (code, date) 索引。
+可以直接查询"最近 N 天所有状态翻转"、"某指数某天的状态"，不用再翻一个个 鱼盆模型复盘_YYYY-MM-DD.xlsx。
+"""
+
+import glob
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+# 复盘表的中文列名 → 状态日志字段
+REPORT_COLUMNS = {
+    "指数代码": "code",
+    "指数名称": "name",
+    "当前状态": "state",
+    "当前点位": "close",
+    "临界点位": "ma",
+    "偏离率(%)": "deviation",
+    "状态穿越日": "cross_date",
+    "趋势强度": "rank",
+}
+FIELDS = ["date", "code", "name", "state", "close", "ma", "deviation", "cross_date", "rank"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    name TEXT,
+    state TEXT,
+    close REAL,
+    ma REAL,
+    deviation REAL,
+    cross_date TEXT,
+    rank INTEGER,
+    PRIMARY KEY (date, code)
+);
+CREATE INDEX IF NOT EXISTS idx_states_code_date ON states (code, date);
+"""
+
+
+class StateStore(object):
+    """按 (date, code) 存储的状态日志"""
+    def __init__(self, path="yupen_state.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def append(self, date, report_df):
+        """
+        写入一天的复盘结果。report_df 使用复盘表的中文列名（见 REPORT_COLUMNS）；
+        返回写入行数。同一 (date, code) 已存在时替换。
+        """
+        df = report_df.rename(columns=REPORT_COLUMNS)
+        df = df[[c for c in FIELDS if c in df.columns]].copy()
+        df["date"] = pd.Timestamp(date).strftime("%Y-%m-%d")
+        df["code"] = df["code"].astype(str).str.zfill(6)
+        for c in FIELDS:
+            if c not in df.columns:
+                df[c] = None
+        df = df[FIELDS].astype(object).where(df[FIELDS].notna(), None)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO states ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                df.itertuples(index=False, name=None))
+        return len(df)
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def state_on(self, code, date):
+        """指数 code 在 date 当天（没有则取之前最近一天）的记录，没有返回 None"""
+        df = self.query("SELECT * FROM states WHERE code = ? AND date <= ? ORDER BY date DESC LIMIT 1",
+                        (str(code).zfill(6), pd.Timestamp(date).strftime("%Y-%m-%d")))
+        return None if df.empty else df.iloc[0]
+
+    def latest(self):
+        """每个指数最近一天的记录（等价于原来的 history.csv）"""
+        return self.query("""
+            SELECT s.* FROM states s
+            JOIN (SELECT code, MAX(date) AS d FROM states GROUP BY code) m
+              ON s.code = m.code AND s.date = m.d
+            ORDER BY s.code""")
+
+    def flips(self, days=30, until=None):
+        """最近 days 天内所有状态翻转（与该指数上一条记录的状态不同），按日期排序"""
+        until = pd.Timestamp(until) if until is not None else pd.Timestamp.today()
+        since = (until - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+        return self.query("""
+            SELECT * FROM (
+                SELECT date, code, name, state,
+                       LAG(state) OVER (PARTITION BY code ORDER BY date) AS prev_state,
+                       close, ma, deviation, cross_date
+                FROM states
+            )
+            WHERE prev_state IS NOT NULL AND state IS NOT NULL AND state != prev_state
+              AND date >= ? AND date <= ?
+            ORDER BY date, code""", (since, until.strftime("%Y-%m-%d")))
+
+    def history(self, code):
+        """某个指数的全部记录"""
+        return self.query("SELECT * FROM states WHERE code = ? ORDER BY date", (str(code).zfill(6),))
+
+    def import_reports(self, pattern="鱼盆模型复盘_*.xlsx"):
+        """把已有的每日复盘 Excel 一次性导入状态日志（日期取自文件名），返回导入的文件数"""
+        n = 0
+        for path in sorted(glob.glob(pattern)):
+            m = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(path))
+            if not m:
+                continue
+            self.append(m.group(1), pd.read_excel(path, dtype={"指数代码": str}))
+            n += 1
+        return n
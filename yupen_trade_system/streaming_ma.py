@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+盘中增量指标：每个指数一个 StreamingMA，环形缓冲区保存最近 N 个收盘价和它们的和，
+每来一个 tick 常数时间更新 MA、偏离率、当前状态和穿越日，不用重新 rolling 全部历史。
+
+同一交易日内的多个 tick 只替换"今天"这根 K 线的价格；日期变了才把今天固定下来、滚动窗口。
+critical_price() 给出"今天收在多少会正好等于 MA"的临界点位：价格站上它即为 Yes，跌破即为 No。
+"""
+
+import pandas as pd
+
+from .yupen_engine import build_price_matrix, compute_states
+
+
+class StreamingMA(object):
+    """
+    单个指数的增量 MA 状态，语义与 yupen_engine.compute_states(window, min_periods=1) 一致。
+    prev_above / prev_cross_date 为上一根已收盘 K 线的状态，盘中状态翻转后又翻回时可以正确还原穿越日。
+    """
+    def __init__(self, window=20):
+        self.window = window
+        self._buf = [0.0] * window
+        self._head = 0          # 下一个写入位置
+        self.count = 0
+        self.total = 0.0
+        self.last_date = None
+        self.above = None
+        self.cross_date = None
+        self.prev_above = None
+        self.prev_cross_date = None
+
+    @classmethod
+    def from_history(cls, dates, closes, window=20):
+        """用历史日线初始化：最近 window 个收盘价进缓冲区，状态和穿越日由向量化引擎算出"""
+        obj = cls(window)
+        df = pd.DataFrame({"date": pd.to_datetime(pd.Series(dates)).to_numpy(),
+                           "close": pd.to_numeric(pd.Series(closes), errors="coerce").to_numpy()}).dropna()
+        if df.empty:
+            return obj
+        # 上一根 K 线的状态 = 去掉最后一根后算出的状态
+        if len(df) >= 2:
+            prev = compute_states(build_price_matrix({"_": df.iloc[:-1]}), window).iloc[0]
+            obj.above, obj.cross_date = prev["above"], prev["cross_date"]
+        for d, c in zip(df["date"].iloc[-window - 1:-1], df["close"].iloc[-window - 1:-1]):
+            obj._push(float(c))
+        if len(df) >= 2:
+            obj.last_date = pd.Timestamp(df["date"].iloc[-2]).date()
+        obj.update(float(df["close"].iloc[-1]), pd.Timestamp(df["date"].iloc[-1]).date())
+        return obj
+
+    def _push(self, price):
+        if self.count == self.window:
+            self.total -= self._buf[self._head]
+        else:
+            self.count += 1
+        self._buf[self._head] = price
+        self.total += price
+        self._head = (self._head + 1) % self.window
+
+    def _replace_last(self, price):
+        i = (self._head - 1) % self.window
+        self.total += price - self._buf[i]
+        self._buf[i] = price
+
+    @property
+    def last_price(self):
+        return self._buf[(self._head - 1) % self.window] if self.count else None
+
+    @property
+    def ma(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def deviation(self):
+        """偏离率（%），MA 为空或 0 时返回 None"""
+        ma = self.ma
+        if not ma:
+            return None
+        return (self.last_price - ma) / ma * 100
+
+    def update(self, price, date=None):
+        """
+        输入一个新价格（常数时间）。date 与当前 K 线同一天时替换今天的价格，否则新开一根 K 线。
+        返回当前状态 (price, ma, above, cross_date)。
+        """
+        date = pd.Timestamp(date).date() if date is not None else pd.Timestamp.today().date()
+        if self.last_date is not None and date == self.last_date and self.count:
+            self._replace_last(float(price))
+        else:
+            # 新的一天：把上一根 K 线的状态固定下来
+            self.prev_above, self.prev_cross_date = self.above, self.cross_date
+            self._push(float(price))
+            self.last_date = date
+        ma = self.ma
+        self.above = bool(self.last_price > ma)
+        if self.prev_above is not None and self.above != self.prev_above:
+            self.cross_date = date.strftime("%Y-%m-%d")
+        else:
+            self.cross_date = self.prev_cross_date
+        return self.last_price, ma, self.above, self.cross_date
+
+    def critical_price(self):
+        """
+        今天收盘价等于多少时正好 = MA（即"穿越价"）：
+        x = (窗口内其余 n-1 个收盘价之和) / (n-1)。窗口里只有今天一根时没有意义，返回 None。
+        """
+        if self.count < 2:
+            return None
+        return (self.total - self.last_price) / (self.count - 1)
+
+    def would_cross(self, price):
+        """以 price 收盘时状态是否会和上一根 K 线不同"""
+        crit = self.critical_price()
+        if crit is None or self.prev_above is None:
+            return False
+        return (price > crit) != self.prev_above
+
+
+def update_from_spot(indicators, spot_df, code_col="代码", price_col="最新价", date=None):
+    """
+    用一次实时行情快照（例如 ak.stock_zh_index_spot_em() 的结果）批量更新多个指数。
+    indicators: {code: StreamingMA}；返回 {code: (price, ma, above, cross_date)}，快照里没有的指数跳过。
+    """
+    prices = dict(zip(spot_df[code_col].astype(str), pd.to_numeric(spot_df[price_col], errors="coerce")))
+    out = {}
+    for code, ind in indicators.items():
+        price = prices.get(str(code))
+        if price is None or pd.isna(price):
+            continue
+        out[code] = ind.update(price, date)
+    return out
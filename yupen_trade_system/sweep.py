@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+并行参数扫描：把收盘价矩阵放进共享内存，用进程池把参数组合分给所有 CPU 核，
+每个 worker 直接在共享内存上建视图（零拷贝），不再为每个任务 pickle 一份 DataFrame。
+
+结果按块追加写入 CSV 检查点（每组参数一行，带 param_key），中断后重新运行会跳过已完成的组合。
+扫描参数即 backtest.run_backtest 的参数：window、min_periods、threshold、confirm_days、rotation、top_k、cost_bps。
+"""
+
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .backtest import load_close_matrix, run_backtest
+from .compact_store import open_store
+from .yupen_engine import moving_average
+
+# worker 进程内的全局状态（由 _init_worker 设置）
+_shm = None
+_close = None
+_ma_cache = {}
+
+
+def _attach(shm_name):
+    """
+    挂上主进程建好的共享内存，但不在 resource_tracker 登记：段的生命周期归主进程（用完 unlink），
+    worker 登记了的话，单独有 tracker 的 worker 退出时会报泄漏、甚至提前 unlink。
+    挂上后再 unregister 不行：Linux 上 spawn / fork 出来的 worker 和主进程共用一个 tracker，
+    会把主进程自己的登记删掉，主进程 unlink 时报 KeyError。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    # 3.12 及以前没有 track 参数：挂载期间临时跳过登记（worker 初始化时是单线程）
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=shm_name)
+    finally:
+        resource_tracker.register = register
+
+
+def _init_worker(shm_name, shape, index_ns, columns):
+    """worker 启动时挂上共享内存，构造只读的 DataFrame 视图"""
+    global _shm, _close
+    _shm = _attach(shm_name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    values.flags.writeable = False
+    _close = pd.DataFrame(values, index=pd.DatetimeIndex(np.asarray(index_ns, dtype="datetime64[ns]")),
+                          columns=columns, copy=False)
+
+
+def _run_chunk(param_list):
+    """在 worker 中跑一批参数；同一 (window, min_periods) 的 MA 在进程内复用"""
+    rows = []
+    for params in param_list:
+        key = (params.get("window", 20), params.get("min_periods", 1))
+        if key not in _ma_cache:
+            if len(_ma_cache) > 8:
+                _ma_cache.clear()
+            _ma_cache[key] = moving_average(_close, *key)
+        res = run_backtest(_close, ma=_ma_cache[key], detail=False, **params)
+        rows.append(dict(res.params, param_key=param_key(params), **res.stats))
+    return rows
+
+
+def param_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def expand_grid(grid, **fixed):
+    """
+    {参数名: 取值列表} → 参数字典列表，按 (window, min_periods) 排序以便同一块内复用 MA。
+    top_k 只在 rotation="top_k" 时起作用，其他轮动方式的组合把 top_k 记为 None 并去重，不重复跑同一个回测。
+    """
+    names = list(grid)
+    combos, seen = [], set()
+    for c in itertools.product(*(grid[n] for n in names)):
+        params = dict(fixed, **dict(zip(names, c)))
+        if "top_k" in params and params.get("rotation", "all") != "top_k":
+            params["top_k"] = None
+        key = param_key(params)
+        if key not in seen:
+            seen.add(key)
+            combos.append(params)
+    return sorted(combos, key=lambda p: (p.get("window", 20), p.get("min_periods", 1)))
+
+
+def _done_keys(checkpoint):
+    if not checkpoint or not os.path.exists(checkpoint):
+        return set()
+    return set(pd.read_csv(checkpoint, usecols=["param_key"])["param_key"])
+
+
+def run_sweep(close, grid, checkpoint="sweep_results.csv", workers=None, chunk_size=16, **fixed):
+    """
+    并行扫描 grid 中的全部参数组合，返回完整结果表（包含检查点里已有的结果）。
+    workers 默认等于 CPU 核数；checkpoint 为 None 时不落盘。
+    """
+    done_keys = _done_keys(checkpoint)
+    todo = [p for p in expand_grid(grid, **fixed) if param_key(p) not in done_keys]
+    workers = workers or os.cpu_count() or 1
+    collected = []
+    if todo:
+        values = np.ascontiguousarray(close.to_numpy(dtype=np.float64))
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        try:
+            np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+            chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+            index_ns = pd.DatetimeIndex(close.index).to_numpy().astype("datetime64[ns]").view("int64")
+            initargs = (shm.name, values.shape, index_ns, list(close.columns))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+                futures = [pool.submit(_run_chunk, c) for c in chunks]
+                done = 0
+                for fut in as_completed(futures):
+                    rows = fut.result()
+                    collected.extend(rows)
+                    if checkpoint:
+                        pd.DataFrame(rows).to_csv(checkpoint, mode="a", index=False,
+                                                  header=not os.path.exists(checkpoint))
+                    done += len(rows)
+                    print(f"  sweep {done}/{len(todo)}")
+        finally:
+            shm.close()
+            shm.unlink()
+    if checkpoint and os.path.exists(checkpoint):
+        return pd.read_csv(checkpoint)
+    return pd.DataFrame(collected)
+
+
+def main(cache_dir="cache", suffix="_ak_index", checkpoint="sweep_results.csv", workers=None, store=None):
+    """大网格参数扫描，结果逐块写入 checkpoint，中断后重跑会跳过已完成的组合"""
+    # ========== 配置区 ==========
+    grid = {
+        "window": [5, 10, 15, 20, 30, 40, 60, 120],
+        "min_periods": [1, 20],
+        "threshold": [0.0, 0.25, 0.5, 1.0, 2.0],
+        "confirm_days": [1, 2, 3, 5],
+        "rotation": ["all", "top_k"],
+        "top_k": [1, 3, 5],
+    }
+    # ============================
+    close = open_store(store).matrix("close") if store else load_close_matrix(cache_dir, suffix=suffix)
+    if close.empty:
+        print(f"⚠️ {cache_dir} 中没有缓存数据，请先运行 python -m yupen_trade_system report")
+        return None
+    table = run_sweep(close, grid, checkpoint=checkpoint, workers=workers)
+    print(table.sort_values("sharpe", ascending=False).head(20))
+    return table
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+symbol 解析结果记忆：记住每个输入代码上次成功用的 provider symbol 和拉取方法，
+下次运行直接先试它，省掉 sh/sz/原样/清洗后 等多种写法的探测（每次失败都是一次网络请求 + sleep）。
+记录带 TTL，过期或者用它拉取失败时作废，重新走完整探测流程。
+几个脚本共用一个 symbol_map.json 时，用 scope（数据源链的标识）把各自的记录分开，免得互相覆盖。
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class SymbolResolver(object):
+    """
+    输入代码 → {"symbol": 可用的 provider symbol, "method": 拉取方法, "ts": 记录时间}
+    持久化为 JSON 文件；线程安全，可以在并发拉取中共用一个实例。
+    scope 不为空时文件里的键是 "scope|code"，同一个输入代码在不同数据源链下各记各的。
+    """
+    def __init__(self, path="symbol_map.json", ttl_days=30, scope=None):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._loaded_map = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "probes": 0, "probes_saved": 0}
+
+    @property
+    def _map(self):
+        """第一次用到时才读 JSON 文件（调用方已持有 _lock），模块级建实例不产生文件 IO"""
+        if self._loaded_map is None:
+            self._loaded_map = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._loaded_map = json.load(f)
+                except (OSError, ValueError):
+                    self._loaded_map = {}
+        return self._loaded_map
+
+    def _key(self, code):
+        return f"{self.scope}|{code}" if self.scope else str(code)
+
+    def get(self, code, candidates=None):
+        """返回未过期的 (symbol, method)，没有则返回 None；给了 candidates 时记住的 symbol 不在其中也算没有"""
+        with self._lock:
+            entry = self._map.get(self._key(code))
+        if not entry or time.time() - entry.get("ts", 0) > self.ttl:
+            return None
+        if candidates is not None and entry["symbol"] not in candidates:
+            return None
+        return entry["symbol"], entry["method"]
+
+    def order(self, code, candidates):
+        """把记住的 symbol 放到候选列表最前面；同时统计命中/未命中"""
+        hit = self.get(code, candidates)
+        with self._lock:
+            if hit is None:
+                self.stats["misses"] += 1
+                return list(candidates)
+            self.stats["hits"] += 1
+        return [hit[0]] + [c for c in candidates if c != hit[0]]
+
+    def record_success(self, code, symbol, method, candidates, probes_used):
+        """
+        记录成功结果。candidates 为未经调整的默认探测顺序，
+        用它估算不走记忆时需要探测的次数，差值计入 probes_saved。
+        """
+        baseline = candidates.index(symbol) + 1 if symbol in candidates else len(candidates)
+        with self._lock:
+            self.stats["probes"] += probes_used
+            self.stats["probes_saved"] += max(0, baseline - probes_used)
+            self._map[self._key(code)] = {"symbol": symbol, "method": method, "ts": time.time()}
+
+    def record_failure(self, code, probes_used):
+        with self._lock:
+            self.stats["probes"] += probes_used
+
+    def invalidate(self, code):
+        """记住的 symbol 拉取失败时调用，删掉这条记录"""
+        with self._lock:
+            if self._map.pop(self._key(code), None) is not None:
+                self.stats["invalidations"] += 1
+
+    def save(self):
+        """原子写回 JSON 文件，顺带清掉过期记录（换了 scope 之后旧键不会再被读到）"""
+        now = time.time()
+        with self._lock:
+            data = {k: v for k, v in self._map.items() if now - v.get("ts", 0) <= self.ttl}
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        s = self.stats
+        return (f"symbol 记忆: 命中 {s['hits']} / 未命中 {s['misses']}，作废 {s['invalidations']}，"
+                f"实际探测 {s['probes']} 次，节省探测 {s['probes_saved']} 次")
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""状态翻转提醒：被回滞压住的翻转，之后确认时要提醒且只提醒一次"""
+
+import pandas as pd
+import pytest
+
+from yupen_trade_system import yupen_strategy2 as ys
+from yupen_trade_system.alerts import make_alert_sinks
+from yupen_trade_system.instrument import RunMetrics
+
+
+def _report(state, dev):
+    return pd.DataFrame([{"指数代码": "000300", "指数名称": "沪深300", "当前状态": state, "偏离率(%)": dev,
+                          "当前点位": 4000.0, "临界点位": 3990.0, "状态穿越日": "2024-06-03"}])
+
+
+def _run(out_df):
+    """一次收盘运行里和提醒有关的部分：发提醒，然后 history.csv 被原始状态覆盖（同 write_state_log）"""
+    alerts = ys.send_alerts(out_df, ys.make_flip_detector(), RunMetrics("test"))
+    out_df[["指数代码", "当前状态", "状态穿越日"]].rename(
+        columns={"当前状态": "上次状态", "状态穿越日": "上次状态时间"}).to_csv(ys.history_file, index=False)
+    return alerts
+
+
+def test_flip_held_by_hysteresis_alerts_once_when_confirmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(ys, "history_file", str(tmp_path / "history.csv"))
+    monkeypatch.setattr(ys, "alert_state_file", str(tmp_path / "baseline.json"))
+    monkeypatch.setattr(ys, "alert_sinks", [])
+    monkeypatch.setattr(ys, "alert_hysteresis", 1.0)
+    _run(_report("No", -2.0))                    # 第一次见到，只记基准
+
+    assert _run(_report("Yes", 0.5)) == []       # 偏离率没越过回滞，不提醒
+    alerts = _run(_report("Yes", 2.0))           # 确认翻转
+    assert [(a["prev_state"], a["state"]) for a in alerts] == [("No", "Yes")]
+    assert _run(_report("Yes", 3.0)) == []
+
+
+def test_make_alert_sinks_rejects_missing_target():
+    with pytest.raises(ValueError):
+        make_alert_sinks(["file"])
+    with pytest.raises(ValueError):
+        make_alert_sinks(["webhook"])
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Prometheus 文本：同一个 symbol 拉了两次也只有一组标签一个样本"""
+
+from yupen_trade_system.instrument import RunMetrics
+
+
+def test_repeated_fetch_is_one_sample_per_label_set(tmp_path):
+    m = RunMetrics("test")
+    m.record_fetch("sh000300", "ak_index", 0.5, attempts=2, rows=10, nbytes=100)
+    m.record_fetch("sh000300", "ak_index", 0.25, attempts=1, rows=1, nbytes=10)
+    m.record_fetch("sz399006", "ak_index", 0.1)
+    path = m.write_prometheus(str(tmp_path / "metrics.prom"))
+
+    samples = [line for line in open(path, encoding="utf-8") if not line.startswith("#")]
+    label_sets = [line.rsplit(" ", 1)[0] for line in samples]
+    assert len(label_sets) == len(set(label_sets))
+    values = {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in samples}
+    lab = '{job="test",symbol="sh000300",provider="ak_index"}'
+    assert values["yupen_fetch_calls" + lab] == 2
+    assert values["yupen_fetch_seconds" + lab] == 0.75
+    assert values["yupen_fetch_retries" + lab] == 1
+    assert values["yupen_fetch_bytes" + lab] == 110
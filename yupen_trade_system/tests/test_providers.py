@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""数据源层：熔断器只按上游故障计数，缓存兜底时也要记失败"""
+
+import pandas as pd
+
+from yupen_trade_system.ohlcv_cache import OhlcvCache
+from yupen_trade_system.providers import DataProvider, ProviderChain
+
+
+class FakeProvider(DataProvider):
+    name = "fake"
+
+    def __init__(self, mode="ok"):
+        self.mode = mode
+        self.calls = 0
+
+    def _fetch(self, symbol, start, end):
+        self.calls += 1
+        if self.mode == "down":
+            raise ConnectionError("connection reset")
+        if self.mode == "missing":
+            raise KeyError("date")
+        if self.mode == "empty":
+            return None
+        dates = pd.bdate_range("2024-01-01", periods=30)
+        return pd.DataFrame({"date": dates, "close": range(100, 130)})
+
+
+def _chain(provider, **kw):
+    return ProviderChain([provider], retries=1, backoff=0, fail_threshold=3, **kw)
+
+
+def test_breaker_opens_when_provider_is_down_behind_warm_cache(tmp_path):
+    provider = FakeProvider("ok")
+    cache = OhlcvCache(str(tmp_path))
+    chain = _chain(provider)
+    df, _, _ = chain.fetch("sh000300", cache=cache)
+    assert len(df) == 30
+
+    provider.mode = "down"
+    for _ in range(3):
+        df, _, _ = chain.fetch("sh000300", cache=cache)
+        assert len(df) == 30    # 缓存兜底，照样有数据
+    assert cache.stats["fallback"] == 3
+    assert chain.breakers["fake"].state == "open"
+
+    calls = provider.calls
+    _, _, note = chain.fetch("sh000300", cache=cache)
+    assert "circuit open" in note
+    assert provider.calls == calls
+
+
+def test_half_open_probe_closes_on_not_found_and_empty():
+    for mode in ("missing", "empty"):
+        provider = FakeProvider("down")
+        chain = _chain(provider, reset_timeout=0.0)
+        for _ in range(3):
+            chain.fetch("sh000300")
+        breaker = chain.breakers["fake"]
+        assert breaker.state == "open"
+
+        provider.mode = mode
+        df, _, _ = chain.fetch("sh000300")    # 超时后的半开试探：上游应答了，只是没有数据
+        assert df is None
+        assert breaker.state == "closed"
+        provider.mode = "ok"
+        df, _, _ = chain.fetch("sh000300")
+        assert len(df) == 30
+
+
+def test_offline_read_does_not_touch_breaker(tmp_path):
+    provider = FakeProvider("ok")
+    cache = OhlcvCache(str(tmp_path))
+    chain = _chain(provider)
+    chain.fetch("sh000300", cache=cache)
+    provider.mode = "down"
+    df, _, _ = chain.fetch("sh000300", cache=cache, offline=True)
+    assert len(df) == 30
+    assert chain.breakers["fake"].failures == 0
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""参数网格：rotation="all" 时 top_k 不起作用，不按 top_k 展开"""
+
+from yupen_trade_system.sweep import expand_grid
+
+
+def test_top_k_collapses_when_rotation_is_all():
+    grid = {"window": [10, 20], "rotation": ["all", "top_k"], "top_k": [1, 3, 5]}
+    combos = expand_grid(grid)
+    assert len(combos) == 2 * (1 + 3)
+    assert {p["top_k"] for p in combos if p["rotation"] == "all"} == {None}
+    assert sorted(p["top_k"] for p in combos if p["rotation"] == "top_k") == [1, 1, 3, 3, 5, 5]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""symbol 记忆：两个脚本共用一个 symbol_map.json 时各记各的，不互相覆盖"""
+
+from yupen_trade_system.symbol_resolver import SymbolResolver
+
+
+def test_scopes_sharing_one_file_keep_their_own_entries(tmp_path):
+    path = str(tmp_path / "symbol_map.json")
+    line = SymbolResolver(path, scope="ak_a_hist,ak_gold_spot,yfinance")
+    line.record_success("沪深300", "000300", "ak_a_hist", ["000300"], 1)
+    line.save()
+    candle = SymbolResolver(path, scope="ak_a_hist_qfq")
+    assert candle.get("沪深300") is None
+    candle.record_success("沪深300", "510300", "ak_a_hist_qfq", ["510300"], 1)
+    candle.save()
+
+    line, candle = SymbolResolver(path, scope=line.scope), SymbolResolver(path, scope=candle.scope)
+    assert line.get("沪深300") == ("000300", "ak_a_hist")
+    assert candle.get("沪深300") == ("510300", "ak_a_hist_qfq")
+
+
+def test_remembered_symbol_outside_candidates_is_ignored(tmp_path):
+    r = SymbolResolver(str(tmp_path / "symbol_map.json"))
+    r.record_success("黄金", "Au99.99", "ak_gold_spot", ["Au99.99"], 1)
+    assert r.get("黄金", ["AU=F"]) is None
+    assert r.order("黄金", ["AU=F"]) == ["AU=F"]
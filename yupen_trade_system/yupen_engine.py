@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+鱼盆模型向量化引擎：把所有指数的收盘价对齐成一个 日期 × 指数 的矩阵，
+一次性算出每个指数的 MA-N、偏离率、当前状态（收盘价是否在均线上方）、最近一次穿越日和趋势强度排名，
+不再对每个指数单独建 DataFrame / rolling / shift。
+
+各指数的上市时间、停牌日不同，矩阵里会有 NaN。均线按"每个指数自己的最近 N 根有效 K 线"计算，
+与逐个指数 rolling(window=N, min_periods=...) 的结果一致：先把每列的有效值稳定地挤到上面（compact），
+在挤压后的矩阵上用累计和算滑动均值，再按原位置放回。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def frame_layout(frames, date_col="date"):
+    """
+    所有指数日期的并集（升序）以及每个指数的行在并集里的位置，拼多个字段的矩阵时只算一次。
+    返回 (dates, {symbol: (positions, keep)})，keep 为去掉重复日期（保留最后一条）后的行掩码。
+    """
+    parts = {}
+    for sym, df in frames.items():
+        if df is None or df.empty:
+            continue
+        dates = df[date_col]
+        if dates.dtype.kind != "M":
+            dates = pd.to_datetime(dates)
+        idx = pd.DatetimeIndex(dates).as_unit("ns")
+        keep = ~idx.duplicated(keep="last")
+        parts[sym] = (idx.asi8[keep], keep)
+    if not parts:
+        return pd.DatetimeIndex([]), {}
+    union = np.unique(np.concatenate([d for d, _ in parts.values()]))
+    layout = {sym: (np.searchsorted(union, d), keep) for sym, (d, keep) in parts.items()}
+    return pd.DatetimeIndex(union.view("datetime64[ns]")), layout
+
+
+def fill_matrix(frames, dates, layout, col):
+    """按 frame_layout 的结果把某一列放进 日期 × symbol 矩阵，缺这一列的指数整列为 NaN"""
+    out = np.full((len(dates), len(layout)), np.nan)
+    for j, (sym, (pos, keep)) in enumerate(layout.items()):
+        df = frames[sym]
+        if col in df.columns:
+            values = df[col]
+            if values.dtype.kind not in "fiu":
+                values = pd.to_numeric(values, errors="coerce")
+            out[pos, j] = values.to_numpy(dtype=float)[keep]
+    return pd.DataFrame(out, index=dates, columns=list(layout))
+
+
+def build_price_matrix(frames, date_col="date", close_col="close"):
+    """
+    frames: {symbol: DataFrame(含日期列和收盘价列)} → 日期 × symbol 的收盘价矩阵（按日期升序）。
+    列顺序与 frames 的插入顺序一致。
+    """
+    dates, layout = frame_layout(frames, date_col)
+    if not layout:
+        return pd.DataFrame()
+    return fill_matrix(frames, dates, layout, close_col)
+
+
+def apply_snapshot(close_matrix, prices, date):
+    """
+    把一次实时快照并进收盘价矩阵：prices 为 {symbol: 最新价}（或 Series），date 为快照所属交易日。
+    矩阵里已有 date 这一行时覆盖（例如收盘后缓存里已有今天），否则在末尾追加一行；
+    快照里没有的 symbol 该行为 NaN，compute_states 会沿用它最后一根有效 K 线。
+    """
+    date = pd.Timestamp(date).normalize()
+    prices = pd.Series(prices, dtype="float64").reindex(close_matrix.columns)
+    values = close_matrix.to_numpy(dtype=float)
+    index = close_matrix.index
+    if len(index) and index[-1] == date:
+        row = values[-1].copy()
+        values = values.copy()
+        values[-1] = np.where(np.isnan(prices.to_numpy()), row, prices.to_numpy())
+    elif len(index) and index[-1] > date:
+        raise ValueError(f"快照日期 {date.date()} 早于矩阵最后一天 {index[-1].date()}")
+    else:
+        values = np.vstack([values, prices.to_numpy()[None, :]])
+        index = index.append(pd.DatetimeIndex([date]))
+    return pd.DataFrame(values, index=index, columns=close_matrix.columns)
+
+
+def apply_snapshot_frames(frames, prices, date, date_col="date"):
+    """
+    apply_snapshot 的 DataFrame 版本，给 indicators.IndicatorPipeline 用（参考线可以是 MA 以外的指标）：
+    frames 为 {symbol: 日线}，prices 为 {symbol: 最新价}。快照那一天已有时覆盖收盘价，否则追加一行，
+    开高低都取最新价，成交量沿用上一根（盘中成交量不完整）；快照里没有的 symbol 原样返回。
+    """
+    date = pd.Timestamp(date).normalize()
+    out = {}
+    for sym, df in frames.items():
+        price = prices.get(sym)
+        if price is None or pd.isna(price) or df is None or df.empty:
+            out[sym] = df
+            continue
+        last = pd.Timestamp(df[date_col].iloc[-1]).normalize()
+        if last > date:
+            raise ValueError(f"快照日期 {date.date()} 早于 {sym} 最后一天 {last.date()}")
+        df = df.copy()
+        if last == date:
+            df.loc[df.index[-1], "close"] = price
+        else:
+            row = {c: np.nan for c in df.columns}
+            row.update({c: price for c in ("open", "high", "low", "close") if c in df.columns})
+            row[date_col] = date
+            if "volume" in df.columns:
+                row["volume"] = df["volume"].iloc[-1]
+            df = pd.concat([df, pd.DataFrame([row], columns=df.columns)], ignore_index=True)
+        out[sym] = df
+    return out
+
+
+def compact(values):
+    """
+    把每列的有效值（非 NaN）按原顺序挤到上面。
+    返回 (compacted, order, n_valid)：compacted[i, j] = values[order[i, j], j]，
+    每列前 n_valid[j] 行为有效值。
+    """
+    nan_mask = np.isnan(values)
+    order = np.argsort(nan_mask, axis=0, kind="stable")
+    return np.take_along_axis(values, order, axis=0), order, (~nan_mask).sum(axis=0)
+
+
+def valid_cumsum(c, n_valid):
+    """挤压后矩阵的 (累计和, 有效行掩码)；同一份累计和可以给任意窗口的均线复用"""
+    valid = np.arange(c.shape[0])[:, None] < n_valid[None, :]
+    return np.cumsum(np.where(valid, c, 0.0), axis=0), valid
+
+
+def window_sum(cs, window):
+    """由累计和得到最近 window 行之和，以及参与求和的行数"""
+    lagged = np.zeros_like(cs)
+    lagged[window:] = cs[:-window]
+    count = np.minimum(np.arange(cs.shape[0])[:, None] + 1, window).astype(float)
+    return cs - lagged, count
+
+
+def rolling_mean_from_cumsum(cs, valid, window, min_periods):
+    total, count = window_sum(cs, window)
+    ma = total / count
+    ma[~valid | (count < min_periods)] = np.nan
+    return ma
+
+
+def _rolling_mean_compacted(c, n_valid, window, min_periods):
+    """在挤压后的矩阵上用累计和计算滑动均值（每列只看自己的有效行）"""
+    cs, valid = valid_cumsum(c, n_valid)
+    return rolling_mean_from_cumsum(cs, valid, window, min_periods), valid
+
+
+def _scatter_back(compacted, order):
+    out = np.empty_like(compacted)
+    np.put_along_axis(out, order, compacted, axis=0)
+    return out
+
+
+def moving_average(close_matrix, window=20, min_periods=1):
+    """日期 × symbol 的 MA-N 矩阵（每列按自己的有效 K 线计算，NaN 位置保持 NaN）"""
+    values = close_matrix.to_numpy(dtype=float)
+    c, order, n_valid = compact(values)
+    ma, _ = _rolling_mean_compacted(c, n_valid, window, min_periods)
+    return pd.DataFrame(_scatter_back(ma, order), index=close_matrix.index, columns=close_matrix.columns)
+
+
+def trend_rank(deviation):
+    """
+    趋势强度：按偏离率从大到小 dense 排名；偏离率为空的排在最后
+    （与原复盘脚本一致：空值先按最小值参与排名，再统一设为最大序号 + 1）
+    """
+    dev = pd.Series(deviation, dtype=float)
+    rank = dev.fillna(-np.inf).rank(ascending=False, method="dense").astype(int)
+    if dev.isna().any():
+        rank[dev.isna()] = rank.max() + 1
+    return rank
+
+
+def compute_states(close_matrix, window=20, min_periods=1):
+    """
+    一次向量化计算所有指数的当前状态，返回以 symbol 为索引的 DataFrame：
+      close, ma, above (bool，均线为空时为 False，没有数据时为 None), deviation (%), cross_date ('YYYY-MM-DD' 或 None), rank
+    语义与 yupen_strategy2.find_last_cross_date 相同：穿越日是 above 状态最近一次发生变化的那一天。
+    """
+    symbols = list(close_matrix.columns)
+    if close_matrix.empty:
+        return pd.DataFrame(index=pd.Index(symbols, name="symbol"),
+                            columns=["close", "ma", "above", "deviation", "cross_date", "rank"])
+    c, order, n_valid = compact(close_matrix.to_numpy(dtype=float))
+    ma, valid = _rolling_mean_compacted(c, n_valid, window, min_periods)
+    return states_from_line(c, order, n_valid, valid, ma, close_matrix.index, symbols)
+
+
+def states_from_line(c, order, n_valid, valid, ma, dates, symbols):
+    """
+    在挤压后的坐标里，按收盘价 c 相对参考线 ma（MA-N，也可以是 EMA、VWMA 等）的位置算状态、偏离率和穿越日，
+    输出格式与 compute_states 相同。
+    """
+    above = np.where(np.isnan(ma), False, c > np.nan_to_num(ma, nan=np.inf))
+    changed = np.zeros_like(above)
+    changed[1:] = (above[1:] != above[:-1]) & valid[1:]
+
+    n_rows = c.shape[0]
+    cols = np.arange(c.shape[1])
+    last = np.clip(n_valid - 1, 0, max(n_rows - 1, 0))
+    has_data = n_valid > 0
+    cur_close = np.where(has_data, c[last, cols], np.nan)
+    cur_ma = np.where(has_data, ma[last, cols], np.nan)
+    cur_above = above[last, cols]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dev = np.where((cur_ma == 0) | np.isnan(cur_ma), np.nan, (cur_close - cur_ma) / cur_ma * 100)
+
+    # 最近一次变化所在的（挤压后）行号，-1 表示从未变化
+    last_change = np.where(changed, np.arange(n_rows)[:, None], -1).max(axis=0)
+    cross_rows = order[np.clip(last_change, 0, None), cols]
+    cross_dates = pd.DatetimeIndex(dates[cross_rows]).strftime("%Y-%m-%d")
+
+    index = pd.Index(symbols, name="symbol")
+    out = pd.DataFrame({"close": cur_close, "ma": cur_ma}, index=index)
+    # 显式用 object 列，保证缺失值是 None（新版 pandas 会把字符串列推断成 str 并把 None 变成 NaN）
+    out["above"] = pd.Series([bool(a) if h else None for a, h in zip(cur_above, has_data)], index=index, dtype=object)
+    out["deviation"] = dev
+    out["cross_date"] = pd.Series([d if lc >= 0 else None for d, lc in zip(cross_dates, last_change)],
+                                  index=index, dtype=object)
+    out["rank"] = trend_rank(out["deviation"]).to_numpy()
+    return out
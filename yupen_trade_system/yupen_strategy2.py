@@ -1,15 +1,27 @@
 """
-鱼盆模型 — 全自动版（使用 akshare 的 stock_zh_index_daily，临界点用 MA20，状态穿越日期为真正穿越 MA20 的那天）
+鱼盆模型 — 全自动版（使用 akshare 的 stock_zh_index_daily_em，临界点用 MA20，状态穿越日期为真正穿越 MA20 的那天）
 依赖: akshare, pandas, openpyxl
 pip install akshare pandas openpyxl
+运行: python -m yupen_trade_system report
+盘中刷新: python -m yupen_trade_system report --spot（一次实时快照 + 本地缓存的历史日线）
 """
 
-import akshare as ak
 import pandas as pd
 from datetime import datetime
 import os
 import time
 
+from .alerts import AlertDispatcher, FlipDetector, load_history_states, make_alert_sinks
+from .fetch_pool import HostRateLimiter, fetch_all
+from .indicators import IndicatorPipeline
+from .instrument import RunMetrics
+from .report_sinks import make_sink, render_excel
+from .ohlcv_cache import OhlcvCache
+from .providers import AkIndexProvider, ProviderChain, fetch_index_spot
+from .state_store import StateStore
+from .symbol_resolver import SymbolResolver
+from .yupen_engine import apply_snapshot_frames, build_price_matrix, compute_states, trend_rank
+
 # ========== 配置区 ==========
 # 你可以只写 6 位指数代码（例如 '000300'、'000016'、'399006'），也可以写 'sh000300' / 'sz399006'。
 index_list = [
@@ -26,28 +38,68 @@ index_list = [
 
 start_date = "20240101"  # 拉取历史起始日（可按需调整）
 history_file = "history.csv"
+state_db = "yupen_state.db"  # 按 (日期, 指数代码) 追加的状态日志
 output_dir = "."
+report_formats = ["csv"]  # 核心结果输出格式，可选 csv / jsonl / parquet / xlsx
+excel_output = True       # 核心结果落盘后再生成 Excel 复盘表（行数很多时可关掉）
+stream_rows = False       # True 时每算完一个指数就把明细写入 鱼盆模型明细_日期.*
+max_workers = 4          # 并发拉取的线程数（1 表示串行）
+host_rate_limit = 2.0    # 每个上游主机每秒最多请求数（0 表示不限流）
+cache_dir = "cache"      # 本地日线缓存目录
+offline = False          # True 时只读本地缓存，不访问网络
+metrics_file = "yupen_run_metrics.json"  # 本次运行的分阶段耗时、拉取明细、缓存命中率（None 表示不写）
+prometheus_file = None    # 需要时写一份 Prometheus 文本格式，例如 node_exporter textfile 目录下的 yupen.prom
+state_line = "ma20"       # 状态参考线（临界点位），也可以是 "ma60"、"ema20"、"W:ma20" 等，写法见 indicators.py
+extra_indicators = []     # 复盘表额外的指标列，例如 ["ma60", "ema20", "vwma20", "atr_dev20", "W:ma20", "M:ma10"]
+spot_groups = None        # 盘中快照用的 stock_zh_index_spot_em 分组列表，None 时按 index_list 的代码推出（见 resolve_spot_groups）
+spot_metrics_file = "yupen_spot_metrics.json"
+alert_sinks = ["stdout"]  # 状态翻转提醒的出口：stdout / file / webhook，[] 表示不提醒
+alert_file = None         # file 出口的 JSONL 路径，例如 "yupen_alerts.jsonl"
+alert_webhook = None      # webhook 出口的 URL，例如 "http://127.0.0.1:8765/alerts"
+alert_hysteresis = 0.0    # 偏离率越过 ±N 个百分点才算翻转（MA 附近来回穿越不提醒）
+alert_debounce = 1        # 连续 N 次确认才提醒（常驻服务的盘中刷新里有用）
+alert_state_file = "yupen_alert_baseline.json"  # 提醒基准（上次确认的状态）和去抖计数，和 history.csv 分开存
 # ============================
 
-def try_fetch_index(symbol_attempts, start_date, end_date):
+
+def init_sources():
+    """按当前配置（cache_dir / host_rate_limit）建数据源、缓存和 symbol 记忆；命令行改了配置后再调用一次"""
+    global rate_limiter, providers, ohlcv_cache, symbol_resolver
+    rate_limiter = HostRateLimiter(rate_per_host=host_rate_limit)
+    # 首次拉全量、之后经本地缓存只拉增量，两者都走东方财富 stock_zh_index_daily_em；重试、熔断、限流都在数据源层
+    providers = ProviderChain([AkIndexProvider()], rate_limiter=rate_limiter)
+    ohlcv_cache = OhlcvCache(cache_dir)
+    # 记住每个指数代码可用的 symbol，下次运行不用再逐个探测
+    symbol_resolver = SymbolResolver(os.path.join(cache_dir, "symbol_map.json"), scope=providers.signature)
+
+
+init_sources()
+
+def try_fetch_index(symbol_attempts, start_date, end_date, code=None):
     """
     尝试多个 symbol（akshare 要求格式像 'sh000300' 或 'sz399006' 或 'sz399552' 等）。
     symbol_attempts 是按优先级排列的尝试列表，返回 DataFrame 或 None。
+    传入 code 时使用 symbol 记忆：先试上次成功的 symbol，失败则作废该记录。
+    历史经本地缓存增量拉取（缓存为空时全量），start_date 仅保留接口兼容。
     """
-    for s in symbol_attempts:
-        try:
-            df = ak.stock_zh_index_daily(symbol=s)
-            # ak.stock_zh_index_daily 返回的列通常包含: date, open, high, low, close, volume ...
-            if df is None or df.empty:
-                continue
-            # 确保按时间升序
-            df = df.sort_values(by=df.columns[0])  # 第一个列通常是日期
-            df = df.reset_index(drop=True)
-            return df
-        except Exception as e:
-            # 短暂等待以避免被目标站点限流
-            time.sleep(0.5)
+    remembered = None
+    attempts = symbol_attempts
+    if code is not None:
+        hit = symbol_resolver.get(code)
+        remembered = hit[0] if hit else None
+        attempts = symbol_resolver.order(code, symbol_attempts)
+    for probes, s in enumerate(attempts, start=1):
+        # 返回的列: date, open, high, low, close, volume，已按时间升序
+        df, method, note = providers.fetch(s, None, end_date, cache=ohlcv_cache, offline=offline)
+        if df is None or df.empty:
+            if s == remembered:
+                symbol_resolver.invalidate(code)
             continue
+        if code is not None:
+            symbol_resolver.record_success(code, s, method, list(symbol_attempts), probes)
+        return df
+    if code is not None:
+        symbol_resolver.record_failure(code, len(attempts))
     return None
 
 def normalize_symbol_candidates(code):
@@ -75,126 +127,279 @@ def normalize_symbol_candidates(code):
             seen.append(c); out.append(c)
     return out
 
-def find_last_cross_date(df_close, col_close_name="close"):
+def find_last_cross_date(df_close, col_close_name="close", window=20, min_periods=1):
     """
     给定含有 'close' 列和已按时间升序排序的 DataFrame，计算 MA20 并返回：
       - current_close, current_ma20, current_state (True 表示 close>ma20)
       - cross_date: 最近一次布尔值发生变化的日期（即穿越日），如果没有则返回 None
     注意: df_close 的日期列一般是第一列，可用 df_close.iloc[:,0] 提取日期
+    计算由 yupen_engine 完成；多个指数一起算时请直接用 yupen_engine.compute_states。
     """
-    # 尝试自动识别列名：有些版本是 'close'，有时是 '收盘'，这里做兼容
-    df = df_close.copy()
+    if df_close is None or df_close.empty:
+        return None, None, None, None
     # 识别日期列
-    date_col = df.columns[0]
-    # 标准化列名：将收盘价列重命名为 'close' 以方便处理
+    date_col = df_close.columns[0]
+    # 尝试自动识别收盘价列名：有些版本是 'close'，有时是 '收盘'，这里做兼容
     close_col = None
-    for cand in ["close", "收盘", "close_price", "Close"]:
-        if cand in df.columns:
+    for cand in [col_close_name, "close", "收盘", "close_price", "Close"]:
+        if cand in df_close.columns:
             close_col = cand
             break
     # 如果没找到上述名字，猜测最后一列为收盘价
     if close_col is None:
-        close_col = df.columns[-1]
-    df = df.rename(columns={close_col: "close"})
-    # 确保日期为 datetime
-    df[date_col] = pd.to_datetime(df[date_col])
-    df = df.sort_values(by=date_col).reset_index(drop=True)
-    # 计算 MA20
-    df["MA20"] = pd.to_numeric(df["close"], errors="coerce").rolling(window=20, min_periods=1).mean()
-    # 计算 above 布尔序列（close > MA20）；若 MA20 为 NaN，则 above 为 False（或 np.nan，取决于需求）
-    df["above"] = df["close"] > df["MA20"]
-    # 当前值（最后一行）
-    if df.empty:
-        return None, None, None, None
-    current_row = df.iloc[-1]
-    current_close = float(current_row["close"])
-    current_ma20 = float(current_row["MA20"]) if pd.notna(current_row["MA20"]) else None
-    current_state = bool(current_row["above"]) if pd.notna(current_row["above"]) else None
-    # 找最近一次 above 值发生变化的那一行（即 above != above.shift(1)）
-    df["above_prev"] = df["above"].shift(1)
-    df["changed"] = (df["above"] != df["above_prev"]) & (~df["above_prev"].isna())
-    changed_idx = df.index[df["changed"]].tolist()
-    cross_date = None
-    if changed_idx:
-        # 取最后一次发生变化的那一天（即穿越发生日）
-        last_change_idx = changed_idx[-1]
-        cross_date = df.loc[last_change_idx, date_col].strftime("%Y-%m-%d")
-        # 说明：last_change_idx 对应的那一行是穿越发生日，
-        # 它的 above 值是发生变化后（即新状态）的值（例如从 False->True）
-    else:
-        # 如果没有变化记录（例如全程都在 MA20 之上或之下，或数据太短）， cross_date 留空
-        cross_date = None
-    return current_close, current_ma20, current_state, cross_date
+        close_col = df_close.columns[-1]
+    matrix = build_price_matrix({"_": df_close}, date_col=date_col, close_col=close_col)
+    return state_tuple(compute_states(matrix, window, min_periods).iloc[0])
 
-def main():
-    results = []
-    end_date = datetime.today().strftime("%Y%m%d")
-    for code, name in index_list:
-        # 生成尝试 symbol 列表
-        symbol_candidates = normalize_symbol_candidates(code)
-        # 优化：如果用户直接给的 6 位数字（比如 '000300'），优先尝试带 'sh' 或 'sz' 前缀:
-        if len(str(code)) == 6 and not (str(code).lower().startswith("sh") or str(code).lower().startswith("sz")):
-            # 把带前缀尝试放到前面（先尝试 sh, 然后 sz）
-            symbol_candidates = ["sh" + code, "sz" + code] + [c for c in symbol_candidates if c not in ("sh"+code,"sz"+code)]
-        # 拉数据
-        df_hist = try_fetch_index(symbol_candidates, start_date, end_date)
-        if df_hist is None or df_hist.empty:
-            print(f"⚠️ 无法获取 {name}({code}) 的历史数据，尝试过: {symbol_candidates}")
-            results.append({
-                "指数代码": code,
-                "指数名称": name,
-                "当前点位": None,
-                "临界点位": None,
-                "当前状态": None,
-                "偏离率(%)": None,
-                "状态穿越日": None
-            })
-            continue
-        # 处理并计算 MA20、穿越日等
-        current_close, current_ma20, current_state, cross_date = find_last_cross_date(df_hist)
-        # 计算偏离率（相对于 MA20）
-        if current_ma20 is None or current_ma20 == 0:
-            deviation = None
-        else:
-            deviation = (current_close - current_ma20) / current_ma20 * 100
-        results.append({
+def state_tuple(row):
+    """compute_states 的一行 → (current_close, current_ma20, current_state, cross_date)"""
+    current_close = float(row["close"]) if pd.notna(row["close"]) else None
+    current_ma20 = float(row["ma"]) if pd.notna(row["ma"]) else None
+    return current_close, current_ma20, row["above"], row["cross_date"]
+
+def build_symbol_candidates(code):
+    """生成尝试 symbol 列表；6 位纯数字代码优先尝试带 'sh' / 'sz' 前缀的写法"""
+    symbol_candidates = normalize_symbol_candidates(code)
+    # 优化：如果用户直接给的 6 位数字（比如 '000300'），优先尝试带 'sh' 或 'sz' 前缀:
+    if len(str(code)) == 6 and not (str(code).lower().startswith("sh") or str(code).lower().startswith("sz")):
+        # 把带前缀尝试放到前面（先尝试 sh, 然后 sz）
+        symbol_candidates = ["sh" + code, "sz" + code] + [c for c in symbol_candidates if c not in ("sh"+code,"sz"+code)]
+    return symbol_candidates
+
+def report_row(code, name, states):
+    """复盘表的一行；states 为 compute_states 的结果，没有该指数时各项为 None"""
+    if code not in states.index or pd.isna(states.loc[code, "close"]):
+        return {
             "指数代码": code,
             "指数名称": name,
-            "当前点位": current_close,
-            "临界点位": current_ma20,
-            "当前状态": "Yes" if current_state else "No" if current_state is not None else None,
-            "偏离率(%)": deviation,
-            "状态穿越日": cross_date
-        })
+            "当前点位": None,
+            "临界点位": None,
+            "当前状态": None,
+            "偏离率(%)": None,
+            "状态穿越日": None
+        }
+    # 处理并计算 MA20、穿越日等
+    current_close, current_ma20, current_state, cross_date = state_tuple(states.loc[code])
+    # 计算偏离率（相对于 MA20）
+    if current_ma20 is None or current_ma20 == 0:
+        deviation = None
+    else:
+        deviation = (current_close - current_ma20) / current_ma20 * 100
+    return {
+        "指数代码": code,
+        "指数名称": name,
+        "当前点位": current_close,
+        "临界点位": current_ma20,
+        "当前状态": "Yes" if current_state else "No" if current_state is not None else None,
+        "偏离率(%)": deviation,
+        "状态穿越日": cross_date
+    }
 
+def rank_report(results):
+    """按偏离率排出趋势强度，返回排好序的复盘表"""
     # 构造 DataFrame
     out_df = pd.DataFrame(results)
-
     # 趋势强度：按 偏离率 从大到小排名（偏离率为 None 的放最后）
-    # 先把 None 转为很小的数以便排名，保存原值
-    out_df["偏离率_for_rank"] = out_df["偏离率(%)"].fillna(-9999999)
-    out_df["趋势强度"] = out_df["偏离率_for_rank"].rank(ascending=False, method="dense").astype(int)
-    # 把偏离率为 None 的行设置为最大的序号后面（使得 None 在最后）
-    max_rank = out_df["趋势强度"].max() if not out_df["趋势强度"].isna().all() else 0
-    out_df.loc[out_df["偏离率(%)"].isna(), "趋势强度"] = max_rank + 1
+    out_df["趋势强度"] = trend_rank(out_df["偏离率(%)"]).to_numpy()
 
     # 排列列和排序
     final_cols = ["趋势强度", "指数代码", "指数名称", "当前状态", "当前点位", "临界点位", "偏离率(%)", "状态穿越日"]
-    out_df = out_df[final_cols].sort_values(by="趋势强度").reset_index(drop=True)
+    # extra_indicators 的列放在最后
+    final_cols += [c for c in out_df.columns if c not in final_cols]
+    return out_df[final_cols].sort_values(by="趋势强度").reset_index(drop=True)
 
-    # 输出文件
-    today_str = datetime.today().strftime("%Y-%m-%d")
-    output_file = os.path.join(output_dir, f"鱼盆模型复盘_{today_str}.xlsx")
-    out_df.to_excel(output_file, index=False)
-    print(f"✅ 复盘已保存：{output_file}")
-    print(out_df)
+def fetch_history(item, end_date):
+    """拉一个指数的日线（经本地缓存只拉增量），返回 (尝试过的 symbol 列表, DataFrame 或 None)"""
+    code, name = item
+    symbol_candidates = build_symbol_candidates(code)
+    return symbol_candidates, try_fetch_index(symbol_candidates, start_date, end_date, code=code)
 
-    # 更新并保存历史状态（供下次比较或展示用）
+def write_state_log(today_str, out_df, metrics):
+    """收盘结果追加到状态日志，并把最新状态写到 history.csv"""
+    with metrics.stage("state_log"):
+        store = StateStore(state_db)
+        store.append(today_str, out_df)
+        store.close()
+    print("📘 已追加状态日志：", state_db)
+
+    # history.csv 只保留最新一次的状态（供下次比较或展示用）
     # 这里保存上次状态和上次穿越日
     hist_df = out_df[["指数代码", "当前状态", "状态穿越日"]].rename(
         columns={"当前状态": "上次状态", "状态穿越日": "上次状态时间"})
-    hist_df.to_csv(history_file, index=False)
+    with metrics.stage("history"):
+        hist_df.to_csv(history_file, index=False)
     print("📘 已更新历史状态：", history_file)
 
-if __name__ == "__main__":
-    main()
+def make_flip_detector():
+    """基准读 alert_state_file；第一次运行（文件还没有）时以 history.csv 里的上次状态为基准"""
+    return FlipDetector.load(alert_state_file, fallback=load_history_states(history_file),
+                             hysteresis=alert_hysteresis, debounce=alert_debounce)
+
+def send_alerts(out_df, detector, metrics):
+    """状态翻转的指数异步推送到 alert_sinks，等发完后打印送达延迟；返回提醒列表"""
+    sinks = make_alert_sinks(alert_sinks, file_path=alert_file, webhook_url=alert_webhook)
+    alerts = detector.observe(out_df)
+    if alert_state_file:
+        detector.save(alert_state_file)
+    if not sinks or not alerts:
+        return alerts
+    with metrics.stage("alerts"), AlertDispatcher(sinks, metrics=metrics) as dispatcher:
+        dispatcher.submit(alerts)
+    for name, q in dispatcher.latency_summary().items():
+        if q["count"]:
+            print(f"🔔 {name}: {q['count']} 条提醒，送达延迟 p50 {q['p50'] * 1e3:.1f}ms / max {q['max'] * 1e3:.1f}ms")
+    metrics.incr("alerts.sent", len(alerts))
+    return alerts
+
+def _stats_delta(after, before):
+    return {k: v - before.get(k, 0) for k, v in after.items()}
+
+def main():
+    metrics = RunMetrics("yupen_review")
+    providers.metrics = metrics
+    cache_before, memo_before = dict(ohlcv_cache.stats), dict(symbol_resolver.stats)
+    results = []
+    end_date = datetime.today().strftime("%Y%m%d")
+    today_str = datetime.today().strftime("%Y-%m-%d")
+    row_sink = make_sink(report_formats if stream_rows else [],
+                         os.path.join(output_dir, f"鱼盆模型明细_{today_str}"))
+
+    # 并发拉数据（结果顺序与 index_list 一致）
+    with metrics.stage("fetch"):
+        fetched = fetch_all(index_list, lambda item: fetch_history(item, end_date), max_workers=max_workers)
+    # 所有指数对齐成 日期 × 指数 矩阵，一次算出 MA20、状态、穿越日（以及 extra_indicators，共用中间结果）
+    with metrics.stage("compute_states"):
+        pipe = IndicatorPipeline({code: df for (code, _), (_, df) in zip(index_list, fetched)
+                                  if df is not None and not df.empty})
+        states = pipe.states(state_line)
+        extras = pipe.latest(extra_indicators) if extra_indicators else None
+    t_rows = time.perf_counter()
+    for (code, name), (symbol_candidates, df_hist) in zip(index_list, fetched):
+        if df_hist is None or df_hist.empty:
+            print(f"⚠️ 无法获取 {name}({code}) 的历史数据，尝试过: {symbol_candidates}")
+        results.append(report_row(code, name, states))
+        if extras is not None:
+            for spec in extra_indicators:
+                v = extras.at[code, spec] if code in extras.index else None
+                results[-1][spec] = None if v is None or pd.isna(v) else float(v)
+        row_sink.write_row(results[-1])
+    row_sink.close()
+    metrics.add_stage("build_rows", time.perf_counter() - t_rows)
+
+    symbol_resolver.save()
+    print(symbol_resolver.summary())
+
+    with metrics.stage("rank"):
+        out_df = rank_report(results)
+
+    # 输出文件：先落核心结果（CSV/Parquet 等），Excel 最后再生成
+    base_path = os.path.join(output_dir, f"鱼盆模型复盘_{today_str}")
+    with metrics.stage("export"), make_sink(report_formats, base_path) as sink:
+        sink.write_frame(out_df)
+    print(f"✅ 复盘已保存：{', '.join(s.path for s in sink.sinks)}")
+    print(out_df)
+
+    # 和 history.csv 的上次状态比较，翻转的指数推送提醒（要在 history.csv 被覆盖之前）
+    send_alerts(out_df, make_flip_detector(), metrics)
+
+    # 追加到状态日志（按日期保留全部历史状态）
+    write_state_log(today_str, out_df, metrics)
+
+    if excel_output and "xlsx" not in report_formats:
+        with metrics.stage("excel"):
+            output_file = render_excel(out_df, base_path + ".xlsx")
+        print(f"✅ Excel 复盘已生成：{output_file}")
+
+    # 运行指标：本次运行内缓存 / symbol 记忆的增量计数
+    metrics.merge_counters("cache", _stats_delta(ohlcv_cache.stats, cache_before))
+    metrics.merge_counters("symbol_memo", _stats_delta(symbol_resolver.stats, memo_before))
+    print("⏱️ 各阶段耗时：", ", ".join(f"{k} {v:.2f}s" for k, v in metrics.stages.items()))
+    if metrics_file:
+        print("⏱️ 运行指标：", metrics.write_json(metrics_file))
+    if prometheus_file:
+        metrics.write_prometheus(prometheus_file)
+    providers.metrics = None
+    return metrics
+
+# 指数代码前缀 → stock_zh_index_spot_em 的分组；接口默认只返回 上证系列指数，深证 / 中证 / 北证的指数不在里面
+SPOT_GROUP_PREFIXES = [("399", "深证系列指数"), ("93", "中证系列指数"), ("000", "上证系列指数")]
+SPOT_GROUP_DEFAULT = "沪深重要指数"  # 其它代码（如 899050 北证50）
+
+def resolve_spot_groups(codes=None):
+    """盘中快照要请求的分组：配置了 spot_groups 就用它，否则按代码前缀推出（去重，每个分组一次请求）"""
+    if spot_groups is not None:
+        return list(spot_groups)
+    groups = []
+    for code in (codes if codes is not None else [c for c, _ in index_list]):
+        code = str(code)[-6:]
+        group = next((g for prefix, g in SPOT_GROUP_PREFIXES if code.startswith(prefix)), SPOT_GROUP_DEFAULT)
+        if group not in groups:
+            groups.append(group)
+    return groups
+
+def spot_trade_date(now=None):
+    """快照对应的交易日：开盘（9:30）前和周末取上一个工作日，此时快照里的价格就是那天的收盘价"""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    day = now.normalize()
+    if now.weekday() < 5 and now.hour * 60 + now.minute < 9 * 60 + 30:
+        return day - pd.offsets.BDay(1)
+    return pd.offsets.BDay(1).rollback(day)
+
+def load_cached_history(code):
+    """只读本地缓存取一个指数的日线；先试 symbol 记忆，再按候选写法逐个试"""
+    hit = symbol_resolver.get(code)
+    cands = build_symbol_candidates(code)
+    for s in ([hit[0]] if hit else []) + [c for c in cands if not hit or c != hit[0]]:
+        df, _, _ = providers.fetch(s, None, None, cache=ohlcv_cache, offline=True)
+        if df is not None and not df.empty:
+            return df
+    return None
+
+def spot_main(now=None):
+    """
+    盘中快速刷新：历史日线全部来自本地缓存，今天的点位来自 stock_zh_index_spot_em 快照，
+    每个分组一次请求、与指数个数无关（缓存里没有的指数才会补拉一次历史）。
+    结果写到 鱼盆模型盘中_日期.*；盘中状态不是最终结果，不写状态日志和 history.csv。
+    """
+    metrics = RunMetrics("yupen_spot")
+    providers.metrics = metrics
+    trade_date = spot_trade_date(now)
+    end_date = datetime.today().strftime("%Y%m%d")
+
+    with metrics.stage("history"):
+        frames = {}
+        for code, name in index_list:
+            df = load_cached_history(code)
+            if df is None and not offline:
+                # 第一次运行、缓存里还没有：补拉一次全量历史（之后就在缓存里了）
+                df = try_fetch_index(build_symbol_candidates(code), start_date, end_date, code=code)
+            if df is None or df.empty:
+                print(f"⚠️ 本地没有 {name}({code}) 的历史数据")
+                continue
+            frames[code] = df
+
+    with metrics.stage("spot"):
+        spot = fetch_index_spot(resolve_spot_groups(frames), rate_limiter=rate_limiter)
+    prices = dict(zip(spot["code"], spot["price"]))
+    snap = {code: prices.get(str(code)[-6:]) for code in frames}
+    missing = [code for code, p in snap.items() if p is None or pd.isna(p)]
+    if missing:
+        print(f"⚠️ 快照里没有 {missing}，沿用缓存中的最后收盘价")
+
+    with metrics.stage("compute_states"):
+        # 和收盘后的复盘用同一条参考线（state_line），盘中 / 收盘的状态口径一致
+        live = apply_snapshot_frames(frames, {c: p for c, p in snap.items() if c not in missing}, trade_date)
+        states = IndicatorPipeline(live).states(state_line)
+        out_df = rank_report([report_row(code, name, states) for code, name in index_list])
+
+    base_path = os.path.join(output_dir, f"鱼盆模型盘中_{trade_date.strftime('%Y-%m-%d')}")
+    with metrics.stage("export"), make_sink(report_formats, base_path) as sink:
+        sink.write_frame(out_df)
+    print(f"✅ 盘中快照（{datetime.now().strftime('%H:%M:%S')}）已保存：{', '.join(s.path for s in sink.sinks)}")
+    print(out_df)
+
+    symbol_resolver.save()
+    providers.metrics = None
+    if spot_metrics_file:
+        metrics.write_json(spot_metrics_file)
+    return out_df